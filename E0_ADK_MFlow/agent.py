@@ -10,6 +10,14 @@ from opentelemetry.sdk.trace.export import SimpleSpanProcessor
 
 load_dotenv()
 
+# Load and chaos testing: send every Gemini call to the local stand-in server (gemini-standin/)
+GEMINI_STANDIN_URL = os.getenv("GEMINI_STANDIN_URL")
+if GEMINI_STANDIN_URL:
+    os.environ["GOOGLE_GEMINI_BASE_URL"] = GEMINI_STANDIN_URL
+    os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "0"
+    os.environ.setdefault("GOOGLE_API_KEY", "standin")
+    print(f"[Config] Using the Gemini stand-in at {GEMINI_STANDIN_URL}")
+
 # 1. Setup MLflow Experiment
 # Ensure the experiment exists and get its ID.
 # If you don't create one, MLflow uses '0' (Default), but it's safer to be explicit.
@@ -1 +1,7 @@
-from . import agent
+# The agent module is imported on first use (adk run / adk web look up root_agent),
+# so the batch CLI and the job service can configure the pipeline environment first.
+def __getattr__(name):
+    if name in ("agent", "root_agent"):
+        from . import agent
+        return agent if name == "agent" else agent.root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
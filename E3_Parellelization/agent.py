@@ -1,4 +1,4 @@
-import os, json, re 
+import os
 import mlflow
 from dotenv import load_dotenv
 
@@ -10,8 +10,24 @@ from opentelemetry.sdk.trace.export import SimpleSpanProcessor
 
 load_dotenv()
 
+# Load and chaos testing: send every Gemini call to the local stand-in server (gemini-standin/)
+GEMINI_STANDIN_URL = os.getenv("GEMINI_STANDIN_URL")
+if GEMINI_STANDIN_URL:
+    os.environ["GOOGLE_GEMINI_BASE_URL"] = GEMINI_STANDIN_URL
+    os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "0"
+    os.environ.setdefault("GOOGLE_API_KEY", "standin")
+    print(f"[Config] Using the Gemini stand-in at {GEMINI_STANDIN_URL}")
+
 # Configuration
 NUM_SUMMARIZE_AGENTS = int(os.getenv("NUM_SUMMARIZE_AGENTS", "10"))  # Default to 10 agents
+# Straggler mitigation: re-run DocumentAnalyzers that exceed their deadline on idle capacity
+SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "0") == "1"
+ANALYZER_DEADLINE_SECONDS = float(os.getenv("ANALYZER_DEADLINE_SECONDS", "120"))
+ANALYZER_DEADLINE_FACTOR = float(os.getenv("ANALYZER_DEADLINE_FACTOR", "2.0"))
+# Autoscaling: size the analyzer pool per loop iteration (up to ANALYZER_POOL_MAX) instead of
+# always running NUM_SUMMARIZE_AGENTS
+ANALYZER_AUTOSCALING = os.getenv("ANALYZER_AUTOSCALING", "0") == "1"
+FILE_PROCESSING_MAX_ITERATIONS = int(os.getenv("FILE_PROCESSING_MAX_ITERATIONS", "10"))
 
 # 1. Setup MLflow Experiment
 mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000"))
@@ -70,10 +86,6 @@ with mlflow.start_run(experiment_id=experiment_id) as run:
         
 from google.adk.agents import LlmAgent, ParallelAgent, SequentialAgent, LoopAgent
 from google.adk.tools import google_search
-from google.adk.agents.callback_context import CallbackContext
-from google.adk.tools.tool_context import ToolContext
-from typing import Optional
-from google.genai import types
 # from .tools import calculator_tool, read_data_tool, list_example_files_tool, get_processing_status_tool, update_processing_status_tool, assign_file_for_work_tool, get_work_assignments_tool, complete_assignment_tool
 
 # Import agent factory functions
@@ -82,66 +94,117 @@ from .agents import (
     create_plan_and_assign_tasks_agent,
     create_document_analysis_agent,
     create_merger_agent,
+    create_speculative_replica,
+    settle_speculative_race,
+    create_analyzer_pool_scaler,
+    create_loop_controller,
+    configure_run_metrics,
+    start_run_metrics_callback,
+    log_run_metrics_callback,
+    start_profiling_callback,
+    stop_profiling_callback,
+    create_profiling_guard,
+    install_stage_hooks,
+    SpeculativeParallelAgent,
 )
+from .agents.analyzer_autoscaler import ANALYZER_POOL_MAX
+from .agents.profiler import PIPELINE_PROFILING
+from .agents.model_routing import stage_route
+from .tools.chunking import CHUNK_SIZE, OVERLAP_PERCENTAGE, forget_previous_runs_callback
+from .tools.live_metrics import start_metrics_server
 
 print("Tracing complete.")
-def check_for_pending_files(context: CallbackContext) -> bool:
-    """
-    Checks the todo_list_result in state for any tasks with status 'pending'.
-    Returns True to continue the loop, False to stop the loop.
-    """
-    todo_list_raw = context.state.get("todo_list_result")
-    
-    if isinstance(todo_list_raw, str):
-        try:
-            todo_list = json.loads(todo_list_raw)
-        except json.JSONDecodeError:
-            print("Warning: todo_list_result is not valid JSON string.")
-            return False 
-    elif isinstance(todo_list_raw, list):
-        todo_list = todo_list_raw
-    else:
-        return False
 
-    has_pending = any(task.get("status") == "pending" for task in todo_list if isinstance(task, dict))
-    return has_pending
 
+# With autoscaling, the pool is pre-built at its maximum size and each iteration runs part of it
+pool_size = ANALYZER_POOL_MAX if ANALYZER_AUTOSCALING else NUM_SUMMARIZE_AGENTS
 
 # Create agents using factory functions
 file_todo_list_agent = create_file_todo_list_agent()
-plan_and_assign_tasks_agent = create_plan_and_assign_tasks_agent(num_agents=NUM_SUMMARIZE_AGENTS)
+plan_and_assign_tasks_agent = create_plan_and_assign_tasks_agent(
+    num_agents=NUM_SUMMARIZE_AGENTS, autoscaled=ANALYZER_AUTOSCALING
+)
 
 # Dynamically create the specified number of DocumentAnalyzer agents
 # Each agent encapsulates chunking internally and can run in parallel
 document_analysis_agents = [
     create_document_analysis_agent(i) 
-    for i in range(1, NUM_SUMMARIZE_AGENTS + 1)
+    for i in range(1, pool_size + 1)
 ]
 
-merger_agent = create_merger_agent()
+merger_agent = create_merger_agent(num_agents=pool_size)
 
-print(f"[Config] Using {NUM_SUMMARIZE_AGENTS} DocumentAnalyzer agent(s) with internal chunking")
+if ANALYZER_AUTOSCALING:
+    print(f"[Config] Autoscaling DocumentAnalyzer pool between 1 and {pool_size} agent(s) per iteration")
+else:
+    print(f"[Config] Using {NUM_SUMMARIZE_AGENTS} DocumentAnalyzer agent(s) with internal chunking")
 
 
 # --- Create Composite Agents ---
 
 # Parallel agent that runs multiple DocumentAnalyzer agents concurrently
 # Each DocumentAnalyzer has internal chunking and analysis loops
-parallel_document_analyzers = ParallelAgent(
-    name="ParallelDocumentAnalyzerAgent",
-    sub_agents=document_analysis_agents,
-    description=f"Runs {NUM_SUMMARIZE_AGENTS} DocumentAnalyzer agent(s) with internal chunking in parallel."
-)
+if SPECULATIVE_EXECUTION or ANALYZER_AUTOSCALING:
+    # Stragglers past their deadline are re-executed on idle capacity; first result wins.
+    # When autoscaling, only the first analyzer_pool_size analyzers run each iteration.
+    parallel_document_analyzers = SpeculativeParallelAgent(
+        name="ParallelDocumentAnalyzerAgent",
+        sub_agents=document_analysis_agents,
+        replica_factory=create_speculative_replica if SPECULATIVE_EXECUTION else None,
+        race_settler=settle_speculative_race if SPECULATIVE_EXECUTION else None,
+        deadline_seconds=ANALYZER_DEADLINE_SECONDS,
+        deadline_factor=ANALYZER_DEADLINE_FACTOR,
+        pool_size_key="analyzer_pool_size" if ANALYZER_AUTOSCALING else None,
+        description=f"Runs up to {pool_size} DocumentAnalyzer agent(s) in parallel"
+                    + (" with speculative re-execution of stragglers." if SPECULATIVE_EXECUTION else ".")
+    )
+else:
+    parallel_document_analyzers = ParallelAgent(
+        name="ParallelDocumentAnalyzerAgent",
+        sub_agents=document_analysis_agents,
+        description=f"Runs {NUM_SUMMARIZE_AGENTS} DocumentAnalyzer agent(s) with internal chunking in parallel."
+    )
+
+# Loop agent that repeatedly assigns and processes pending files.
+# The controller runs first and ends the loop as soon as no file is pending,
+# so the planner is only called when there is work to assign.
+loop_sub_agents = [
+    create_loop_controller("FileProcessingLoop", max_iterations=FILE_PROCESSING_MAX_ITERATIONS),
+    plan_and_assign_tasks_agent,
+    parallel_document_analyzers,
+]
+if ANALYZER_AUTOSCALING:
+    # Size the pool before the planner assigns work to it
+    loop_sub_agents.insert(1, create_analyzer_pool_scaler(max_agents=pool_size))
 
-# Loop agent that repeatedly assigns and processes pending files
 file_processing_loop = LoopAgent(
     name="FileProcessingLoop",
-    sub_agents=[plan_and_assign_tasks_agent, parallel_document_analyzers],
-    max_iterations=10,
+    sub_agents=loop_sub_agents,
+    max_iterations=FILE_PROCESSING_MAX_ITERATIONS,
     description="Repeatedly assigns pending files to DocumentAnalyzer agents and processes them until all are completed."
 )
 
 
+# Every pipeline run logs its throughput, LLM usage and memory to its own MLflow run
+configure_run_metrics(experiment_id, params={
+    "NUM_SUMMARIZE_AGENTS": NUM_SUMMARIZE_AGENTS,
+    "ANALYZER_AUTOSCALING": ANALYZER_AUTOSCALING,
+    "ANALYZER_POOL_MAX": ANALYZER_POOL_MAX,
+    "SPECULATIVE_EXECUTION": SPECULATIVE_EXECUTION,
+    "FILE_PROCESSING_MAX_ITERATIONS": FILE_PROCESSING_MAX_ITERATIONS,
+    "CHUNK_SIZE": CHUNK_SIZE,
+    "OVERLAP_PERCENTAGE": OVERLAP_PERCENTAGE,
+    "ANALYSIS_BATCHING": os.getenv("ANALYSIS_BATCHING", "1"),
+    "DEDUP_ENABLED": os.getenv("DEDUP_ENABLED", "1"),
+    "LLM_HEDGING_ENABLED": os.getenv("LLM_HEDGING_ENABLED", "0"),
+    "GEMINI_STANDIN": bool(GEMINI_STANDIN_URL),
+    "PIPELINE_PROFILING": PIPELINE_PROFILING,
+    **{f"model.{stage}": stage_route(stage)[0] for stage in ("todo", "plan", "chunk_analysis", "synthesis")},
+})
+
+# Live Prometheus metrics while runs are in progress (METRICS_PORT=0 leaves the endpoint off)
+start_metrics_server()
+
 # --- Create Main Sequential Pipeline ---
 sequential_pipeline_agent = SequentialAgent(
     name="FileExtractionPipelineAgent",
@@ -150,7 +213,17 @@ sequential_pipeline_agent = SequentialAgent(
         file_processing_loop,      # 2. Process documents: assign tasks then analyze in parallel
         merger_agent               # 3. Final synthesis of all results
     ],
-    description="Coordinates document analysis using parallel DocumentAnalyzer agents with internal chunking and synthesizes the results."
+    description="Coordinates document analysis using parallel DocumentAnalyzer agents with internal chunking and synthesizes the results.",
+    # The profiler stops before run metrics are logged so its reports can be attached to the MLflow run
+    before_agent_callback=[start_run_metrics_callback, start_profiling_callback, forget_previous_runs_callback],
+    after_agent_callback=[stop_profiling_callback, log_run_metrics_callback]
 )
 
-root_agent = sequential_pipeline_agent
\ No newline at end of file
+root_agent = sequential_pipeline_agent
+
+if PIPELINE_PROFILING:
+    # Per-stage memory snapshots; CPU sampling needs no hooks
+    install_stage_hooks(sequential_pipeline_agent)
+    # A run that raises skips the after-callbacks; the guard still stops its profile
+    root_agent = create_profiling_guard(sequential_pipeline_agent)
+    print("[Config] Profiling pipeline runs (PIPELINE_PROFILING=1)")
\ No newline at end of file
@@ -4,9 +4,17 @@ from .utils import exit_loop
 from .file_todo_list_agent import create_file_todo_list_agent
 from .plan_and_assign_tasks_agent import create_plan_and_assign_tasks_agent
 from .read_summarize_files_agent import create_read_summarize_files_agent
-from .document_analysis_agent import create_document_analysis_agent
+from .document_analysis_agent import create_document_analysis_agent, create_speculative_replica, settle_speculative_race
+from .chunk_feeder import create_chunk_feeder_agent, ChunkFeederAgent, ChunkFeedLoop
+from .speculative_parallel_agent import SpeculativeParallelAgent
+from .analyzer_autoscaler import create_analyzer_pool_scaler, AnalyzerPoolScaler
+from .loop_controller import create_loop_controller, LoopController
+from .model_routing import resolve_model, get_model_usage_report
+from .run_metrics import configure_run_metrics, start_run_metrics_callback, log_run_metrics_callback
+from .profiler import start_profiling_callback, stop_profiling_callback, install_stage_hooks, create_profiling_guard
 from .synthesis_agent import create_merger_agent
 from .chunk_agents import create_chunk_manager_agent, create_chunk_analyzer_agent
+from .corpus_qa_agent import create_corpus_qa_agent
 
 __all__ = [
     "exit_loop",
@@ -14,7 +22,27 @@ __all__ = [
     "create_plan_and_assign_tasks_agent",
     "create_read_summarize_files_agent",
     "create_document_analysis_agent",
+    "create_speculative_replica",
+    "settle_speculative_race",
+    "create_chunk_feeder_agent",
+    "ChunkFeederAgent",
+    "ChunkFeedLoop",
+    "SpeculativeParallelAgent",
+    "create_analyzer_pool_scaler",
+    "AnalyzerPoolScaler",
+    "create_loop_controller",
+    "LoopController",
+    "resolve_model",
+    "get_model_usage_report",
+    "configure_run_metrics",
+    "start_run_metrics_callback",
+    "log_run_metrics_callback",
+    "start_profiling_callback",
+    "stop_profiling_callback",
+    "install_stage_hooks",
+    "create_profiling_guard",
     "create_merger_agent",
     "create_chunk_manager_agent",
     "create_chunk_analyzer_agent",
+    "create_corpus_qa_agent",
 ]
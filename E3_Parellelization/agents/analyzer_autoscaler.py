@@ -0,0 +1,215 @@
+"""Analyzer Pool Scaler - sizes the DocumentAnalyzer pool for each loop iteration.
+
+Runs at the start of every FileProcessingLoop iteration (before the planner)
+and decides how many DocumentAnalyzers the iteration should use from:
+
+- the number of pending files and their total size
+- the observed time an analyzer needs per document (recorded by its callbacks)
+- the LLM request budget (each analyzer issues one model call at a time)
+
+The decision is published to session state: ``analyzer_pool_size`` and
+``available_analyzers`` (the names the planner may assign work to). The
+parallel stage runs only that many analyzers, so the pool grows and shrinks
+between iterations.
+
+In the job service, several jobs run at once and AnalyzerShares.pool_size
+analyzers are shared between them. Each job is capped at its weighted
+max-min fair share of that pool, computed from what the other jobs asked for
+at their last iteration, so a job with little pending work leaves the rest to
+the others.
+"""
+
+import math
+import os
+import time
+from typing import AsyncGenerator, Optional
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+from ..tools.async_file_tools import run_file_tool
+from ..tools.document_source import list_documents
+from ..tools.workspace import workspace_id
+from .hedged_model import LatencyTracker
+from .utils import parse_todo_list, pending_files
+
+ANALYZER_POOL_MIN = int(os.getenv("ANALYZER_POOL_MIN", "1"))
+ANALYZER_POOL_MAX = int(os.getenv("ANALYZER_POOL_MAX", "32"))
+# Without latency samples, one analyzer is planned per this many bytes of pending input
+ANALYZER_BYTES_PER_AGENT = int(os.getenv("ANALYZER_BYTES_PER_AGENT", "50000"))
+# With latency samples, enough analyzers to finish an iteration in about this long
+ANALYZER_TARGET_ITERATION_SECONDS = float(os.getenv("ANALYZER_TARGET_ITERATION_SECONDS", "300"))
+# Model requests per minute available to the analyzers (0 = unlimited)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+# Assumed model call latency until calls have been measured
+ASSUMED_LLM_CALL_SECONDS = float(os.getenv("ASSUMED_LLM_CALL_SECONDS", "5"))
+
+# LatencyTracker key for seconds an analyzer spends per completed document
+DOCUMENT_LATENCY_KEY = "analyzer:per_document"
+ANALYZER_MODEL_STAGES = ("chunk_analysis:", "document_analysis:")
+
+
+def record_analysis_start_callback(callback_context: CallbackContext):
+    """Before-agent callback for DocumentAnalyzers: remember when this run started."""
+    callback_context.state[f"{callback_context.agent_name}_started_at"] = time.time()
+    return None
+
+
+def record_document_latency(callback_context: CallbackContext, completed_files: list, agent_name: str = None):
+    """Record the analyzer's time per completed document for future pool sizing."""
+    started = callback_context.state.get(f"{agent_name or callback_context.agent_name}_started_at")
+    if not completed_files or not isinstance(started, (int, float)):
+        return
+    per_document = (time.time() - started) / len(completed_files)
+    LatencyTracker.record(DOCUMENT_LATENCY_KEY, per_document)
+
+
+def _model_call_seconds() -> float:
+    """Median latency of the analyzers' model calls, or the assumed latency."""
+    samples = sorted(
+        seconds
+        for key, values in LatencyTracker.samples.items() if key.startswith(ANALYZER_MODEL_STAGES)
+        for seconds in values
+    )
+    if not samples:
+        return ASSUMED_LLM_CALL_SECONDS
+    return samples[len(samples) // 2]
+
+
+def rate_limited_pool_size() -> Optional[int]:
+    """Analyzers that fit the LLM request budget, or None when it is unlimited."""
+    if LLM_REQUESTS_PER_MINUTE <= 0:
+        return None
+    # Each analyzer keeps one call in flight, so it uses 60 / call_seconds requests a minute
+    return max(1, int(LLM_REQUESTS_PER_MINUTE * _model_call_seconds() / 60))
+
+
+def decide_pool_size(num_pending: int, pending_bytes: int, min_agents: int = ANALYZER_POOL_MIN,
+                     max_agents: int = ANALYZER_POOL_MAX) -> tuple:
+    """
+    Decide how many analyzers to run for the pending work.
+
+    Args:
+        num_pending: Number of pending files
+        pending_bytes: Total size of the pending files
+        min_agents: Lower bound while work is pending
+        max_agents: Upper bound (size of the pre-built pool)
+
+    Returns:
+        (pool_size, reason) tuple
+    """
+    if num_pending == 0:
+        return 0, "no pending files"
+
+    per_document = LatencyTracker.percentile(DOCUMENT_LATENCY_KEY, 0.5)
+    if per_document is not None:
+        wanted = math.ceil(num_pending * per_document / ANALYZER_TARGET_ITERATION_SECONDS)
+        reason = f"{num_pending} file(s) at {per_document:.0f}s each"
+    else:
+        wanted = math.ceil(pending_bytes / ANALYZER_BYTES_PER_AGENT)
+        reason = f"{num_pending} file(s), {pending_bytes} bytes"
+
+    size = max(min_agents, wanted)
+    rate_cap = rate_limited_pool_size()
+    if rate_cap is not None and size > rate_cap:
+        size = rate_cap
+        reason += f", capped by {LLM_REQUESTS_PER_MINUTE} requests/min"
+    size = max(1, min(size, max_agents, num_pending))
+    return size, reason
+
+
+class AnalyzerShares:
+    """Analyzer pool shared by the jobs of the job service."""
+    # Analyzers all jobs together may run (None: not shared, each run sizes its own pool)
+    pool_size = None
+    # job (workspace id) -> fair-share weight
+    weights = {}
+    # job -> most analyzers the job may use
+    limits = {}
+    # job -> analyzers the job asked for at its last iteration
+    demands = {}
+
+
+def fair_share(job_id: str) -> int:
+    """
+    Return a job's weighted max-min fair share of the shared analyzer pool.
+
+    Jobs asking for less than their weighted share get what they asked for,
+    and the capacity they leave is split between the others by weight. Jobs
+    that have not asked yet are assumed to want the whole pool.
+
+    Args:
+        job_id: Workspace id of the job
+
+    Returns:
+        Number of analyzers the job may run (at least 1)
+    """
+    capacity = float(AnalyzerShares.pool_size)
+    unsatisfied = dict(AnalyzerShares.weights)
+    unsatisfied.setdefault(job_id, 1.0)
+    demands = {job: AnalyzerShares.demands.get(job, AnalyzerShares.pool_size) for job in unsatisfied}
+    shares = {}
+    while unsatisfied:
+        per_weight = capacity / sum(unsatisfied.values())
+        satisfied = {job: demands[job] for job, weight in unsatisfied.items() if demands[job] <= weight * per_weight}
+        if not satisfied:
+            shares.update({job: weight * per_weight for job, weight in unsatisfied.items()})
+            break
+        for job, demand in satisfied.items():
+            shares[job] = demand
+            capacity -= demand
+            del unsatisfied[job]
+    return max(1, int(shares[job_id]))
+
+
+class AnalyzerPoolScaler(BaseAgent):
+    """Code agent that publishes the analyzer pool size for the current iteration."""
+
+    min_agents: int = ANALYZER_POOL_MIN
+    max_agents: int = ANALYZER_POOL_MAX
+    agent_name_prefix: str = "DocumentAnalyzer"
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        todo_list = parse_todo_list(ctx.session.state.get("todo_list_result"))
+        pending = pending_files(todo_list)
+        sizes = {doc["document_id"]: doc["size"] for doc in await run_file_tool(list_documents)}
+        pending_bytes = sum(sizes.get(filename, 0) for filename in pending)
+
+        size, reason = decide_pool_size(len(pending), pending_bytes, self.min_agents, self.max_agents)
+        job_id = workspace_id()
+        if AnalyzerShares.pool_size is not None and job_id is not None and size:
+            limit = AnalyzerShares.limits.get(job_id)
+            if limit is not None and size > limit:
+                size, reason = limit, reason + f", job limit {limit}"
+            AnalyzerShares.demands[job_id] = size
+            share = fair_share(job_id)
+            if size > share:
+                size = share
+                reason += f", fair share of {AnalyzerShares.pool_size} shared analyzer(s)"
+        previous: Optional[int] = ctx.session.state.get("analyzer_pool_size")
+        analyzers = [f"{self.agent_name_prefix}{i}" for i in range(1, size + 1)]
+        change = "" if previous is None or previous == size else f" (was {previous})"
+        message = f"Analyzer pool: {size} agent(s){change} for {reason}"
+        print(f"[Autoscaler] {message}")
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=message)]),
+            actions=EventActions(state_delta={
+                "analyzer_pool_size": size,
+                "available_analyzers": ", ".join(analyzers),
+            }),
+        )
+
+
+def create_analyzer_pool_scaler(max_agents: int = ANALYZER_POOL_MAX):
+    """Create the AnalyzerPoolScaler for a pool of max_agents pre-built analyzers."""
+    return AnalyzerPoolScaler(
+        name="AnalyzerPoolScaler",
+        min_agents=min(ANALYZER_POOL_MIN, max_agents),
+        max_agents=max_agents,
+        description="Sizes the DocumentAnalyzer pool from pending work, observed latency and the LLM request budget.",
+    )
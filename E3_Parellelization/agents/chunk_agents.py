@@ -2,20 +2,19 @@
 
 from google.adk.agents import LlmAgent
 from .utils import exit_loop
-from ..tools import get_next_chunk_tool 
-
-GEMINI_MODEL = "gemini-2.5-flash"
+from .model_routing import resolve_model
+from ..tools import get_next_chunk_async_tool 
 
 
 def create_chunk_manager_agent():
     """Create and return the ChunkManagerAgent."""
     return LlmAgent(
         name="ChunkManager",
-        model=GEMINI_MODEL,
+        model=resolve_model(stage="chunk_management"),
         instruction="""You are managing the document chunking process. Your task is to:
 
 1. Look at the todo_list_result to find the next file to process
-2. Call the 'get_next_chunk' tool with that document name
+2. Call the 'get_next_chunk_async' tool with that document name
 3. The tool will return chunk_info with the following structure:
    - chunk_content: the text chunk
    - chunk_number: current chunk number
@@ -28,7 +27,7 @@ Output the chunk information for the ChunkAnalyzer agent to process.
 
 TODO LIST: {todo_list_result}
 """,
-        tools=[get_next_chunk_tool, exit_loop],
+        tools=[get_next_chunk_async_tool, exit_loop],
         output_key="chunk_info"
     )
 
@@ -37,7 +36,7 @@ def create_chunk_analyzer_agent():
     """Create and return the ChunkAnalyzerAgent."""
     return LlmAgent(
         name="ChunkAnalyzer",
-        model=GEMINI_MODEL,
+        model=resolve_model(stage="chunk_analysis"),
         instruction="""You are a deep document analysis expert. Your task is to analyze chunks of text
     and merge findings into a running summary.
 
@@ -0,0 +1,284 @@
+"""Chunk Feeder - code agent that advances a DocumentAnalyzer's chunk cursor.
+
+Replaces the LLM-driven DocumentChunkManager: advancing the cursor is
+deterministic, so it needs no model call. On every loop iteration the feeder
+takes the next chunk of the documents assigned to its analyzer, writes it to
+``chunk_info_N`` for the chunk analyzer, and escalates once every assigned
+document is exhausted. That leaves exactly one LLM call per chunk.
+
+Small documents are coalesced: consecutive assigned documents no larger than
+SMALL_DOCUMENT_MAX_BYTES are packed into one batch of up to
+ANALYSIS_BATCH_MAX_CHARS, so a single analyzer call covers all of them. The
+analyzer writes one section per document, which its callback splits back
+into per-document results.
+
+While the analyzer works on a chunk, the next documents of its queue are read
+ahead and chunked in the background (CHUNK_PREFETCH_DOCUMENTS), so moving on
+to the next document does not wait for a cold read.
+
+With PRIORITY_SCHEDULING the assigned documents are served earliest deadline
+first within priority classes, re-reading priorities on every step. When a
+document of a higher priority class is waiting (e.g. escalated with
+assign_file_for_work during the run), the document in progress is parked
+between two chunks, with its partial analysis, and continues once the
+urgent work is done (PRIORITY_PREEMPTION).
+
+ChunkFeedLoop runs the feeder and the chunk analyzer. It stops on the
+feeder's escalation but passes that event on with the escalation cleared, so
+it does not also end the enclosing FileProcessingLoop.
+"""
+
+import os
+from typing import AsyncGenerator, Optional
+from google.adk.agents import BaseAgent, LoopAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+from ..tools import get_next_chunk_async
+from ..tools.async_file_tools import run_file_tool
+from ..tools.chunking import CHUNK_SIZE, park_document, prefetch_documents
+from ..tools.document_source import list_documents
+from ..tools.result_store import RESULT_STORE_ENABLED
+from ..tools.scheduling import PRIORITY_PREEMPTION, PRIORITY_SCHEDULING, load_assigned_urgency, schedule_key, task_urgency
+from .utils import parse_todo_list
+
+ANALYSIS_BATCHING = os.getenv("ANALYSIS_BATCHING", "1") == "1"
+# Documents up to this size (one chunk) are packed together up to the batch budget
+SMALL_DOCUMENT_MAX_BYTES = int(os.getenv("SMALL_DOCUMENT_MAX_BYTES", str(CHUNK_SIZE)))
+ANALYSIS_BATCH_MAX_CHARS = int(os.getenv("ANALYSIS_BATCH_MAX_CHARS", "8000"))
+
+# document_id -> size if the document may be batched, else None; listed once per run
+SMALL_DOCUMENT_SIZES_KEY = "temp:small_document_sizes"
+
+
+async def _small_document_sizes(state, assigned: list) -> tuple:
+    """
+    Sizes of the documents that may be batched (compressed sizes say nothing about text length).
+
+    The documents are listed once per run and shared by all feeders through
+    state; they are listed again only when a document was added since.
+
+    Returns:
+        (document_id -> size or None, state delta holding a new listing or empty)
+    """
+    if not ANALYSIS_BATCHING:
+        return {}, {}
+    sizes = state.get(SMALL_DOCUMENT_SIZES_KEY)
+    if isinstance(sizes, dict) and all(document_id in sizes for document_id in assigned):
+        return sizes, {}
+    sizes = {
+        doc["document_id"]: doc["size"] if doc["kind"] != "compressed" and doc["size"] <= SMALL_DOCUMENT_MAX_BYTES else None
+        for doc in await run_file_tool(list_documents)
+    }
+    return sizes, {SMALL_DOCUMENT_SIZES_KEY: sizes}
+
+
+def build_batch_info(chunks: list) -> dict:
+    """Combine chunks of several small documents into one chunk_info for a single analyzer call."""
+    documents = [chunk["current_document"] for chunk in chunks]
+    return {
+        "batch": True,
+        "documents": documents,
+        "chunks": [
+            {key: chunk[key] for key in ("current_document", "chunk_number", "total_chunks", "last_chunk", "chunk_content")}
+            for chunk in chunks
+        ],
+        "current_document": ", ".join(documents),
+        "more_chunks_exist": True,
+    }
+
+
+class ChunkFeederAgent(BaseAgent):
+    """Serves the next chunk of the analyzer's assigned documents into session state."""
+
+    analyzer_name: str
+    """DocumentAnalyzer whose assignments (todo list assigned_agent) are fed."""
+
+    chunk_cursor_id: str
+    """agent_id of the chunk cursor in the chunking tool."""
+
+    chunk_info_key: str
+    """State key the chunk analyzer reads the current chunk from."""
+
+    analysis_output_key: Optional[str] = None
+    """State key the chunk analyzer folds the running analysis into; None for document_analysis_N."""
+
+    @property
+    def feed_state_key(self) -> str:
+        """State key listing the documents whose chunks have all been served in this run."""
+        return f"{self.chunk_cursor_id}_fed_documents"
+
+    @property
+    def parked_state_key(self) -> str:
+        """State key holding the partial analyses of documents parked for more urgent work."""
+        return f"{self.chunk_cursor_id}_parked_analyses"
+
+    @property
+    def analysis_key(self) -> str:
+        """State key the chunk analyzer folds the running analysis into."""
+        if self.analysis_output_key:
+            return self.analysis_output_key
+        return f"document_analysis_{self.analyzer_name.replace('DocumentAnalyzer', '')}"
+
+    def _document_in_progress(self, ctx: InvocationContext):
+        """Document whose last served chunk was not its final one, if any."""
+        chunk_info = ctx.session.state.get(self.chunk_info_key)
+        if not isinstance(chunk_info, dict) or not chunk_info.get("more_chunks_exist"):
+            return None
+        last = chunk_info["chunks"][-1] if chunk_info.get("batch") and chunk_info.get("chunks") else chunk_info
+        return None if last.get("last_chunk") else last.get("current_document")
+
+    async def _schedule(self, ctx: InvocationContext, tasks: list, fed: list, parked: dict) -> list:
+        """
+        Order the documents still to feed by live urgency.
+
+        The document in progress stays first unless a document of a higher
+        priority class is waiting; then it is parked (cursor and partial analysis).
+        """
+        urgency = await run_file_tool(load_assigned_urgency)
+        keys = {
+            task["filename"]: schedule_key(*task_urgency(task, urgency), position)
+            for position, task in enumerate(tasks) if task["filename"] not in fed
+        }
+        order = sorted(keys, key=keys.get)
+        current = self._document_in_progress(ctx)
+        if current not in keys or order[0] == current:
+            return order
+        if PRIORITY_PREEMPTION and keys[order[0]][0] < keys[current][0]:
+            await run_file_tool(park_document, self.chunk_cursor_id)
+            # Per-document analyses are kept apart only with the result store; otherwise the analysis runs on
+            if RESULT_STORE_ENABLED:
+                parked[current] = ctx.session.state.get(self.analysis_key)
+            print(f"[ChunkFeeder][{self.analyzer_name}] Preempting '{current}' for more urgent '{order[0]}'")
+            return order
+        order.remove(current)
+        return [current] + order
+
+    def _event(self, ctx: InvocationContext, text: str, state_delta: dict, escalate: bool = False) -> Event:
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            actions=EventActions(state_delta=state_delta, escalate=escalate or None),
+        )
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        todo_list = parse_todo_list(ctx.session.state.get("todo_list_result"))
+        tasks = [
+            task for task in todo_list
+            if isinstance(task, dict)
+            and task.get("assigned_agent") == self.analyzer_name
+            and task.get("status") == "pending"
+            and task.get("filename")
+        ]
+        fed = list(ctx.session.state.get(self.feed_state_key) or [])
+        parked = dict(ctx.session.state.get(self.parked_state_key) or {})
+        parked_before = len(parked)
+        if PRIORITY_SCHEDULING:
+            assigned = await self._schedule(ctx, tasks, fed, parked)
+        else:
+            assigned = [task["filename"] for task in tasks]
+        unfed = [document_id for document_id in assigned if document_id not in fed]
+        small_sizes, state_delta = await _small_document_sizes(ctx.session.state, unfed)
+
+        if len(parked) != parked_before:
+            # The urgent document starts its own analysis
+            state_delta[self.analysis_key] = None
+        batch = []
+        batch_chars = 0
+        for document_id in assigned:
+            if document_id in fed:
+                continue
+            size = small_sizes.get(document_id)
+            if batch and (size is None or batch_chars + size > ANALYSIS_BATCH_MAX_CHARS or document_id in parked):
+                break
+            chunk_info = await get_next_chunk_async(document_id=document_id, agent_id=self.chunk_cursor_id)
+            if document_id in parked:
+                analysis = parked.pop(document_id)
+                if chunk_info.get("more_chunks_exist"):
+                    # A parked document continues its own partial analysis, alone
+                    state_delta[self.analysis_key] = analysis
+                    batch.append(chunk_info)
+                    batch_chars += len(chunk_info["chunk_content"])
+                    break
+            if not chunk_info.get("more_chunks_exist"):
+                # Exhausted, filtered out entirely (duplicates/budget) or unreadable
+                if chunk_info.get("error"):
+                    print(f"[ChunkFeeder][{self.analyzer_name}] Skipping '{document_id}': {chunk_info['error']}")
+                fed.append(document_id)
+                continue
+            batch.append(chunk_info)
+            batch_chars += len(chunk_info["chunk_content"])
+            # The cursor stays on a document with chunks left, so it must be the batch's last
+            if size is None or chunk_info["chunk_number"] < chunk_info["total_chunks"]:
+                break
+            fed.append(document_id)
+
+        if batch:
+            taken = {chunk_info["current_document"] for chunk_info in batch}
+            prefetch_documents(d for d in assigned if d not in fed and d not in taken and d not in parked)
+        state_delta[self.feed_state_key] = fed
+        if parked or parked_before:
+            state_delta[self.parked_state_key] = parked
+
+        if len(batch) == 1:
+            chunk_info = batch[0]
+            text = (f"Chunk {chunk_info['chunk_number']}/{chunk_info['total_chunks']} "
+                    f"of '{chunk_info['current_document']}' for {self.analyzer_name}")
+            yield self._event(ctx, text, {self.chunk_info_key: chunk_info, **state_delta})
+            return
+        if batch:
+            text = f"Batch of {len(batch)} small document(s) ({batch_chars} chars) for {self.analyzer_name}"
+            print(f"[ChunkFeeder][{self.analyzer_name}] {text}")
+            yield self._event(ctx, text, {self.chunk_info_key: build_batch_info(batch), **state_delta})
+            return
+
+        print(f"[ChunkFeeder][{self.analyzer_name}] All {len(fed)} assigned document(s) fed")
+        yield self._event(
+            ctx,
+            f"No more chunks for {self.analyzer_name}",
+            {self.chunk_info_key: {"more_chunks_exist": False}, **state_delta},
+            escalate=True,
+        )
+
+
+class ChunkFeedLoop(LoopAgent):
+    """Loop of a ChunkFeederAgent and its chunk analyzer that ends when the feeder runs dry."""
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        feeder = self.sub_agents[0]
+        # Start each run with no documents fed (assignments change between iterations)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={feeder.feed_state_key: []}),
+        )
+        async for event in super()._run_async_impl(ctx):
+            if event.actions.escalate and event.author == feeder.name:
+                # The loop above has already seen the escalation; keep it from ending outer loops
+                event = event.model_copy(update={"actions": event.actions.model_copy(update={"escalate": None})})
+            yield event
+
+
+def create_chunk_feeder_agent(agent_number: int, chunk_cursor_id: str = None, chunk_info_key: str = None,
+                              analysis_key: str = None):
+    """
+    Create the chunk feeder for a specific document analyzer.
+
+    Args:
+        agent_number: Number of the parent DocumentAnalyzer
+        chunk_cursor_id: agent_id of the chunk cursor; defaults to the parent's name
+        chunk_info_key: State key for the current chunk; defaults to chunk_info_N
+        analysis_key: State key of the running analysis; defaults to document_analysis_N
+    """
+    analyzer_name = f"DocumentAnalyzer{agent_number}"
+    return ChunkFeederAgent(
+        name=f"ChunkFeeder{agent_number}",
+        analyzer_name=analyzer_name,
+        chunk_cursor_id=chunk_cursor_id or analyzer_name,
+        chunk_info_key=chunk_info_key or f"chunk_info_{agent_number}",
+        analysis_output_key=analysis_key,
+        description=f"Feeds document chunks to {analyzer_name} without an LLM call",
+    )
@@ -0,0 +1,26 @@
+"""Corpus Q&A Agent - answers follow-up questions from the local corpus index."""
+
+from google.adk.agents import LlmAgent
+from ..tools import search_corpus_tool
+from .model_routing import resolve_model
+
+
+def create_corpus_qa_agent():
+    """Create and return the CorpusQAAgent.
+    
+    Answers questions about previously analyzed documents by searching the
+    corpus index built during pipeline runs, instead of re-running the pipeline.
+    """
+    return LlmAgent(
+        name="CorpusQAAgent",
+        model=resolve_model(stage="qa"),
+        instruction="""You answer follow-up questions about documents that were already analyzed.
+
+1. Call the 'search_corpus' tool with the key terms of the question (use k=5 unless more context is needed)
+2. Answer using ONLY the returned passages, citing the source document and chunk for each fact
+3. If the passages do not contain the answer, say so instead of guessing
+""",
+        description="Answers follow-up questions using the local corpus index.",
+        tools=[search_corpus_tool],
+        output_key="corpus_qa_answer"
+    )
@@ -6,20 +6,41 @@ Best Practices Applied:
 - Defensive state reading with .get() and defaults
 - Agent-specific result storage (document_analysis_N)
 - Callbacks that update shared state safely
+- Finished per-document analyses go to the result store, with only references in state
+- Speculative replicas keep their results apart until they win their race
 """
 
 import time
 import json
 import re
-from google.adk.agents import LlmAgent, LoopAgent
+from functools import partial
+from google.adk.agents import LlmAgent
 from google.adk.agents.callback_context import CallbackContext
-from ..tools import read_data_tool, list_example_files_tool, get_processing_status_tool, get_next_chunk_tool
+from ..tools import (
+    index_passage,
+    capture_session_state,
+    save_checkpoint,
+    update_processing_status,
+)
+from ..tools.result_store import RESULT_STORE_ENABLED, load_analysis, result_run_id, store_analysis
+from ..tools.scheduling import mark_deadline_outcome
+from .synthesis_agent import fold_completed_documents, fold_document_analyses
+from .model_routing import resolve_model
+from .analyzer_autoscaler import record_analysis_start_callback, record_document_latency
+from .chunk_feeder import ChunkFeedLoop, create_chunk_feeder_agent
+from .utils import split_batch_analysis
 
 
-GEMINI_MODEL = "gemini-2.5-flash"
+# Speculative replicas of a DocumentAnalyzer are named after it with this suffix
+REPLICA_SUFFIX = "_speculative"
 
 
-def update_document_analysis_callback(callback_context: CallbackContext):
+async def update_document_analysis_callback(callback_context: CallbackContext):
+    """After-agent callback of a DocumentAnalyzer: complete its assigned documents."""
+    return await complete_assigned_documents(callback_context, callback_context.agent_name)
+
+
+async def complete_assigned_documents(callback_context: CallbackContext, current_agent_name: str):
     """
     Updates the document processing status after analysis is complete.
     
@@ -27,8 +48,11 @@ def update_document_analysis_callback(callback_context: CallbackContext):
     - Reads todo_list_result safely with fallbacks
     - Updates only tasks assigned to this agent
     - Stores agent-specific results in separate state keys
+    
+    Args:
+        callback_context: Context of the DocumentAnalyzer (or of the race it won as a replica)
+        current_agent_name: Name of the DocumentAnalyzer
     """
-    current_agent_name = callback_context.agent_name
     print(f"[Callback] Analysis completed by: {current_agent_name}")
     
     # Step 1: Safely read todo_list_result with multiple fallback strategies
@@ -56,7 +80,13 @@ def update_document_analysis_callback(callback_context: CallbackContext):
         return None
 
     # Step 2: Mark pending tasks assigned to this agent as completed
+    # (each at the time its last chunk was analyzed, not when the whole queue was done)
+    keys = _result_keys(current_agent_name.replace("DocumentAnalyzer", ""))
+    finished_at = callback_context.state.get(keys["finished"]) or {}
+    # Batched documents the analysis had no section for fail rather than complete with foreign text
+    unsplit = callback_context.state.get(keys["unsplit"]) or {}
     tasks_updated = 0
+    completed_files = []
     print(f"[Callback] Current agent name is '{current_agent_name}'")
     
     for i, task in enumerate(todo_list):
@@ -68,11 +98,22 @@ def update_document_analysis_callback(callback_context: CallbackContext):
             print(f"[Callback] Task {i} Document: {filename}, Assigned: '{assigned_agent}', Status: {status}")
 
             # Update all pending tasks assigned to this agent
-            if assigned_agent == current_agent_name and status == "pending":
+            if assigned_agent == current_agent_name and status == "pending" and filename in unsplit:
+                task["status"] = "failed"
+                task["processed_at"] = unsplit[filename]
+                task["error"] = "the batched analysis had no section for this document"
+                tasks_updated += 1
+                print(f"[Callback] ✗ Marked document {filename} as failed: {task['error']}")
+            elif assigned_agent == current_agent_name and status == "pending":
                 task["status"] = "completed"
-                task["processed_at"] = time.time()
+                task["processed_at"] = finished_at.get(filename) or time.time()
                 tasks_updated += 1
+                completed_files.append(filename)
                 print(f"[Callback] ✓ Marked document {filename} as completed.")
+                late = mark_deadline_outcome(task)
+                if late is not None:
+                    print(f"[Scheduler] DEADLINE MISSED: {filename} ({task.get('priority', 'normal')}) "
+                          f"completed {late:.0f}s after its deadline")
     
     # Step 3: Update shared todo list in state
     if tasks_updated > 0:
@@ -85,53 +126,230 @@ def update_document_analysis_callback(callback_context: CallbackContext):
     # Extract agent number from name (e.g., "DocumentAnalyzer1" -> "1")
     agent_result_key = f"{current_agent_name}_completed_at"
     callback_context.state[agent_result_key] = time.time()
+    callback_context.state[keys["finished"]] = None
+    callback_context.state[keys["unsplit"]] = None
     print(f"[Callback] Stored completion timestamp in state key: {agent_result_key}")
+    
+    # Step 5: Index the finished analysis for follow-up search_corpus queries
+    # (with the result store, each document was stored and indexed when its last chunk was analyzed)
+    agent_number = current_agent_name.replace("DocumentAnalyzer", "")
+    analysis = callback_context.state.get(f"document_analysis_{agent_number}")
+    if RESULT_STORE_ENABLED:
+        _store_unfinished_documents(callback_context, agent_number, completed_files)
+    elif isinstance(analysis, str) and completed_files:
+        index_passage(analysis, "document_analysis", ", ".join(completed_files), agent=current_agent_name)
+    
+    # Per-document latency drives the analyzer pool size of later iterations
+    record_document_latency(callback_context, completed_files, current_agent_name)
+    
+    # Checkpoint immediately: completed documents must never be re-analyzed after a restart
+    capture_session_state(callback_context.state)
+    save_checkpoint(force=True)
+    
+    # Step 6: In streaming synthesis mode, fold documents not folded at their last chunk
+    # (returned content is emitted as an event carrying the new report version)
+    return await fold_completed_documents(callback_context, current_agent_name, completed_files)
 
 
-def create_document_chunk_manager_agent(agent_number: int):
-    """Create a chunk manager agent for a specific document analyzer."""
-    agent_name = f"DocumentChunkManager{agent_number}"
-    parent_agent_name = f"DocumentAnalyzer{agent_number}"
+def _is_last_chunk(chunk_info: dict) -> bool:
+    """True if the chunk is the last one of its document that is analyzed."""
+    if "last_chunk" in chunk_info:
+        return bool(chunk_info["last_chunk"])
+    return (chunk_info.get("chunk_number") or 0) >= (chunk_info.get("total_chunks") or 0) > 0
+
+
+def _result_keys(agent_number, chunk_cursor_id: str = None) -> dict:
+    """
+    State keys a DocumentAnalyzer, or a speculative replica of it, keeps its results under.
     
-    return LlmAgent(
-        name=agent_name,
-        model=GEMINI_MODEL,
-        instruction=f"""You are managing the document chunking process for {parent_agent_name}.
+    - analysis: the running analysis (document_analysis_N for the analyzer itself)
+    - staged: finished analyses held until a replica wins its race; None for the analyzer itself
+    - finished: document_id -> time the document's last chunk was analyzed
+    - unsplit: batched documents the batch analysis had no section for
+    """
+    agent_name = f"DocumentAnalyzer{agent_number}"
+    chunk_cursor_id = chunk_cursor_id or agent_name
+    replica = chunk_cursor_id != agent_name
+    return {
+        "analysis": f"document_analysis_{chunk_cursor_id}" if replica else f"document_analysis_{agent_number}",
+        "staged": f"{chunk_cursor_id}_staged_analyses" if replica else None,
+        "finished": f"{chunk_cursor_id}_documents_finished_at",
+        "unsplit": f"{chunk_cursor_id}_unsplit_documents",
+    }
 
-IMPORTANT: You are working for agent: {parent_agent_name}
-AGENT_ID: DocumentAnalyzer{agent_number}
-
-Your task:
-1. Look at the todo_list_result to find documents assigned to '{parent_agent_name}': {{todo_list_result}}
-2. ONLY process documents where assigned_agent == '{parent_agent_name}'
-3. For each assigned document, call the 'get_next_chunk' tool with:
-   - document_id: the document filename
-   - agent_id: 'DocumentAnalyzer{agent_number}' (to maintain separate state per agent)
-4. The tool will return chunk_info with: chunk_content, chunk_number, total_chunks, more_chunks_exist, current_document
-5. When more_chunks_exist is False for all your documents, stop and let the analyzer finish
-
-Output the chunk information for the analyzer to process.
-Do not call exit_loop - that will be handled by the main loop control.
-""",
-        tools=[get_next_chunk_tool, read_data_tool, list_example_files_tool, get_processing_status_tool],
-        output_key=f"chunk_info_{agent_number}"
-    )
+
+def _record_documents(callback_context: CallbackContext, key: str, document_ids: list):
+    """Record the time of each document under a finished/unsplit key; the todo list is completed from these."""
+    recorded = dict(callback_context.state.get(key) or {})
+    now = time.time()
+    for document_id in document_ids:
+        recorded.setdefault(document_id, now)
+    callback_context.state[key] = recorded
+
+
+def _store_document_results(callback_context: CallbackContext, agent_number: str, analyses: dict, remaining: str = None,
+                            keys: dict = None):
+    """Move finished per-document analyses from session state to the result store.
+
+    Args:
+        callback_context: Context of the chunk analyzer or DocumentAnalyzer
+        agent_number: Number of the DocumentAnalyzer
+        analyses: document_id -> final analysis
+        remaining: Analysis of a document still in progress, kept in document_analysis_N
+        keys: _result_keys of the analyzer; a speculative replica's analyses are staged
+              instead of stored, until it wins its race
+    """
+    agent_name = f"DocumentAnalyzer{agent_number}"
+    keys = keys or _result_keys(agent_number)
+    if keys["staged"] is not None:
+        staged = dict(callback_context.state.get(keys["staged"]) or {})
+        staged.update(analyses)
+        callback_context.state[keys["staged"]] = staged
+        callback_context.state[keys["analysis"]] = remaining
+        print(f"[Speculative][{agent_name}] Staged analysis of {', '.join(analyses)}")
+        return
+    run_id = result_run_id(callback_context.state, callback_context.invocation_id)
+    refs = []
+    for document_id, analysis in analyses.items():
+        refs.append(store_analysis(run_id, document_id, analysis, agent=agent_name))
+        index_passage(analysis, "document_analysis", document_id, agent=agent_name)
+    callback_context.state[f"document_results_{agent_number}"] = refs
+    # The analyzer's next document starts a new analysis instead of extending (and losing) this one
+    callback_context.state[keys["analysis"]] = remaining
+    print(f"[ResultStore][{agent_name}] Stored analysis of {', '.join(analyses)}")
 
 
-def create_document_chunk_analyzer_agent(agent_number: int):
-    """Create a chunk analyzer agent for a specific document analyzer."""
+def _store_unfinished_documents(callback_context: CallbackContext, agent_number: str, completed_files: list):
+    """Store what is left in document_analysis_N for completed documents whose last chunk was never analyzed."""
+    analysis = callback_context.state.get(f"document_analysis_{agent_number}")
+    if not isinstance(analysis, str) or not completed_files:
+        return
+    run_id = result_run_id(callback_context.state, callback_context.invocation_id)
+    missing = [filename for filename in completed_files if load_analysis(run_id, filename) is None]
+    if missing:
+        _store_document_results(callback_context, agent_number, {filename: analysis for filename in missing})
+
+
+async def index_chunk_analysis_callback(callback_context: CallbackContext, chunk_info_key: str = None,
+                                        chunk_cursor_id: str = None):
+    """Indexes the running analysis produced for the chunk that was just analyzed.
+
+    Documents finished by this chunk are folded into the streaming synthesis
+    report right away; a speculative replica's are folded when it wins its race.
+    """
+    agent_number = callback_context.agent_name.replace("DocumentChunkAnalyzer", "")
+    keys = _result_keys(agent_number, chunk_cursor_id)
+    analysis = callback_context.state.get(keys["analysis"])
+    if not isinstance(analysis, str):
+        return None
+    
+    # chunk_info_N is written by the chunk feeder (older sessions may hold it as a JSON string)
+    chunk_info = callback_context.state.get(chunk_info_key or f"chunk_info_{agent_number}")
+    if isinstance(chunk_info, str):
+        try:
+            chunk_info = json.loads(chunk_info)
+        except json.JSONDecodeError:
+            chunk_info = None
+    if not isinstance(chunk_info, dict):
+        chunk_info = {}
+    
+    finished = {}
+    if chunk_info.get("batch"):
+        finished = _split_batch_results(callback_context, agent_number, analysis, chunk_info, keys)
+    else:
+        index_passage(
+            analysis,
+            "chunk_analysis",
+            chunk_info.get("current_document"),
+            chunk_info.get("chunk_number"),
+            agent=f"DocumentAnalyzer{agent_number}",
+        )
+        if chunk_info.get("current_document") and _is_last_chunk(chunk_info):
+            _record_documents(callback_context, keys["finished"], [chunk_info["current_document"]])
+            finished = {chunk_info["current_document"]: analysis}
+            if RESULT_STORE_ENABLED:
+                _store_document_results(callback_context, agent_number, finished, keys=keys)
+    
+    report = None
+    if keys["staged"] is None:
+        report = await fold_document_analyses(callback_context, f"DocumentAnalyzer{agent_number}", finished)
+    
+    # The partial analysis is progress worth keeping across a restart
+    capture_session_state(callback_context.state)
+    save_checkpoint()
+    return report
+
+
+def _split_batch_results(callback_context: CallbackContext, agent_number: str, analysis: str, chunk_info: dict,
+                         keys: dict):
+    """Store, index and track each document of a batched analysis call separately.
+
+    A document the analysis has no section for is recorded as unsplit rather
+    than given the other documents' analyses; it fails instead of completing.
+
+    Returns:
+        document_id -> analysis of the documents the batch finished
+    """
+    agent_name = f"DocumentAnalyzer{agent_number}"
+    sections = split_batch_analysis(analysis, chunk_info.get("documents", []))
+    unsplit = [document_id for document_id in chunk_info.get("documents", []) if document_id not in sections]
+    if unsplit:
+        print(f"[Batching][{agent_name}] No section for {', '.join(unsplit)} in the batch analysis; "
+              f"marking them unsplit")
+        _record_documents(callback_context, keys["unsplit"], unsplit)
+    
+    finished = {}
+    in_progress = []
+    for chunk in chunk_info.get("chunks", []):
+        document_id = chunk["current_document"]
+        if document_id not in sections:
+            if _is_last_chunk(chunk):
+                update_processing_status(document_id, "failed")
+            continue
+        section = sections[document_id]
+        index_passage(section, "chunk_analysis", document_id, chunk["chunk_number"], agent=agent_name)
+        # Batched documents are complete once their last chunk has been analyzed
+        if _is_last_chunk(chunk):
+            update_processing_status(document_id, "completed")
+            finished[document_id] = section
+        else:
+            in_progress.append(section)
+    if RESULT_STORE_ENABLED:
+        if finished:
+            # A batch may end with the first chunk of a larger document, whose analysis continues
+            _store_document_results(callback_context, agent_number, finished, "\n\n".join(in_progress) or None, keys)
+    else:
+        analyses_key = keys["staged"] or f"document_analyses_{agent_number}"
+        analyses = dict(callback_context.state.get(analyses_key) or {})
+        analyses.update(finished)
+        callback_context.state[analyses_key] = analyses
+    _record_documents(callback_context, keys["finished"], list(finished))
+    print(f"[Batching][{agent_name}] Split batch analysis into {len(finished) + len(in_progress)} document result(s)")
+    return finished
+
+
+def create_document_chunk_analyzer_agent(agent_number: int, chunk_info_key: str = None, chunk_cursor_id: str = None):
+    """Create a chunk analyzer agent for a specific document analyzer.
+    
+    Args:
+        agent_number: Number of the parent DocumentAnalyzer
+        chunk_info_key: State key holding the chunk to analyze; defaults to chunk_info_N
+        chunk_cursor_id: Chunk cursor of the parent; a speculative replica's own id keeps its results apart
+    """
     agent_name = f"DocumentChunkAnalyzer{agent_number}"
     parent_agent_name = f"DocumentAnalyzer{agent_number}"
+    chunk_info_key = chunk_info_key or f"chunk_info_{agent_number}"
+    analysis_key = _result_keys(agent_number, chunk_cursor_id)["analysis"]
     
     return LlmAgent(
         name=agent_name,
-        model=GEMINI_MODEL,
+        model=resolve_model(stage="chunk_analysis"),
         instruction=f"""You are analyzing document chunks for {parent_agent_name}.
 
 IMPORTANT: You are working for agent: {parent_agent_name}
 
-CHUNK INFORMATION: {{chunk_info_{agent_number}}}
-EXISTING ANALYSIS: {{document_analysis_{agent_number}:No analysis yet}}
+CHUNK INFORMATION: {{{chunk_info_key}}}
+EXISTING ANALYSIS (empty if there is none yet): {{{analysis_key}?}}
 
 Based on the chunk provided, extract key information and merge it with the existing analysis.
 
@@ -141,6 +359,9 @@ ANALYSIS RULES:
 3. If no existing analysis, create a new one based on the current chunk.
 4. Include metadata: document name, chunk number being analyzed.
 5. Extract: key findings, important data, themes, and patterns.
+6. If the chunk information has "batch": true, it holds several small documents in "chunks".
+   Analyze each of them separately and give every document in the batch its own section,
+   starting with the line "### Document: <current_document>", after the existing analysis.
 
 Output Format:
 - Document: [name]
@@ -152,52 +373,101 @@ Output Format:
 - Running Analysis: [Comprehensive summary so far]
 """,
         description=f"Analyzes document chunks for {parent_agent_name}",
-        output_key=f"document_analysis_{agent_number}"
+        output_key=analysis_key,
+        after_agent_callback=partial(
+            index_chunk_analysis_callback,
+            chunk_info_key=chunk_info_key,
+            chunk_cursor_id=chunk_cursor_id,
+        )
     )
 
 
-def create_document_analysis_agent(agent_number: int):
+def create_document_analysis_agent(agent_number: int, chunk_cursor_id: str = None):
     """
     Create a complete document analysis agent that uses chunking internally.
     
-    This agent combines chunk management and analysis in a loop to process
-    documents assigned to it through the todo list.
+    A code-driven chunk feeder and an LLM chunk analyzer run in a loop over the
+    documents assigned to this agent through the todo list: the feeder writes the
+    next chunk to state, the analyzer folds it into document_analysis_N, and the
+    loop ends when the feeder has no chunks left. Each chunk costs one LLM call.
     
     Args:
         agent_number: Unique number for this agent (1, 2, 3, etc.)
+        chunk_cursor_id: agent_id used for get_next_chunk state; defaults to the agent name.
+                         Speculative replicas use their own id so they do not share a cursor.
     """
     agent_name = f"DocumentAnalyzer{agent_number}"
+    chunk_cursor_id = chunk_cursor_id or agent_name
+    if chunk_cursor_id == agent_name:
+        chunk_info_key = f"chunk_info_{agent_number}"
+        callbacks = {
+            "before_agent_callback": record_analysis_start_callback,
+            "after_agent_callback": update_document_analysis_callback,
+        }
+    else:
+        # Replicas get their own chunk slot so they never analyze the original's chunk, and their
+        # own analysis keys so the two copies never write each other's; the race settles the results
+        chunk_info_key = f"chunk_info_{chunk_cursor_id}"
+        callbacks = {}
     
-    chunk_manager = create_document_chunk_manager_agent(agent_number)
-    chunk_analyzer = create_document_chunk_analyzer_agent(agent_number)
-    
-    # Create internal loop for chunk processing
-    document_analysis_loop = LoopAgent(
-        name=f"DocumentAnalysisLoop{agent_number}",
-        sub_agents=[chunk_manager, chunk_analyzer],
-        max_iterations=100,  # High limit to process all chunks for all assigned documents
-        description=f"Processes document chunks for {agent_name}"
-    )
+    analysis_key = _result_keys(agent_number, chunk_cursor_id)["analysis"]
+    chunk_feeder = create_chunk_feeder_agent(agent_number, chunk_cursor_id, chunk_info_key, analysis_key)
+    chunk_analyzer = create_document_chunk_analyzer_agent(agent_number, chunk_info_key, chunk_cursor_id)
     
-    # Wrap in an LLM agent that handles the overall analysis and state updates
-    return LlmAgent(
+    return ChunkFeedLoop(
         name=agent_name,
-        model=GEMINI_MODEL,
-        instruction="""You are a Document Analysis Agent responsible for analyzing documents assigned to you.
+        sub_agents=[chunk_feeder, chunk_analyzer],
+        # The feeder escalates when its documents are exhausted; this only bounds runaway loops
+        max_iterations=10000,
+        description=f"Analyzes assigned documents chunk by chunk: {agent_name}",
+        **callbacks,
+    )
 
-ASSIGNED WORK: {todo_list_result}
 
-Your workflow:
-1. Process all documents assigned to you in the todo list
-2. For each document, the chunk processing loop will handle chunking and analysis
-3. Build a comprehensive summary of all your assigned documents
-4. Return the final analysis for synthesis
+def create_speculative_replica(agent):
+    """Build an independent copy of a DocumentAnalyzer for speculative re-execution.
+    
+    The replica keeps the original's name but uses its own chunk cursor and
+    analysis keys. Its finished analyses are staged, and only become the
+    analyzer's when it wins the race (settle_speculative_race).
+    """
+    agent_number = int(agent.name.replace("DocumentAnalyzer", ""))
+    return create_document_analysis_agent(agent_number, chunk_cursor_id=f"{agent.name}{REPLICA_SUFFIX}")
 
-Focus on extracting key insights, findings, and important data from each document.
-Include document names and key themes in your analysis.
-""",
-        description=f"Analyzes assigned documents with chunking: {agent_name}",
-        tools=[get_next_chunk_tool, read_data_tool, list_example_files_tool, get_processing_status_tool],
-        output_key=f"document_analysis_{agent_number}",  # Use consistent naming for synthesis agent
-        after_agent_callback=update_document_analysis_callback
-    )
+
+async def settle_speculative_race(callback_context: CallbackContext, agent, replica_won: bool):
+    """
+    Race settler of SpeculativeParallelAgent for DocumentAnalyzers.
+    
+    A winning replica's staged analyses are stored and its running analysis
+    becomes document_analysis_N, then the analyzer's documents are completed
+    as the original's callback would have. A losing replica's results are dropped.
+    
+    Returns:
+        Partial report content in streaming synthesis mode, else None
+    """
+    agent_number = agent.name.replace("DocumentAnalyzer", "")
+    keys = _result_keys(agent_number)
+    replica_keys = _result_keys(agent_number, f"{agent.name}{REPLICA_SUFFIX}")
+    replica_results = {name: callback_context.state.get(key) for name, key in replica_keys.items()}
+    for key in replica_keys.values():
+        callback_context.state[key] = None
+    if not replica_won:
+        return None
+    
+    # A document both copies finished keeps the original's (earlier) time
+    for name in ("finished", "unsplit"):
+        callback_context.state[keys[name]] = {
+            **(replica_results[name] or {}),
+            **(callback_context.state.get(keys[name]) or {}),
+        }
+    staged = replica_results["staged"] or {}
+    if RESULT_STORE_ENABLED and staged:
+        _store_document_results(callback_context, agent_number, staged, replica_results["analysis"])
+    else:
+        callback_context.state[keys["analysis"]] = replica_results["analysis"]
+        if staged:
+            analyses = dict(callback_context.state.get(f"document_analyses_{agent_number}") or {})
+            analyses.update(staged)
+            callback_context.state[f"document_analyses_{agent_number}"] = analyses
+    return await complete_assigned_documents(callback_context, agent.name)
@@ -1,21 +1,60 @@
 """File Todo List Agent - creates a todo list of files in example_data directory."""
 
+import json
 from google.adk.agents import LlmAgent
-from ..tools import read_data_tool, list_example_files_tool, get_processing_status_tool
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from .model_routing import resolve_model
+from ..tools import read_data_async_tool, list_example_files_async_tool, get_processing_status_async_tool, checkpoint_callback, restore_checkpoint_callback
 
-GEMINI_MODEL = "gemini-2.5-flash"
+# Session state key for a todo list built by the caller (e.g. the batch CLI)
+SEEDED_TODO_LIST_KEY = "seeded_todo_list"
+
+
+def build_todo_list(documents: list) -> list:
+    """Build a pending todo list for documents as returned by list_documents()."""
+    return [
+        {
+            "filename": doc["document_id"],
+            "moddt": doc["mod_time"],
+            "status": "pending",
+            "processed_at": None,
+            "assigned_agent": None,
+        }
+        for doc in documents
+    ]
+
+
+def use_seeded_todo_list_callback(callback_context: CallbackContext):
+    """
+    Before-agent callback: use a todo list seeded in the session state instead of asking the model.
+
+    Listing thousands of files through a model call is slow and unreliable, so
+    callers that already know the documents put the list under
+    SEEDED_TODO_LIST_KEY and the agent is skipped.
+    """
+    seeded = callback_context.state.get(SEEDED_TODO_LIST_KEY)
+    if not seeded:
+        return None
+    callback_context.state[SEEDED_TODO_LIST_KEY] = None
+    print(f"[FileTodoListAgent] Using the seeded todo list of {len(seeded)} file(s)")
+    # The returned text is what output_key stores as todo_list_result
+    return types.Content(role="model", parts=[types.Part(text=json.dumps(seeded))])
 
 
 def create_file_todo_list_agent():
     """Create and return the FileTodoListAgent."""
     return LlmAgent(
         name="FileTodoListAgent",
-        model=GEMINI_MODEL,
+        model=resolve_model(stage="todo"),
         instruction="""You are an AI File Todo List Agent, you check what files are in the example_data directory and create a todo list based on the file names.
 Use the Read Example Data tool to list the files in the example_data directory.
 Todo List format out as json: filename | moddt  | status  | processed_at | assigned_agent
 """,
         description="Creates a todo list of files from example_data directory.",
-        tools=[read_data_tool, list_example_files_tool, get_processing_status_tool],
-        output_key="todo_list_result"
+        tools=[read_data_async_tool, list_example_files_async_tool, get_processing_status_async_tool],
+        output_key="todo_list_result",
+        # A seeded list or a saved run (when resuming) skips building the list
+        before_agent_callback=[use_seeded_todo_list_callback, restore_checkpoint_callback],
+        after_agent_callback=checkpoint_callback
     )
@@ -0,0 +1,114 @@
+"""Hedged LLM calls - re-issue a model call that runs past its latency percentile.
+
+HedgedModel wraps a model (Gemini in practice) and records the latency of every
+call per stage. model_routing wraps each stage's models in a HedgedModel when
+LLM_HEDGING_ENABLED=1. Once enough samples exist, a call that is still running after
+the stage's percentile threshold gets a duplicate request; the first response
+wins and the slower call is cancelled.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncGenerator, Optional
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+# Minimum samples before a stage's percentile is trusted, and the floor on the hedge delay
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2.0"))
+
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """Rolling latency samples per key (model stage, analyzer, ...)."""
+    # key -> deque of durations in seconds
+    samples = {}
+    # key -> {"calls": int, "hedges": int, "hedge_wins": int}
+    hedge_stats = {}
+
+    @classmethod
+    def record(cls, key: str, seconds: float):
+        cls.samples.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    @classmethod
+    def percentile(cls, key: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Return the q-quantile of the recorded samples, or None if there are too few."""
+        values = cls.samples.get(key)
+        if not values or len(values) < min_samples:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgedModel(BaseLlm):
+    """Model wrapper that issues a hedged duplicate for slow non-streaming calls."""
+
+    inner: BaseLlm
+    """The model that actually serves requests."""
+
+    stage: str = "default"
+    """Latency bucket for this model's calls (e.g. 'chunk_analysis')."""
+
+    hedge_percentile: float = LLM_HEDGE_PERCENTILE
+
+    async def _collect(self, llm_request: LlmRequest) -> list:
+        return [response async for response in self.inner.generate_content_async(llm_request, stream=False)]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        key = f"{self.stage}:{self.inner.model}"
+        stats = LatencyTracker.hedge_stats.setdefault(key, {"calls": 0, "hedges": 0, "hedge_wins": 0})
+        stats["calls"] += 1
+        started = time.monotonic()
+
+        # Streaming responses are forwarded as they arrive and cannot be raced
+        if stream:
+            async for response in self.inner.generate_content_async(llm_request, stream=True):
+                yield response
+            LatencyTracker.record(key, time.monotonic() - started)
+            return
+
+        threshold = LatencyTracker.percentile(key, self.hedge_percentile, LLM_HEDGE_MIN_SAMPLES)
+        primary = asyncio.create_task(self._collect(llm_request.model_copy(deep=True)))
+        tasks = {primary}
+        hedge = None
+        try:
+            if threshold is not None:
+                delay = max(threshold, LLM_HEDGE_MIN_DELAY_SECONDS)
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    print(f"[Hedging] {key} call exceeded p{int(self.hedge_percentile * 100)} ({delay:.1f}s), issuing hedged request")
+                    stats["hedges"] += 1
+                    hedge = asyncio.create_task(self._collect(llm_request.model_copy(deep=True)))
+                    tasks.add(hedge)
+
+            # First successful result wins; a failed call falls back to the other one
+            responses = None
+            error = None
+            while tasks and responses is None:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        responses = task.result()
+                        if task is hedge:
+                            stats["hedge_wins"] += 1
+                        break
+                    error = task.exception()
+            if responses is None:
+                raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        LatencyTracker.record(key, time.monotonic() - started)
+        for response in responses:
+            yield response
+
+    def connect(self, llm_request: LlmRequest):
+        return self.inner.connect(llm_request)
+
@@ -0,0 +1,103 @@
+"""Loop Controller - ends FileProcessingLoop deterministically when no work is pending.
+
+Runs first in every FileProcessingLoop iteration. It reads the todo list from
+state and escalates (ending the loop) as soon as no file is pending, so the
+planner LLM is never called just to find out that the work is done. A todo
+list that cannot be read does not end the loop: the iteration goes on, so the
+planner re-plans it (bounded by the loop's max_iterations).
+
+Each iteration is counted in state (``<loop>_iteration``) and recorded on the
+controller's trace span as ``loop.*`` attributes, so traces show how many
+iterations a run took and why the loop stopped.
+"""
+
+from typing import AsyncGenerator, Optional
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+from opentelemetry import trace
+from .utils import is_todo_list_readable, parse_todo_list, pending_files
+
+
+class LoopController(BaseAgent):
+    """Code agent that counts loop iterations and escalates once no files are pending."""
+
+    loop_name: str
+    """Name of the LoopAgent this controller runs in (used for state keys and traces)."""
+
+    max_iterations: Optional[int] = None
+    """The loop's max_iterations, to report when work is left over after the last iteration."""
+
+    @property
+    def iteration_key(self) -> str:
+        """State key holding the current iteration number."""
+        return f"{self.loop_name}_iteration"
+
+    def _iteration(self, ctx: InvocationContext) -> int:
+        # Count per invocation: a resumed session starts the loop again at 1
+        if ctx.session.state.get(f"{self.iteration_key}_invocation") != ctx.invocation_id:
+            return 1
+        return ctx.session.state.get(self.iteration_key, 0) + 1
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        iteration = self._iteration(ctx)
+        todo_list_raw = ctx.session.state.get("todo_list_result")
+        readable = is_todo_list_readable(todo_list_raw)
+        todo_list = parse_todo_list(todo_list_raw)
+        pending = pending_files(todo_list)
+        done = readable and not pending
+
+        if not readable:
+            message = f"{self.loop_name} iteration {iteration}: no readable todo list, re-planning"
+        elif done:
+            message = f"{self.loop_name} iteration {iteration}: all {len(todo_list)} file(s) completed, stopping"
+        else:
+            message = f"{self.loop_name} iteration {iteration}: {len(pending)} of {len(todo_list)} file(s) pending"
+            if self.max_iterations and iteration == self.max_iterations:
+                message += " (last iteration)"
+        print(f"[LoopController] {message}")
+
+        span = trace.get_current_span()
+        span.set_attribute("loop.name", self.loop_name)
+        span.set_attribute("loop.iteration", iteration)
+        span.set_attribute("loop.files_total", len(todo_list))
+        span.set_attribute("loop.files_pending", len(pending))
+        if self.max_iterations:
+            span.set_attribute("loop.max_iterations", self.max_iterations)
+        if not readable:
+            span.set_attribute("loop.todo_list_unreadable", True)
+        if done:
+            span.set_attribute("loop.exit_reason", "no_pending_files")
+            # Iterations that did work (this one only checked)
+            span.set_attribute("loop.iterations_completed", iteration - 1)
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=message)]),
+            actions=EventActions(
+                state_delta={
+                    self.iteration_key: iteration,
+                    f"{self.iteration_key}_invocation": ctx.invocation_id,
+                },
+                escalate=done or None,
+            ),
+        )
+
+
+def create_loop_controller(loop_name: str = "FileProcessingLoop", max_iterations: Optional[int] = None):
+    """
+    Create the controller that runs first in each iteration of a file processing loop.
+
+    Args:
+        loop_name: Name of the enclosing LoopAgent
+        max_iterations: The enclosing loop's max_iterations
+    """
+    return LoopController(
+        name=f"{loop_name}Controller",
+        loop_name=loop_name,
+        max_iterations=max_iterations,
+        description="Counts loop iterations and ends the loop when no files are pending.",
+    )
@@ -0,0 +1,246 @@
+"""Model routing - the one place that decides which model serves each pipeline stage.
+
+Every LlmAgent gets its model from resolve_model(stage). A stage is routed to
+a tier (fast, balanced, quality) or to an explicit model name, optionally with
+fallback models that are tried when a call times out or fails:
+
+    MODEL_TIER_FAST=gemini-2.5-flash-lite
+    MODEL_STAGE_CHUNK_ANALYSIS=fast
+    MODEL_STAGE_CHUNK_ANALYSIS_FALLBACKS=balanced
+    MODEL_STAGE_CHUNK_ANALYSIS_TIMEOUT_SECONDS=20
+
+Every call is recorded per stage and model (latency, tokens, timeouts and
+fallbacks); get_model_usage_report summarizes them, and the live metrics
+endpoint (tools/live_metrics.py) shows them with the calls in flight per agent.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncGenerator, List, Optional
+from google.adk.models import BaseLlm, Gemini, LlmRequest, LlmResponse
+from ..tools.live_metrics import llm_call_finished, llm_call_started, observe_llm_call, register_collector
+from .hedged_model import LLM_HEDGING_ENABLED, HedgedModel, LatencyTracker
+
+MODEL_TIERS = {
+    "fast": os.getenv("MODEL_TIER_FAST", "gemini-2.5-flash-lite"),
+    "balanced": os.getenv("MODEL_TIER_BALANCED", "gemini-2.5-flash"),
+    "quality": os.getenv("MODEL_TIER_QUALITY", "gemini-2.5-pro"),
+}
+
+# Stage -> default tier (override with MODEL_STAGE_<STAGE>)
+STAGE_ROUTES = {
+    "todo": "balanced",
+    "plan": "balanced",
+    "chunk_analysis": "balanced",
+    "chunk_management": "balanced",
+    "summarize": "balanced",
+    "synthesis": "balanced",
+    "streaming_synthesis": "balanced",
+    "qa": "balanced",
+}
+DEFAULT_STAGE_TIER = "balanced"
+
+# Per-call timeout before falling back (0 = wait indefinitely)
+MODEL_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIMEOUT_SECONDS", "0"))
+
+USAGE_WINDOW = 1000
+
+# ADK labels every model request with the name of the agent making it
+AGENT_NAME_LABEL = "adk_agent_name"
+
+
+class ModelUsage:
+    """Call statistics per (stage, model)."""
+    # (stage, model) -> {"calls", "errors", "timeouts", "fallbacks", "prompt_tokens", "output_tokens", "latencies"}
+    stats = {}
+    # invocation_id -> stage -> latencies of the calls made while the run is in progress
+    run_latencies = {}
+
+    @classmethod
+    def entry(cls, stage: str, model: str) -> dict:
+        return cls.stats.setdefault((stage, model), {
+            "calls": 0, "errors": 0, "timeouts": 0, "fallbacks": 0,
+            "prompt_tokens": 0, "output_tokens": 0, "latencies": deque(maxlen=USAGE_WINDOW),
+        })
+
+
+def _agent_name(llm_request: LlmRequest) -> str:
+    labels = llm_request.config.labels if llm_request.config is not None else None
+    return (labels or {}).get(AGENT_NAME_LABEL, "unknown")
+
+
+def _model_name(name: str) -> str:
+    """Resolve a tier name to its model; other names are model names already."""
+    return MODEL_TIERS.get(name.strip().lower(), name.strip())
+
+
+def stage_route(stage: str) -> tuple:
+    """
+    Return the configured route for a stage.
+
+    Returns:
+        (model, fallback models, timeout in seconds or None)
+    """
+    env_stage = f"MODEL_STAGE_{stage.upper()}"
+    model = _model_name(os.getenv(env_stage) or STAGE_ROUTES.get(stage, DEFAULT_STAGE_TIER))
+    fallbacks = [
+        _model_name(name) for name in os.getenv(f"{env_stage}_FALLBACKS", "").split(",") if name.strip()
+    ]
+    timeout = float(os.getenv(f"{env_stage}_TIMEOUT_SECONDS", str(MODEL_TIMEOUT_SECONDS)))
+    return model, [name for name in fallbacks if name != model], (timeout if timeout > 0 else None)
+
+
+def _base_model(model_name: str, stage: str) -> BaseLlm:
+    inner = Gemini(model=model_name)
+    if LLM_HEDGING_ENABLED:
+        return HedgedModel(model=model_name, inner=inner, stage=stage)
+    return inner
+
+
+class RoutedModel(BaseLlm):
+    """Model for one stage: records usage per model and falls back on timeouts and errors."""
+
+    candidates: List[BaseLlm]
+    """Primary model first, then fallbacks in order."""
+
+    stage: str = "default"
+
+    timeout_seconds: Optional[float] = None
+    """Per-attempt timeout for non-streaming calls; None waits indefinitely."""
+
+    def _record(self, model: BaseLlm, started: float, responses: list):
+        seconds = time.monotonic() - started
+        stats = ModelUsage.entry(self.stage, model.model)
+        stats["latencies"].append(seconds)
+        for latencies in list(ModelUsage.run_latencies.values()):
+            latencies.setdefault(self.stage, []).append(seconds)
+        observe_llm_call(self.stage, model.model, seconds)
+        usage = next((r.usage_metadata for r in reversed(responses) if r.usage_metadata), None)
+        if usage is not None:
+            stats["prompt_tokens"] += usage.prompt_token_count or 0
+            stats["output_tokens"] += usage.candidates_token_count or 0
+        # HedgedModel keeps its own samples; record the others for pool sizing
+        if not isinstance(model, HedgedModel):
+            LatencyTracker.record(f"{self.stage}:{model.model}", seconds)
+
+    async def _collect(self, model: BaseLlm, llm_request: LlmRequest) -> list:
+        return [response async for response in model.generate_content_async(llm_request, stream=False)]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        agent = _agent_name(llm_request)
+        llm_call_started(agent, self.stage)
+        try:
+            async for response in self._generate(llm_request, stream):
+                yield response
+        finally:
+            llm_call_finished(agent, self.stage)
+
+    async def _generate(self, llm_request: LlmRequest, stream: bool) -> AsyncGenerator[LlmResponse, None]:
+        # Streaming responses are forwarded as they arrive and cannot be retried
+        if stream:
+            model = self.candidates[0]
+            ModelUsage.entry(self.stage, model.model)["calls"] += 1
+            started = time.monotonic()
+            responses = []
+            async for response in model.generate_content_async(llm_request, stream=True):
+                responses.append(response)
+                yield response
+            self._record(model, started, responses)
+            return
+
+        last_error = None
+        for attempt, model in enumerate(self.candidates):
+            stats = ModelUsage.entry(self.stage, model.model)
+            stats["calls"] += 1
+            if attempt:
+                stats["fallbacks"] += 1
+            request = llm_request.model_copy(deep=True)
+            request.model = model.model
+            started = time.monotonic()
+            try:
+                responses = await asyncio.wait_for(self._collect(model, request), timeout=self.timeout_seconds)
+            except asyncio.TimeoutError as e:
+                stats["timeouts"] += 1
+                last_error = e
+                print(f"[ModelRouting] {self.stage}: {model.model} timed out after {self.timeout_seconds:g}s")
+                continue
+            except Exception as e:
+                stats["errors"] += 1
+                last_error = e
+                print(f"[ModelRouting] {self.stage}: {model.model} failed: {e}")
+                continue
+            self._record(model, started, responses)
+            for response in responses:
+                yield response
+            return
+        raise last_error
+
+    def connect(self, llm_request: LlmRequest):
+        return self.candidates[0].connect(llm_request)
+
+
+def resolve_model(stage: str = "default") -> BaseLlm:
+    """
+    Return the model to give an LlmAgent for a pipeline stage.
+
+    Args:
+        stage: Pipeline stage (e.g. 'plan', 'chunk_analysis', 'synthesis'); selects
+               the route and is the bucket for latency, token and hedging statistics
+
+    Returns:
+        A RoutedModel for the stage's primary model and its fallbacks
+    """
+    model_name, fallbacks, timeout = stage_route(stage)
+    return RoutedModel(
+        model=model_name,
+        candidates=[_base_model(name, stage) for name in [model_name] + fallbacks],
+        stage=stage,
+        timeout_seconds=timeout,
+    )
+
+
+def _usage_metrics() -> list:
+    """Model usage counters for the live metrics endpoint."""
+    counters = {key: [] for key in ("calls", "errors", "timeouts", "fallbacks")}
+    tokens = []
+    for (stage, model), stats in sorted(ModelUsage.stats.items()):
+        labels = {"stage": stage, "model": model}
+        for key, samples in counters.items():
+            samples.append((labels, stats[key]))
+        tokens.append(({**labels, "kind": "prompt"}, stats["prompt_tokens"]))
+        tokens.append(({**labels, "kind": "output"}, stats["output_tokens"]))
+    families = [(f"e3_llm_{key}_total", "counter", f"Model {key} per stage and model.", samples)
+                for key, samples in counters.items()]
+    families.append(("e3_llm_tokens_total", "counter", "Model tokens per stage and model.", tokens))
+    return families
+
+
+register_collector(_usage_metrics)
+
+
+def get_model_usage_report() -> str:
+    """Report calls, latency and tokens per stage and model.
+
+    Returns:
+        Formatted model usage summary
+    """
+    lines = ["Model Usage Report:"]
+    if not ModelUsage.stats:
+        lines.append("  - No model calls yet")
+    for (stage, model), stats in sorted(ModelUsage.stats.items()):
+        latencies = sorted(stats["latencies"])
+        line = f"  - {stage} / {model}: {stats['calls']} call(s)"
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            line += f", p50 {p50:.1f}s, p95 {p95:.1f}s"
+        line += f", {stats['prompt_tokens']} prompt + {stats['output_tokens']} output tokens"
+        failures = [f"{stats[k]} {k}" for k in ("timeouts", "errors", "fallbacks") if stats[k]]
+        if failures:
+            line += f" ({', '.join(failures)})"
+        lines.append(line)
+    return "\n".join(lines)
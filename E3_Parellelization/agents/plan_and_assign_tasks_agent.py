@@ -1,27 +1,77 @@
-"""Plan and Assign Tasks Agent - assigns files to processing agents."""
+"""Plan and Assign Tasks Agent - assigns files to processing agents.
 
+With PRIORITY_SCHEDULING the scheduler plans instead of the model: pending
+files are ordered earliest deadline first within priority classes and dealt
+out to the available analyzers in that order, without a model call.
+"""
+
+import json
+from functools import partial
 from google.adk.agents import LlmAgent
-from ..tools import read_data_tool, list_example_files_tool, get_processing_status_tool
-from .utils import exit_loop
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from ..tools import read_data_async_tool, list_example_files_async_tool, get_processing_status_async_tool, checkpoint_callback
+from ..tools.scheduling import PRIORITY_SCHEDULING, describe_schedule, schedule_todo_list
+from .model_routing import resolve_model
+from .utils import parse_todo_list
+
+
+def schedule_todo_list_callback(callback_context: CallbackContext, agents: list = None):
+    """
+    Before-agent callback: order and assign the pending files by priority and deadline.
 
+    The scheduled list replaces the planner's turn, so no model call is made
+    for a plan that would be discarded.
 
-GEMINI_MODEL = "gemini-2.5-flash"
+    Args:
+        callback_context: Context of the planner
+        agents: Analyzer names; defaults to available_analyzers in state (autoscaled pool)
+
+    Returns:
+        The scheduled todo list as the planner's output, or None to let the model plan
+    """
+    if not PRIORITY_SCHEDULING:
+        return None
+    todo_list = parse_todo_list(callback_context.state.get("todo_list_result"))
+    if not todo_list:
+        return None
+    if agents is None:
+        agents = [name.strip() for name in str(callback_context.state.get("available_analyzers") or "").split(",") if name.strip()]
+    if not agents:
+        return None
+    scheduled = schedule_todo_list(todo_list, agents)
+    callback_context.state["todo_list_result"] = scheduled
+    print(f"[Scheduler] Dispatch order over {len(agents)} analyzer(s): {describe_schedule(scheduled)}")
+    # The after-agent callbacks are skipped along with the model
+    checkpoint_callback(callback_context)
+    # output_key stores this text in todo_list_result, as it would the model's plan
+    return types.Content(role="model", parts=[types.Part(text=json.dumps(scheduled, indent=2))])
 
 
-def create_plan_and_assign_tasks_agent(num_agents: int = 2):
+def create_plan_and_assign_tasks_agent(num_agents: int = 2, autoscaled: bool = False):
     """
     Create and return the PlanAndAssignTasksAgent.
     
     Args:
         num_agents: Number of available DocumentAnalyzer agents for load balancing
+        autoscaled: Read the available agents from state (analyzer_pool_size and
+                    available_analyzers, set by the AnalyzerPoolScaler) on every run
     """
-    # Generate list of available agents dynamically - now using DocumentAnalyzer naming
-    available_agents = [f"DocumentAnalyzer{i}" for i in range(1, num_agents + 1)]
-    agents_list = ", ".join(available_agents)
+    if autoscaled:
+        agents_count = "{analyzer_pool_size}"
+        agents_list = "{available_analyzers}"
+        last_agent = "DocumentAnalyzer{analyzer_pool_size}"
+        available_agents = None
+    else:
+        # Generate list of available agents dynamically - now using DocumentAnalyzer naming
+        available_agents = [f"DocumentAnalyzer{i}" for i in range(1, num_agents + 1)]
+        agents_count = num_agents
+        agents_list = ", ".join(available_agents)
+        last_agent = f"DocumentAnalyzer{num_agents}"
     
     return LlmAgent(
         name="PlanAndAssignTasksAgent",
-        model=GEMINI_MODEL,
+        model=resolve_model(stage="plan"),
         instruction=f"""You are an AI Task Planner Agent responsible for load balancing work across multiple processing agents.
 
 Your task:
@@ -29,17 +79,18 @@ Your task:
 2. Assign each pending file to one of the available agents using round-robin load balancing
 3. Ensure files are distributed evenly across agents
 
-Available agents ({num_agents} total): {agents_list}
+Available agents ({agents_count} total): {agents_list}
+Only assign work to the available agents listed above.
 
 Load balancing strategy:
-- Cycle through agents in order: DocumentAnalyzer1 → DocumentAnalyzer2 → ... → DocumentAnalyzer{num_agents} → DocumentAnalyzer1 (repeat)
+- Cycle through agents in order: DocumentAnalyzer1 → DocumentAnalyzer2 → ... → {last_agent} → DocumentAnalyzer1 (repeat)
 - This ensures even distribution of work
 
 Return an updated todo list with the "assigned_agent" field set for each file.
-
-If all files are already assigned and status is "completed", you MUST call the 'exit_loop' function. Do not output any text.
 """,
         description="Plans and assigns tasks to DocumentAnalyzer agents with load balancing.",
-        tools=[read_data_tool, list_example_files_tool, get_processing_status_tool, exit_loop],
-        output_key="todo_list_result"
+        tools=[read_data_async_tool, list_example_files_async_tool, get_processing_status_async_tool],
+        output_key="todo_list_result",
+        before_agent_callback=partial(schedule_todo_list_callback, agents=available_agents),
+        after_agent_callback=checkpoint_callback
     )
@@ -0,0 +1,338 @@
+"""Pipeline profiler - opt-in CPU and memory profiling per pipeline stage.
+
+Enabled with PIPELINE_PROFILING=1. While a pipeline run is in progress:
+
+- a sampling thread records every thread's stack each
+  PROFILING_SAMPLE_INTERVAL_MS. A sample is attributed to the stage of the
+  innermost agent on the stack: todo, plan, loop_control, autoscaler, each
+  DocumentAnalyzerN loop or synthesis. Samples from the tool threads are
+  labelled by thread, and time the event loop spends waiting (on the model,
+  mostly) is recorded as event_loop_idle
+- tracemalloc snapshots are taken when each memory stage starts and ends
+  (todo, plan, the parallel analysis of each loop iteration, synthesis), and
+  the largest allocation differences are reported per stage. Snapshots block
+  the event loop, so analyzers are not snapshotted one by one, and snapshots
+  are dumped to disk and only compared once the run is over; the time spent
+  in the profiler itself is sampled as the profiler stage. PROFILING_MEMORY=0
+  turns memory profiling off for a lighter CPU-only profile
+
+At the end of the run, collapsed-stack files (one per stage plus
+cpu_all.collapsed, for flamegraph.pl or speedscope) and top-allocation
+reports are written to profiles/<run>/. With PROFILING_MLFLOW_ARTIFACTS=1 the
+directory is attached to the run's MLflow run as artifacts.
+
+The root agent's after-callback only runs when the pipeline finishes. Wrapped
+with create_profiling_guard, a run that raises also stops the sampling thread,
+writes what was recorded and leaves the profiler free for the next run.
+"""
+
+import itertools
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import AsyncGenerator
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from .run_metrics import RunMetrics
+
+PIPELINE_PROFILING = os.getenv("PIPELINE_PROFILING", "0") == "1"
+PROFILING_MEMORY = os.getenv("PROFILING_MEMORY", "1") == "1"
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "10"))
+# Frames kept per allocation; deeper tracebacks slow the traced run down many times over
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "1"))
+PROFILING_TOP_ALLOCATIONS = int(os.getenv("PROFILING_TOP_ALLOCATIONS", "25"))
+PROFILING_MLFLOW_ARTIFACTS = os.getenv("PROFILING_MLFLOW_ARTIFACTS", "0") == "1"
+
+# Agent name -> stage; DocumentAnalyzerN loops are stages of their own
+STAGE_NAMES = {
+    "FileTodoListAgent": "todo",
+    "PlanAndAssignTasksAgent": "plan",
+    "FileProcessingLoopController": "loop_control",
+    "AnalyzerPoolScaler": "autoscaler",
+    "SynthesisAgent": "synthesis",
+}
+ANALYZER_NAME = re.compile(r"^DocumentAnalyzer\d+$")
+# Agent name -> memory stage (snapshotted at start and end)
+MEMORY_STAGES = {
+    "FileTodoListAgent": "todo",
+    "PlanAndAssignTasksAgent": "plan",
+    "ParallelDocumentAnalyzerAgent": "analysis",
+    "SynthesisAgent": "synthesis",
+}
+
+# Agent methods whose frames are checked for the running agent (f_locals is too costly for every frame)
+AGENT_ENTRY_POINTS = {"run_async", "_run_async_impl"}
+# Leaf functions of a thread that is blocked (in C code) rather than running Python code
+BLOCKING_CALLS = {"select", "poll", "wait", "acquire", "get", "sleep", "accept", "_worker", "_wait_for_tstate_lock"}
+# Event-loop entry points; a blocked thread running one of these is an idle event loop
+LOOP_RUNNERS = {"run_forever", "run_until_complete"}
+
+
+def stage_of(agent_name: str):
+    """Return the profiling stage of an agent, or None if it is not a stage of its own."""
+    if agent_name in STAGE_NAMES:
+        return STAGE_NAMES[agent_name]
+    if ANALYZER_NAME.match(agent_name):
+        return agent_name
+    return None
+
+
+class PipelineProfiler:
+    """State of the profile being recorded (one pipeline run at a time)."""
+    invocation_id = None
+    output_dir = None
+    sampler = None
+    stop_event = None
+    started_tracemalloc = False
+    # stage -> Counter of collapsed stack -> samples
+    cpu_samples = {}
+    # agent name -> (start time, path of the snapshot dumped at stage start)
+    stage_snapshots = {}
+    # stage -> list of (elapsed seconds, start snapshot path, end snapshot path) per stage run
+    memory_runs = {}
+    snapshot_ids = itertools.count()
+    lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+def _sample_stage(frame, thread_name: str):
+    """Return (stage, collapsed stack) for a thread's current frame, or None to skip the sample."""
+    labels = []
+    innermost_agent = None
+    stage = None
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        if frame.f_code.co_filename == __file__:
+            stage = "profiler"
+        if (stage is None and frame.f_code.co_name in AGENT_ENTRY_POINTS
+                and frame.f_code.co_varnames[:1] == ("self",)):
+            agent = frame.f_locals.get("self")
+            if isinstance(agent, BaseAgent):
+                innermost_agent = innermost_agent or agent.name
+                stage = stage_of(agent.name)
+        frame = frame.f_back
+    labels.reverse()
+    functions = [label.split(" ", 1)[0] for label in labels]
+    leaf = functions[-1] if functions else ""
+
+    if stage is None and innermost_agent is not None:
+        stage = "orchestration"
+    if stage is None:
+        if leaf in BLOCKING_CALLS or leaf in LOOP_RUNNERS:
+            if not LOOP_RUNNERS.intersection(functions):
+                return None
+            stage = "event_loop_idle"
+        else:
+            # Tool and loader pool threads, named like chunk-loader_3
+            stage = "thread_" + (re.sub(r"[-_]?\d+", "", thread_name) or "unnamed")
+    return stage, ";".join(labels)
+
+
+def _sample_loop(interval: float, stop_event: threading.Event):
+    me = threading.get_ident()
+    while not stop_event.wait(interval):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            sample = _sample_stage(frame, names.get(ident, "unknown"))
+            if sample is None:
+                continue
+            stage, stack = sample
+            with PipelineProfiler.lock:
+                PipelineProfiler.cpu_samples.setdefault(stage, Counter())[stack] += 1
+
+
+def start_profiling_callback(callback_context):
+    """Before-agent callback for the root agent: start profiling this pipeline run."""
+    if not PIPELINE_PROFILING:
+        return None
+    if PipelineProfiler.invocation_id is not None:
+        print("[Profiler] Another run is being profiled; this run is not profiled")
+        return None
+    agents_dir = os.path.dirname(os.path.abspath(__file__))
+    run_name = f"{datetime.now():%Y%m%d_%H%M%S}_{callback_context.invocation_id[-8:]}"
+    PipelineProfiler.invocation_id = callback_context.invocation_id
+    PipelineProfiler.output_dir = os.path.join(os.path.dirname(agents_dir), "profiles", run_name)
+    PipelineProfiler.cpu_samples = {}
+    PipelineProfiler.stage_snapshots = {}
+    PipelineProfiler.memory_runs = {}
+    if PROFILING_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+        PipelineProfiler.started_tracemalloc = True
+    PipelineProfiler.stop_event = threading.Event()
+    PipelineProfiler.sampler = threading.Thread(
+        target=_sample_loop,
+        args=(PROFILING_SAMPLE_INTERVAL_MS / 1000, PipelineProfiler.stop_event),
+        name="pipeline-profiler",
+        daemon=True,
+    )
+    PipelineProfiler.sampler.start()
+    print(f"[Profiler] Profiling run into {PipelineProfiler.output_dir} "
+          f"(sampling every {PROFILING_SAMPLE_INTERVAL_MS:g} ms)")
+    return None
+
+
+def _dump_snapshot() -> str:
+    """Take a tracemalloc snapshot and dump it to the profile's snapshot directory."""
+    snapshot_dir = os.path.join(PipelineProfiler.output_dir, "snapshots")
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, f"{next(PipelineProfiler.snapshot_ids):05d}.snapshot")
+    tracemalloc.take_snapshot().dump(path)
+    return path
+
+
+def stage_start_callback(callback_context):
+    """Before-agent callback for stage agents: snapshot memory at the start of the stage."""
+    if PipelineProfiler.invocation_id != callback_context.invocation_id:
+        return None
+    if not tracemalloc.is_tracing():
+        return None
+    path = _dump_snapshot()
+    with PipelineProfiler.lock:
+        PipelineProfiler.stage_snapshots[callback_context.agent_name] = (time.monotonic(), path)
+    return None
+
+
+def stage_end_callback(callback_context):
+    """After-agent callback for stage agents: snapshot memory at the end of the stage."""
+    if PipelineProfiler.invocation_id != callback_context.invocation_id:
+        return None
+    with PipelineProfiler.lock:
+        started = PipelineProfiler.stage_snapshots.pop(callback_context.agent_name, None)
+    if started is None:
+        return None
+    started_at, before = started
+    after = _dump_snapshot()
+    with PipelineProfiler.lock:
+        PipelineProfiler.memory_runs.setdefault(MEMORY_STAGES[callback_context.agent_name], []).append(
+            (time.monotonic() - started_at, before, after)
+        )
+    return None
+
+
+def install_stage_hooks(agent: BaseAgent):
+    """Add the memory snapshot callbacks to every memory stage agent under agent (runs first in each list)."""
+    if agent.name in MEMORY_STAGES:
+        agent.before_agent_callback = [stage_start_callback] + agent.canonical_before_agent_callbacks
+        agent.after_agent_callback = [stage_end_callback] + agent.canonical_after_agent_callbacks
+    for sub_agent in agent.sub_agents:
+        install_stage_hooks(sub_agent)
+
+
+# The profiler's own samples and tracemalloc's bookkeeping are left out of the memory reports
+PROFILER_FILTERS = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+
+
+def _write_reports(output_dir: str) -> int:
+    os.makedirs(output_dir, exist_ok=True)
+    with PipelineProfiler.lock:
+        cpu_samples = {stage: Counter(samples) for stage, samples in PipelineProfiler.cpu_samples.items()}
+        memory_runs = dict(PipelineProfiler.memory_runs)
+
+    total = sum(sum(samples.values()) for samples in cpu_samples.values())
+    with open(os.path.join(output_dir, "cpu_all.collapsed"), "w", encoding="utf-8") as all_file:
+        for stage, samples in sorted(cpu_samples.items()):
+            with open(os.path.join(output_dir, f"cpu_{stage}.collapsed"), "w", encoding="utf-8") as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+                    all_file.write(f"{stage};{stack} {count}\n")
+
+    for stage, runs in sorted(memory_runs.items()):
+        with open(os.path.join(output_dir, f"memory_{stage}.txt"), "w", encoding="utf-8") as f:
+            for i, (seconds, before, after) in enumerate(runs, 1):
+                before, after = (
+                    tracemalloc.Snapshot.load(path).filter_traces(PROFILER_FILTERS) for path in (before, after)
+                )
+                diffs = after.compare_to(before, "traceback")[:PROFILING_TOP_ALLOCATIONS]
+                grown = sum(diff.size_diff for diff in diffs)
+                f.write(f"=== {stage} run {i}: {seconds:.2f}s, top {len(diffs)} allocation site(s) "
+                        f"{grown / 1024:+.1f} KB ===\n")
+                for diff in diffs:
+                    f.write(f"{diff.size_diff / 1024:+10.1f} KB {diff.count_diff:+8d} block(s)  "
+                            f"(now {diff.size / 1024:.1f} KB)\n")
+                    for line in diff.traceback.format(most_recent_first=True)[:6]:
+                        f.write(f"      {line.strip()}\n")
+                f.write("\n")
+    shutil.rmtree(os.path.join(output_dir, "snapshots"), ignore_errors=True)
+
+    interval_seconds = PROFILING_SAMPLE_INTERVAL_MS / 1000
+    lines = [
+        "Pipeline Profile:",
+        f"  - Samples: {total} (every {PROFILING_SAMPLE_INTERVAL_MS:g} ms)",
+    ]
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append(f"  - Traced memory: {current / 1024 / 1024:.1f} MB now, {peak / 1024 / 1024:.1f} MB peak")
+    for stage, samples in sorted(cpu_samples.items(), key=lambda item: -sum(item[1].values())):
+        count = sum(samples.values())
+        lines.append(f"  - {stage}: {count} sample(s) (~{count * interval_seconds:.1f}s, {count / max(total, 1):.0%})")
+    summary = "\n".join(lines)
+    with open(os.path.join(output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+        f.write(summary + "\n")
+    print(f"[Profiler] {summary}")
+    return total
+
+
+def stop_profiling(invocation_id: str):
+    """Stop profiling a run, write its reports and free the profiler (no-op if the run is not profiled)."""
+    with PipelineProfiler.lock:
+        if PipelineProfiler.invocation_id != invocation_id or PipelineProfiler.stop_event is None:
+            return
+        stop_event, PipelineProfiler.stop_event = PipelineProfiler.stop_event, None
+    stop_event.set()
+    PipelineProfiler.sampler.join()
+    output_dir = PipelineProfiler.output_dir
+    try:
+        _write_reports(output_dir)
+        if PROFILING_MLFLOW_ARTIFACTS:
+            # Attached to the run-metrics MLflow run, which is logged after this callback
+            RunMetrics.artifact_dirs.setdefault(invocation_id, []).append(output_dir)
+        print(f"[Profiler] Wrote profile to {output_dir}")
+    except OSError as e:
+        print(f"[Profiler] WARNING: Could not write profile to {output_dir}: {e}")
+    finally:
+        if PipelineProfiler.started_tracemalloc:
+            tracemalloc.stop()
+            PipelineProfiler.started_tracemalloc = False
+        PipelineProfiler.stage_snapshots = {}
+        PipelineProfiler.sampler = None
+        PipelineProfiler.invocation_id = None
+
+
+def stop_profiling_callback(callback_context):
+    """After-agent callback for the root agent: stop profiling and write the reports."""
+    stop_profiling(callback_context.invocation_id)
+    return None
+
+
+class ProfilingGuard(BaseAgent):
+    """Runs the pipeline (its only sub-agent) and stops profiling the run however it ends."""
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        try:
+            async for event in self.sub_agents[0].run_async(ctx):
+                yield event
+        finally:
+            # A pipeline that raised never ran stop_profiling_callback
+            stop_profiling(ctx.invocation_id)
+
+
+def create_profiling_guard(pipeline: BaseAgent) -> ProfilingGuard:
+    """Wrap the pipeline so its profile is stopped even when a run fails."""
+    return ProfilingGuard(
+        name=f"Profiled{pipeline.name}",
+        sub_agents=[pipeline],
+        description=f"Runs {pipeline.name} and stops its profile when the run ends.",
+    )
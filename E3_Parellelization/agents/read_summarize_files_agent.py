@@ -5,10 +5,8 @@ import json
 import re
 from google.adk.agents import LlmAgent
 from google.adk.agents.callback_context import CallbackContext
-from ..tools import read_data_tool, list_example_files_tool, get_processing_status_tool
-
-
-GEMINI_MODEL = "gemini-2.5-flash"
+from .model_routing import resolve_model
+from ..tools import read_data_async_tool, list_example_files_async_tool, get_processing_status_async_tool
 
 
 def update_structured_todo_callback_reusable(callback_context: CallbackContext):
@@ -69,14 +67,14 @@ def create_read_summarize_files_agent(agent_number: int):
     
     return LlmAgent(
         name=agent_name,
-        model=GEMINI_MODEL,
+        model=resolve_model(stage="summarize"),
         instruction="""You are a AI File Summarization Agent, you read the files in the example_data directory and create a summary based on the file contents.
     Todo List: {todo_list_result}
 Use the Read Example Data tool to read the files in the example_data directory.
 Output a concise summary of each file you read.
 """,
         description="Summarizes files from example_data directory.",
-        tools=[read_data_tool, list_example_files_tool, get_processing_status_tool],
+        tools=[read_data_async_tool, list_example_files_async_tool, get_processing_status_async_tool],
         output_key=output_key_str,
         after_agent_callback=update_structured_todo_callback_reusable
     )
@@ -0,0 +1,202 @@
+"""Run metrics - logs the performance of every pipeline run to MLflow.
+
+The root agent's before-callback snapshots the process-wide counters (chunks
+served, model calls and tokens, file cache, dedup). Its after-callback turns
+the differences into run metrics:
+
+- throughput: documents, chunks and bytes per second
+- LLM calls, tokens, errors and latency percentiles per stage
+- loop iterations, file cache hit rate, dedup savings, event-loop lag and peak RSS
+
+They are logged to a new MLflow run together with the pipeline configuration
+as parameters, so runs can be compared in the MLflow UI.
+"""
+
+import os
+import sys
+import time
+from ..tools.async_file_tools import pop_run_lag, track_run_lag
+from ..tools.chunking import DocumentChunker
+from ..tools.dedup import ChunkDeduplicator
+from ..tools.document_source import list_documents
+from ..tools.file_cache import get_file_cache_stats
+from ..tools.live_metrics import unwatch_run, watch_run
+from ..tools.workspace import workspace_id
+from .model_routing import ModelUsage
+from .utils import parse_todo_list
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class RunMetrics:
+    """MLflow destination, run parameters and the counters of runs in progress."""
+    experiment_id = None
+    params = {}
+    # invocation_id -> (start time, counters at run start); ModelUsage.run_latencies and
+    # EventLoopLag.run_max_lag collect the run's latencies and lag meanwhile
+    started = {}
+    # invocation_id -> directories to attach to the run as artifacts (e.g. profiles)
+    artifact_dirs = {}
+
+
+def configure_run_metrics(experiment_id: str = None, params: dict = None):
+    """
+    Set where run metrics are logged and the parameters recorded with them.
+
+    Args:
+        experiment_id: MLflow experiment for the runs (None: the active experiment)
+        params: Pipeline configuration to log as run parameters
+    """
+    RunMetrics.experiment_id = experiment_id
+    RunMetrics.params = dict(params or {})
+
+
+def _counters() -> dict:
+    """Snapshot of the cumulative process-wide counters."""
+    cache = get_file_cache_stats()
+    counters = {
+        "chunks_served": DocumentChunker.stats["chunks_served"],
+        "cache_hits": cache["hits"],
+        "cache_misses": cache["misses"],
+        "dedup_dropped": ChunkDeduplicator.totals["exact_duplicates"] + ChunkDeduplicator.totals["near_duplicates"],
+    }
+    for (stage, _), stats in list(ModelUsage.stats.items()):
+        for key in ("calls", "errors", "timeouts", "fallbacks", "prompt_tokens", "output_tokens"):
+            counters[f"llm.{stage}.{key}"] = counters.get(f"llm.{stage}.{key}", 0) + stats[key]
+    return counters
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def collect_run_metrics(state, started_at: float, before: dict, latencies: dict = None, max_lag: float = 0.0) -> dict:
+    """
+    Compute the metrics of a pipeline run from the counters at its start.
+
+    Args:
+        state: Session state at the end of the run
+        started_at: Wall-clock start of the run
+        before: _counters() at the start of the run
+        latencies: stage -> model call latencies of the run
+        max_lag: Largest event-loop lag of the run in seconds
+
+    Returns:
+        Dict of metric name -> value
+    """
+    elapsed = max(time.time() - started_at, 1e-9)
+    after = _counters()
+    delta = {key: value - before.get(key, 0) for key, value in after.items()}
+
+    todo_list = parse_todo_list(state.get("todo_list_result"))
+    completed = [
+        task.get("filename") for task in todo_list
+        if isinstance(task, dict) and task.get("status") == "completed"
+        and (task.get("processed_at") or 0) >= started_at
+    ]
+    sizes = {doc["document_id"]: doc["size"] for doc in list_documents()}
+    completed_bytes = sum(sizes.get(filename, 0) for filename in completed)
+
+    lookups = delta["cache_hits"] + delta["cache_misses"]
+    metrics = {
+        "run.duration_seconds": elapsed,
+        "run.documents_completed": len(completed),
+        "run.chunks_analyzed": delta["chunks_served"],
+        "run.bytes_completed": completed_bytes,
+        "throughput.docs_per_sec": len(completed) / elapsed,
+        "throughput.chunks_per_sec": delta["chunks_served"] / elapsed,
+        "throughput.bytes_per_sec": completed_bytes / elapsed,
+        "loop.iterations": state.get("FileProcessingLoop_iteration") or 0,
+        "cache.file_hit_rate": delta["cache_hits"] / lookups if lookups else 0.0,
+        "dedup.chunks_dropped": delta["dedup_dropped"],
+        "event_loop.max_lag_ms": max_lag * 1000,
+    }
+    for key, value in delta.items():
+        if key.startswith("llm."):
+            metrics[key] = value
+
+    # Latency percentiles over each stage's calls of this run (all models of the stage)
+    for stage, values in (latencies or {}).items():
+        if values:
+            ordered = sorted(values)
+            metrics[f"llm.{stage}.p50_seconds"] = _percentile(ordered, 0.5)
+            metrics[f"llm.{stage}.p95_seconds"] = _percentile(ordered, 0.95)
+            metrics[f"llm.{stage}.p99_seconds"] = _percentile(ordered, 0.99)
+
+    rss = peak_rss_mb()
+    if rss is not None:
+        metrics["memory.peak_rss_mb"] = rss
+    return metrics
+
+
+def log_run_to_mlflow(metrics: dict, params: dict = None, run_name: str = None, artifact_dirs: list = None):
+    """Log metrics, parameters and artifact directories to a new MLflow run in the configured experiment."""
+    import mlflow
+
+    with mlflow.start_run(experiment_id=RunMetrics.experiment_id, run_name=run_name, nested=mlflow.active_run() is not None):
+        if params:
+            mlflow.log_params({key: str(value) for key, value in params.items()})
+        mlflow.log_metrics(metrics)
+        for directory in artifact_dirs or []:
+            mlflow.log_artifacts(directory, artifact_path=os.path.basename(directory))
+
+
+def _todo_list_counter(session_state: dict):
+    """Counts the documents of a session's todo list per status, as the live metrics endpoint scrapes it."""
+    def count_documents() -> dict:
+        counts = {"pending": 0, "completed": 0, "failed": 0}
+        for task in list(parse_todo_list(session_state.get("todo_list_result"))):
+            status = task.get("status", "unknown") if isinstance(task, dict) else "unknown"
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+    return count_documents
+
+
+def start_run_metrics_callback(callback_context):
+    """Before-agent callback for the root agent: snapshot counters at the start of the run."""
+    RunMetrics.started[callback_context.invocation_id] = (time.time(), _counters())
+    ModelUsage.run_latencies[callback_context.invocation_id] = {}
+    track_run_lag(callback_context.invocation_id)
+    # The live metrics endpoint reports the run's todo list while it is in progress
+    watch_run(
+        callback_context.invocation_id, workspace_id() or "default", _todo_list_counter(callback_context.session.state)
+    )
+    return None
+
+
+def log_run_metrics_callback(callback_context):
+    """After-agent callback for the root agent: log the run's metrics to MLflow."""
+    started = RunMetrics.started.pop(callback_context.invocation_id, None)
+    latencies = ModelUsage.run_latencies.pop(callback_context.invocation_id, {})
+    max_lag = pop_run_lag(callback_context.invocation_id)
+    unwatch_run(callback_context.invocation_id)
+    artifact_dirs = RunMetrics.artifact_dirs.pop(callback_context.invocation_id, [])
+    if started is None:
+        return None
+    metrics = collect_run_metrics(callback_context.state, *started, latencies=latencies, max_lag=max_lag)
+    print(f"[RunMetrics] {metrics['run.documents_completed']} document(s), {metrics['run.chunks_analyzed']} chunk(s) "
+          f"in {metrics['run.duration_seconds']:.1f}s ({metrics['throughput.docs_per_sec']:.2f} docs/s)")
+    params, run_name = RunMetrics.params, f"pipeline-{callback_context.invocation_id[-8:]}"
+    job_id = workspace_id()
+    if job_id is not None:
+        # Runs of the job service are told apart by their job
+        params, run_name = {**params, "job_id": job_id}, job_id
+    try:
+        log_run_to_mlflow(metrics, params, run_name=run_name, artifact_dirs=artifact_dirs)
+        print(f"[RunMetrics] Logged {len(metrics)} metric(s) to MLflow")
+    except Exception as e:
+        # The run itself succeeded; a missing tracking server must not fail it
+        print(f"[RunMetrics] WARNING: Could not log run metrics to MLflow: {e}")
+    return None
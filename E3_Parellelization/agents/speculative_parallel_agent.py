@@ -0,0 +1,206 @@
+"""Speculative Parallel Agent - a ParallelAgent that re-executes stragglers.
+
+Runs its sub-agents concurrently like ParallelAgent. Once some sub-agents have
+finished (so there is idle capacity), any sub-agent still running past its
+deadline is speculatively re-executed: a fresh replica built by
+``replica_factory`` runs the same work on its own branch. Whichever copy
+finishes first wins; the other is cancelled and its remaining events dropped.
+
+The deadline is the larger of ``deadline_seconds`` and ``deadline_factor``
+times the median duration of sub-agents that already completed (in this run
+and earlier loop iterations).
+
+A replica writes its results apart from the original's. When a race ends,
+``race_settler`` is awaited with the winner, so it can promote (or drop) the
+replica's results; its state changes are yielded as an event of this agent.
+
+With ``pool_size_key`` set, only the first N sub-agents run, where N is read
+from session state each time (the analyzer pool autoscaler sets it).
+"""
+
+import asyncio
+import time
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.genai import types
+from .hedged_model import LatencyTracker
+
+# How often running sub-agents are checked against their deadline
+STRAGGLER_CHECK_INTERVAL_SECONDS = 1.0
+
+
+class _RunFinished:
+    """Queue marker for a finished (or failed) sub-agent run."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+class SpeculativeParallelAgent(BaseAgent):
+    """Runs sub-agents in parallel and races a replica against each straggler."""
+
+    replica_factory: Optional[Callable[[BaseAgent], BaseAgent]] = None
+    """Builds an equivalent, independent copy of a sub-agent. None disables speculation."""
+
+    deadline_seconds: float = 120.0
+    """Minimum time a sub-agent may run before it counts as a straggler."""
+
+    deadline_factor: float = 2.0
+    """Straggler threshold as a multiple of the median completed duration."""
+
+    max_replicas: int = 2
+    """Maximum number of speculative replicas running at the same time."""
+
+    pool_size_key: Optional[str] = None
+    """Session state key holding how many sub-agents (from the front) run this time. None runs all."""
+
+    race_settler: Optional[Callable[[CallbackContext, BaseAgent, bool], Awaitable[Optional[types.Content]]]] = None
+    """Awaited as (context, sub_agent, replica_won) when a raced sub-agent finishes."""
+
+    def _active_sub_agents(self, ctx: InvocationContext) -> list:
+        if self.pool_size_key is None:
+            return list(self.sub_agents)
+        size = ctx.session.state.get(self.pool_size_key)
+        if not isinstance(size, int):
+            return list(self.sub_agents)
+        return list(self.sub_agents[:max(0, size)])
+
+    def _deadline(self) -> float:
+        median = LatencyTracker.percentile(f"{self.name}:sub_agent", 0.5)
+        if median is None:
+            return self.deadline_seconds
+        return max(self.deadline_seconds, self.deadline_factor * median)
+
+    def _branch_ctx(self, ctx: InvocationContext, agent: BaseAgent, suffix: str = "") -> InvocationContext:
+        branch_ctx = ctx.model_copy()
+        segment = f"{self.name}.{agent.name}{suffix}"
+        branch_ctx.branch = f"{ctx.branch}.{segment}" if ctx.branch else segment
+        return branch_ctx
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        active = self._active_sub_agents(ctx)
+        if not active:
+            return
+
+        queue = asyncio.Queue()
+        # run_id -> {"task", "slot", "started", "replica"}
+        runs = {}
+        # slot (sub-agent name) -> set of run ids still racing for it
+        slots = {}
+        finished_slots = set()
+
+        async def pump(run_id: str, agent: BaseAgent, run_ctx: InvocationContext):
+            error = None
+            try:
+                async for event in agent.run_async(run_ctx):
+                    resume = asyncio.Event()
+                    await queue.put((run_id, event, resume))
+                    await resume.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            await queue.put((run_id, _RunFinished(error), None))
+
+        def start(run_id: str, slot: str, agent: BaseAgent, run_ctx: InvocationContext, replica: bool):
+            runs[run_id] = {
+                "task": asyncio.create_task(pump(run_id, agent, run_ctx)),
+                "slot": slot,
+                "started": time.monotonic(),
+                "replica": replica,
+            }
+            slots.setdefault(slot, set()).add(run_id)
+
+        for sub_agent in active:
+            start(sub_agent.name, sub_agent.name, sub_agent, self._branch_ctx(ctx, sub_agent), replica=False)
+
+        try:
+            while len(finished_slots) < len(slots):
+                try:
+                    run_id, item, resume = await asyncio.wait_for(queue.get(), STRAGGLER_CHECK_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    self._maybe_speculate(ctx, runs, slots, finished_slots, start)
+                    continue
+
+                run = runs[run_id]
+                if run["slot"] in finished_slots:
+                    # Loser of a race that already has a winner
+                    if resume is not None:
+                        resume.set()
+                    continue
+
+                if isinstance(item, _RunFinished):
+                    slots[run["slot"]].discard(run_id)
+                    if item.error is not None:
+                        if slots[run["slot"]]:
+                            print(f"[Speculative] {run_id} failed ({item.error}), waiting for its other copy")
+                            continue
+                        raise item.error
+                    duration = time.monotonic() - run["started"]
+                    LatencyTracker.record(f"{self.name}:sub_agent", duration)
+                    finished_slots.add(run["slot"])
+                    for loser in slots[run["slot"]]:
+                        runs[loser]["task"].cancel()
+                        print(f"[Speculative] {run_id} finished first ({duration:.1f}s), cancelled {loser}")
+                    slots[run["slot"]].clear()
+                    if any(runs[other]["replica"] for other in runs if runs[other]["slot"] == run["slot"]):
+                        event = await self._settle_race(ctx, run["slot"], run["replica"])
+                        if event is not None:
+                            yield event
+                    continue
+
+                yield item
+                resume.set()
+                self._maybe_speculate(ctx, runs, slots, finished_slots, start)
+        finally:
+            for run in runs.values():
+                run["task"].cancel()
+
+    async def _settle_race(self, ctx: InvocationContext, slot: str, replica_won: bool) -> Optional[Event]:
+        """Let race_settler act on the winner of a race; returns the event carrying its changes."""
+        if self.race_settler is None:
+            return None
+        sub_agent = next(agent for agent in self.sub_agents if agent.name == slot)
+        callback_context = CallbackContext(ctx)
+        content = await self.race_settler(callback_context, sub_agent, replica_won)
+        if content is None and not callback_context.state.has_delta():
+            return None
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=content,
+            actions=callback_context.actions,
+        )
+
+    def _maybe_speculate(self, ctx, runs, slots, finished_slots, start):
+        """Start a replica for each straggler while idle capacity exists."""
+        if self.replica_factory is None or not finished_slots:
+            return
+        active_replicas = sum(
+            1 for run_id, run in runs.items()
+            if run["replica"] and run_id in slots.get(run["slot"], ())
+        )
+        idle = min(len(finished_slots), self.max_replicas) - active_replicas
+        if idle <= 0:
+            return
+
+        deadline = self._deadline()
+        now = time.monotonic()
+        for slot, racing in slots.items():
+            if idle <= 0:
+                break
+            if slot in finished_slots or len(racing) != 1:
+                continue
+            original = runs[next(iter(racing))]
+            if now - original["started"] < deadline:
+                continue
+            sub_agent = next(agent for agent in self.sub_agents if agent.name == slot)
+            replica = self.replica_factory(sub_agent)
+            replica_id = f"{slot}#speculative"
+            print(f"[Speculative] {slot} running {now - original['started']:.1f}s (deadline {deadline:.1f}s), starting replica")
+            start(replica_id, slot, replica, self._branch_ctx(ctx, replica, "_speculative"), replica=True)
+            idle -= 1
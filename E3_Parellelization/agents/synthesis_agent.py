@@ -1,47 +1,293 @@
 """Synthesis Agent - combines research findings into a structured report."""
 
+import asyncio
+import os
+import time
+from functools import partial
+from typing import Optional
 from google.adk.agents import LlmAgent
 from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import BaseLlm, LlmRequest
+from google.genai import types
+from ..tools import get_dedup_report, get_chunker_memory_report, get_event_loop_lag_report, flush_corpus_index, clear_checkpoint_callback
+from ..tools.result_store import RESULT_RUN_ID_KEY, RESULT_STORE_ENABLED, iter_analyses, load_analysis, result_run_id
+from ..tools.workspace import get_state_dir
+from .model_routing import AGENT_NAME_LABEL, resolve_model, get_model_usage_report
+from .utils import parse_todo_list
 
-GEMINI_MODEL = "gemini-2.5-flash"
+# Fold each document's analysis into an evolving synthesized report as soon as its last chunk is analyzed
+STREAMING_SYNTHESIS = os.getenv("STREAMING_SYNTHESIS", "0") == "1"
 
+# Session state flag of runs that only analyze; the report is written by a later run (e.g. queue workers)
+DEFER_SYNTHESIS_KEY = "defer_synthesis"
 
-def aggregate_analysis_results_callback(callback_context: CallbackContext):
+
+def _partial_reports_dir() -> str:
+    """Directory where intermediate report versions are written (per job in the job service)."""
+    return os.path.join(get_state_dir(), "partial_reports")
+
+
+def _section_analysis(section: dict, run_id: str) -> str:
+    """Analysis text of a partial report section, from the section or from the result store."""
+    if "analysis" in section:
+        return section["analysis"] or ""
+    analyses = [load_analysis(run_id, document_id) for document_id in section.get("documents", [])]
+    return "\n\n".join(analysis for analysis in analyses if analysis)
+
+
+class StreamingSynthesis:
+    """Model and per-run locks of the evolving report."""
+    # Resolved on first use; tests substitute a stand-in
+    model: Optional[BaseLlm] = None
+    # invocation_id -> lock held while an analysis is folded, so parallel analyzers fold one at a time
+    locks = {}
+
+    @classmethod
+    def get_model(cls) -> BaseLlm:
+        if cls.model is None:
+            cls.model = resolve_model(stage="streaming_synthesis")
+        return cls.model
+
+
+FOLD_INSTRUCTION = """You maintain an evolving synthesis report while parallel DocumentAnalyzer agents are still running.
+
+Integrate the NEW ANALYSIS into the CURRENT REPORT and return the complete updated report in markdown with these sections:
+1. **Executive Summary**
+2. **Key Findings** (organized by theme)
+3. **Insights**
+4. **Cross-Document Themes**
+
+Merge findings that the new analysis repeats or refines instead of listing them twice, and keep every finding of the current report that the new analysis does not contradict.
+The report must be grounded exclusively on the analyses provided. Do not add external information.
+Return only the report."""
+
+
+async def _fold_into_report(report: str, section_key: str, analysis: str, agent_name: str) -> str:
+    """Ask the streaming synthesis model to fold one analysis into the report; returns the updated report."""
+    request = LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text=(
+            f"CURRENT REPORT:\n{report or '(empty - this is the first completed analysis)'}\n\n"
+            f"NEW ANALYSIS ({section_key}):\n{analysis}"
+        ))])],
+        config=types.GenerateContentConfig(
+            system_instruction=FOLD_INSTRUCTION,
+            labels={AGENT_NAME_LABEL: agent_name},
+        ),
+    )
+    responses = [response async for response in StreamingSynthesis.get_model().generate_content_async(request, stream=False)]
+    text = "".join(
+        part.text
+        for response in responses if response.content
+        for part in response.content.parts or [] if part.text and not part.thought
+    ).strip()
+    if not text:
+        raise ValueError("the model returned an empty report")
+    return text
+
+
+async def fold_document_analyses(
+    callback_context: CallbackContext,
+    agent_name: str,
+    analyses: dict,
+) -> Optional[types.Content]:
+    """
+    Folds just-finished document analyses into the evolving synthesized report.
+    
+    Called as soon as a document's last chunk has been analyzed, so the first
+    report version does not wait for any analyzer's whole queue. The synthesis
+    model rewrites the current report with each analysis merged in, one fold at
+    a time per run, producing one version per document; if the model call
+    fails, the analysis is appended to the report unchanged. Each document is
+    kept as a section and folded once. Versions are written to partial_reports/,
+    and the latest is returned as content so it is emitted as an event.
+    
+    Args:
+        callback_context: Context of the agent that finished the documents
+        agent_name: Name of the DocumentAnalyzer they belong to
+        analyses: document_id -> final analysis
+    
+    Returns:
+        The latest report version as model content, or None if streaming is off
+        or nothing new was folded
+    """
+    if not STREAMING_SYNTHESIS:
+        return None
+    report = None
+    for document_id, analysis in analyses.items():
+        if analysis:
+            report = await _fold_document(callback_context, agent_name, document_id, analysis) or report
+    if report is None:
+        return None
+    return types.Content(role="model", parts=[types.Part(text=report)])
+
+
+async def fold_completed_documents(
+    callback_context: CallbackContext,
+    agent_name: str,
+    completed_files: list,
+) -> Optional[types.Content]:
+    """Folds the completed documents of an analyzer that were not folded at their last chunk.
+    
+    These are documents whose last chunk was never analyzed (e.g. skipped
+    duplicates) or whose analysis was staged by a speculative replica.
+    """
+    if not STREAMING_SYNTHESIS or not completed_files:
+        return None
+    folded = callback_context.state.get("partial_report_sections") or {}
+    run_id = result_run_id(callback_context.state, callback_context.invocation_id)
+    agent_number = agent_name.replace("DocumentAnalyzer", "")
+    analyses = {}
+    for document_id in completed_files:
+        if document_id in folded:
+            continue
+        if RESULT_STORE_ENABLED:
+            analyses[document_id] = load_analysis(run_id, document_id)
+        else:
+            analyses[document_id] = callback_context.state.get(f"document_analysis_{agent_number}")
+    return await fold_document_analyses(callback_context, agent_name, analyses)
+
+
+async def _fold_document(callback_context: CallbackContext, agent_name: str, document_id: str,
+                         analysis: str) -> Optional[str]:
+    """Fold one document into the report; returns the new version, or None if it was folded already."""
+    lock = StreamingSynthesis.locks.setdefault(callback_context.invocation_id, asyncio.Lock())
+    async with lock:
+        # Read under the lock: another analyzer may have folded while this one waited
+        sections = dict(callback_context.state.get("partial_report_sections") or {})
+        if document_id in sections:
+            return None
+        synthesis = callback_context.state.get("partial_report_synthesis") or ""
+        try:
+            synthesis = await _fold_into_report(synthesis, f"{document_id} from {agent_name}", analysis, agent_name)
+        except Exception as e:
+            print(f"[StreamingSynthesis] WARNING: Could not fold {document_id} into the report ({e}); appending it as is")
+            synthesis = "\n\n".join(part for part in (synthesis, f"### {document_id}\n\n{analysis}") if part)
+        
+        # Sections name their documents when the analyses are in the result store
+        section = {"agent": agent_name, "completed_at": time.time()}
+        if RESULT_STORE_ENABLED:
+            section["documents"] = [document_id]
+        else:
+            section["analysis"] = analysis
+        sections[document_id] = section
+        version = int(callback_context.state.get("partial_report_version") or 0) + 1
+        
+        filenames = [task.get("filename") for task in parse_todo_list(callback_context.state.get("todo_list_result"))
+                     if isinstance(task, dict)]
+        pending = [filename for filename in filenames if filename not in sections]
+        
+        report_lines = [
+            f"# Partial Synthesis Report (version {version})",
+            "",
+            f"_Documents folded: {len(filenames) - len(pending)} / {len(filenames)}_",
+            "",
+            synthesis,
+        ]
+        if pending:
+            report_lines += ["", "## Still Pending", ""] + [f"- {filename}" for filename in pending]
+        report = "\n".join(report_lines)
+        
+        callback_context.state["partial_report_sections"] = sections
+        callback_context.state["partial_report_synthesis"] = synthesis
+        callback_context.state["partial_report_version"] = version
+        callback_context.state["partial_report"] = report
+    
+    try:
+        reports_dir = _partial_reports_dir()
+        os.makedirs(reports_dir, exist_ok=True)
+        for filename in (f"partial_report_v{version:03d}.md", "partial_report_latest.md"):
+            with open(os.path.join(reports_dir, filename), "w", encoding="utf-8") as f:
+                f.write(report)
+        print(f"[StreamingSynthesis] Wrote partial report version {version} with {document_id} "
+              f"({len(filenames) - len(pending)}/{len(filenames)} documents)")
+    except OSError as e:
+        print(f"[StreamingSynthesis] WARNING: Could not write partial report: {e}")
+    return report
+
+
+def aggregate_analysis_results_callback(callback_context: CallbackContext, num_agents: int = 6):
     """
     Prepares analysis results from all DocumentAnalyzer agents for synthesis.
     
     Uses best practices:
-    - Reads agent-specific result keys (document_analysis_1, document_analysis_2, etc.)
-    - Aggregates results into a single running_summary
+    - Streams the run's per-document analyses from the result store
+    - Falls back to agent-specific result keys (document_analysis_1, document_analysis_2, etc.)
+    - Aggregates results into a single running_summary, kept in temp: state so it
+      is neither persisted with the session nor carried in event payloads
     - Handles missing results gracefully
+    
+    Args:
+        callback_context: Context of the SynthesisAgent
+        num_agents: Size of the DocumentAnalyzer pool, for the agent-specific fallback keys
     """
+    # Every analysis has been folded by now
+    StreamingSynthesis.locks.pop(callback_context.invocation_id, None)
     print("[SynthesisCallback] Aggregating results from all DocumentAnalyzer agents...")
     
     aggregated_summary = []
     
-    # Iterate through potential agent results (1-6 based on default NUM_SUMMARIZE_AGENTS)
-    for agent_num in range(1, 7):
-        agent_result_key = f"document_analysis_{agent_num}"
-        agent_result = callback_context.state.get(agent_result_key)
-        
-        if agent_result:
-            print(f"[SynthesisCallback] Found analysis from DocumentAnalyzer{agent_num}")
-            aggregated_summary.append(f"\n--- Analysis from DocumentAnalyzer{agent_num} ---\n{agent_result}")
-        else:
-            print(f"[SynthesisCallback] No analysis found for DocumentAnalyzer{agent_num} (agent may not have been assigned work)")
+    # Every document analyzed in this run, one record at a time
+    run_id = callback_context.state.get(RESULT_RUN_ID_KEY)
+    if RESULT_STORE_ENABLED and run_id:
+        for record in iter_analyses(run_id):
+            aggregated_summary.append(f"\n--- Analysis of {record['document_id']} from {record['agent']} ---\n{record['analysis']}")
+        print(f"[SynthesisCallback] Read {len(aggregated_summary)} document analysis(es) from the result store")
+    
+    # Streaming mode keeps one section per folded document, including documents
+    # whose document_analysis_N key was later overwritten by the same agent
+    partial_sections = callback_context.state.get("partial_report_sections") or {}
+    if aggregated_summary:
+        pass  # The result store has every document; the fallbacks below would only repeat part of it
+    elif partial_sections:
+        print(f"[SynthesisCallback] Using {len(partial_sections)} section(s) from the streaming partial report")
+        for document_id, section in sorted(partial_sections.items(), key=lambda item: item[1]["completed_at"]):
+            aggregated_summary.append(f"\n--- Analysis of {document_id} from {section.get('agent')} ---\n"
+                                      f"{_section_analysis(section, run_id)}")
+    else:
+        # Iterate through the results of every DocumentAnalyzer in the pool
+        for agent_num in range(1, num_agents + 1):
+            agent_result_key = f"document_analysis_{agent_num}"
+            agent_result = callback_context.state.get(agent_result_key)
+            
+            if agent_result:
+                print(f"[SynthesisCallback] Found analysis from DocumentAnalyzer{agent_num}")
+                aggregated_summary.append(f"\n--- Analysis from DocumentAnalyzer{agent_num} ---\n{agent_result}")
+            else:
+                print(f"[SynthesisCallback] No analysis found for DocumentAnalyzer{agent_num} (agent may not have been assigned work)")
     
     if aggregated_summary:
         final_summary = "\n".join(aggregated_summary)
         print(f"[SynthesisCallback] Aggregated {len(aggregated_summary)} analysis result(s)")
-        callback_context.state["aggregated_analysis"] = final_summary
+        callback_context.state["temp:aggregated_analysis"] = final_summary
     else:
         print("[SynthesisCallback] WARNING: No analysis results found from any agent")
-        callback_context.state["aggregated_analysis"] = "No analysis results available"
+        callback_context.state["temp:aggregated_analysis"] = "No analysis results available"
+    
+    # Report how much work duplicate detection saved before analysis
+    print(f"[SynthesisCallback] {get_dedup_report()}")
+    print(f"[SynthesisCallback] {get_chunker_memory_report()}")
+    print(f"[SynthesisCallback] {get_event_loop_lag_report()}")
+    print(f"[SynthesisCallback] {get_model_usage_report()}")
+    
+    # Persist the corpus index so follow-up questions can use search_corpus
+    flush_corpus_index()
+
 
+def defer_synthesis_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+    """Before-agent callback: skip the synthesis of a run that only analyzes documents."""
+    if not callback_context.state.get(DEFER_SYNTHESIS_KEY):
+        return None
+    StreamingSynthesis.locks.pop(callback_context.invocation_id, None)
+    print("[SynthesisCallback] Synthesis deferred; the analyses stay in the result store")
+    return types.Content(role="model", parts=[types.Part(text="")])
 
-def create_merger_agent():
+
+def create_merger_agent(num_agents: int = 6):
     """Create and return the SynthesisAgent.
     
+    Args:
+        num_agents: Number of DocumentAnalyzer agents whose results are aggregated
+    
     Best Practices:
     - Uses before_agent_callback to aggregate results from parallel agents
     - Reads from agent-specific state keys (document_analysis_N)
@@ -50,11 +296,11 @@ def create_merger_agent():
     """
     return LlmAgent(
         name="SynthesisAgent",
-        model=GEMINI_MODEL,
+        model=resolve_model(stage="synthesis"),
         instruction="""You are an AI Synthesis Agent. Your task is to create a final comprehensive report based on analyses performed by parallel DocumentAnalyzer agents.
 
 AGGREGATED ANALYSIS RESULTS:
-{aggregated_analysis:No analysis results available}
+{temp:aggregated_analysis?}
 
 Based on the document analysis performed by multiple agents, create a structured final report that includes:
 
@@ -73,5 +319,6 @@ Format the report in clear, professional markdown with proper sections and subse
 """,
         description="Aggregates analyses from parallel DocumentAnalyzer agents into a comprehensive final report.",
         output_key="synthesized_report",
-        before_agent_callback=aggregate_analysis_results_callback
+        before_agent_callback=[defer_synthesis_callback, partial(aggregate_analysis_results_callback, num_agents=num_agents)],
+        after_agent_callback=clear_checkpoint_callback
     )
@@ -1,5 +1,9 @@
 """Shared utility functions for agents."""
 
+import json
+import re
+from typing import Optional
+
 
 def exit_loop(tool_context):
     """
@@ -17,3 +21,61 @@ def exit_loop(tool_context):
     print(f"  [Tool Call] exit_loop triggered by {tool_context.agent_name}")
     tool_context.actions.escalate = True
     return {}
+
+
+def _load_todo_list(todo_list_raw) -> Optional[list]:
+    """The todo list held by todo_list_result, or None if the value is not one."""
+    if isinstance(todo_list_raw, list):
+        return todo_list_raw
+    if not isinstance(todo_list_raw, str):
+        return None
+    match = re.search(r"```json\s*([\s\S]*?)\s*```", todo_list_raw)
+    try:
+        todo_list = json.loads(match.group(1) if match else todo_list_raw)
+    except json.JSONDecodeError:
+        return None
+    return todo_list if isinstance(todo_list, list) else None
+
+
+def parse_todo_list(todo_list_raw) -> list:
+    """
+    Parse todo_list_result from state into a list of task dicts.
+    
+    Accepts a list, a JSON string, or a JSON string wrapped in a markdown code block.
+    
+    Returns:
+        List of tasks (empty if the value cannot be parsed)
+    """
+    return _load_todo_list(todo_list_raw) or []
+
+
+def is_todo_list_readable(todo_list_raw) -> bool:
+    """Whether todo_list_result holds a todo list (possibly empty), rather than text that is not one."""
+    return _load_todo_list(todo_list_raw) is not None
+
+
+def pending_files(todo_list: list) -> list:
+    """Return the filenames of tasks still pending in a parsed todo list."""
+    return [
+        task.get("filename") for task in todo_list
+        if isinstance(task, dict) and task.get("status") == "pending" and task.get("filename")
+    ]
+
+
+def split_batch_analysis(analysis: str, documents: list) -> dict:
+    """
+    Split a batched analysis into its per-document sections.
+    
+    Sections start with a '### Document: <name>' line and run until the next one.
+    
+    Returns:
+        Dict of document name -> section, for the names in documents that have a section
+    """
+    headings = list(re.finditer(r"^#{1,6}\s*Document:\s*(.+?)\s*$", analysis, re.MULTILINE))
+    sections = {}
+    for i, heading in enumerate(headings):
+        name = heading.group(1).strip("`*'\" ")
+        if name in documents:
+            end = headings[i + 1].start() if i + 1 < len(headings) else len(analysis)
+            sections[name] = analysis[heading.start():end].strip()
+    return sections
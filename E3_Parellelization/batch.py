@@ -0,0 +1,388 @@
+"""Batch CLI - runs the document pipeline over a directory without the ADK UI.
+
+Run it from the repository root:
+
+    python -m E3_Parellelization.batch /data/reports --glob "*.txt" --concurrency 16 \\
+        --output results.jsonl --report report.md
+
+Every document of the input directory (or the documents matching --glob) is
+analyzed in one in-memory session. The todo list is built from the directory
+listing, so no model call is spent listing thousands of files. Trackers are
+kept in a temporary state directory (--state-dir to choose one), so the run
+never touches example_data or the trackers of interactive runs.
+
+Documents can be given a priority class and a deadline with --schedule, a
+JSON file mapping document names or glob patterns to
+{"priority": "critical|high|normal|low", "deadline": "<ISO 8601>"}. It turns
+on PRIORITY_SCHEDULING, so documents are analyzed earliest deadline first
+within priority classes, and results of documents with a deadline say
+whether it was missed.
+
+One JSON line per document is appended to --output as soon as its analyzer
+finishes, and a progress line with throughput goes to stderr. The pipeline's
+own log lines go to --log (stdout by default, stderr when --output is "-").
+With --metrics-port, a long run can be watched while it is in progress: live
+metrics are served in the Prometheus text format at http://127.0.0.1:<port>/metrics.
+
+Exit status:
+    0  every document was analyzed
+    1  some documents were not analyzed, or the pipeline failed
+    2  invalid arguments
+"""
+
+import argparse
+import asyncio
+import contextlib
+import fnmatch
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+
+APP_NAME = "E3_Parellelization_batch"
+USER_ID = "batch"
+DEFAULT_PROMPT = "Analyze all documents in the input directory and write the final report."
+# Progress lines are rewritten in place on a terminal, and printed this often otherwise (cron, CI logs)
+PROGRESS_INTERVAL_SECONDS = float(os.getenv("BATCH_PROGRESS_INTERVAL_SECONDS", "10"))
+TTY_PROGRESS_INTERVAL_SECONDS = 0.5
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m E3_Parellelization.batch",
+        description="Analyze every document of a directory with the E3 pipeline and stream the results as JSONL.",
+    )
+    parser.add_argument("input", help="Input directory, or a single document")
+    parser.add_argument("--glob", default=None, help="Only analyze documents matching this pattern (e.g. '*.txt')")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file for per-document results ('-' for stdout)")
+    parser.add_argument("--report", default=None, help="Write the final synthesized report to this file")
+    parser.add_argument("--log", default=None, help="Write the pipeline's log lines to this file")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="DocumentAnalyzers running in parallel (NUM_SUMMARIZE_AGENTS, or the pool maximum with --autoscale)")
+    parser.add_argument("--autoscale", action="store_true", help="Size the analyzer pool per iteration (ANALYZER_AUTOSCALING)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Characters per chunk (CHUNK_SIZE)")
+    parser.add_argument("--overlap", type=float, default=None, help="Chunk overlap as a fraction, e.g. 0.05 (CHUNK_OVERLAP_PERCENTAGE)")
+    parser.add_argument("--model", action="append", default=[], metavar="[STAGE=]MODEL",
+                        help="Model or tier for every stage, or for one stage (e.g. chunk_analysis=fast); repeatable")
+    parser.add_argument("--max-iterations", type=int, default=None,
+                        help="Assign-and-analyze rounds before giving up (FILE_PROCESSING_MAX_ITERATIONS)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve live Prometheus metrics on this port while the run is in progress (METRICS_PORT)")
+    parser.add_argument("--schedule", default=None,
+                        help="JSON file of document (or glob) -> {priority, deadline} for deadline-aware scheduling")
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT, help="Message that starts the run")
+    parser.add_argument("--state-dir", default=None, help="Directory for the run's trackers (default: a temporary directory)")
+    parser.add_argument("--keep-state", action="store_true", help="Keep the state directory after the run")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace):
+    """
+    Translate the options to the environment variables the pipeline reads at import time.
+
+    Must run before the agent module is imported.
+
+    Raises:
+        ValueError: An option has an invalid value
+    """
+    settings = {}
+    if args.concurrency is not None:
+        if args.concurrency < 1:
+            raise ValueError("--concurrency must be at least 1")
+        settings["ANALYZER_POOL_MAX" if args.autoscale else "NUM_SUMMARIZE_AGENTS"] = args.concurrency
+    if args.autoscale:
+        settings["ANALYZER_AUTOSCALING"] = "1"
+    if args.chunk_size is not None:
+        if args.chunk_size < 100:
+            raise ValueError("--chunk-size must be at least 100 characters")
+        settings["CHUNK_SIZE"] = args.chunk_size
+    if args.overlap is not None:
+        if not 0 <= args.overlap < 0.5:
+            raise ValueError("--overlap must be between 0 and 0.5")
+        settings["CHUNK_OVERLAP_PERCENTAGE"] = args.overlap
+    if args.max_iterations is not None:
+        if args.max_iterations < 1:
+            raise ValueError("--max-iterations must be at least 1")
+        settings["FILE_PROCESSING_MAX_ITERATIONS"] = args.max_iterations
+    if args.schedule:
+        settings["PRIORITY_SCHEDULING"] = "1"
+    if args.metrics_port is not None:
+        if not 0 <= args.metrics_port <= 65535:
+            raise ValueError("--metrics-port must be between 0 and 65535")
+        settings["METRICS_PORT"] = args.metrics_port
+
+    for key, value in settings.items():
+        os.environ[key] = str(value)
+
+    # Stage routes are read when the agents are created, so they can be set after this import
+    from .agents.model_routing import STAGE_ROUTES
+    for spec in args.model:
+        stage, _, model = spec.rpartition("=")
+        if not model:
+            raise ValueError(f"--model '{spec}' names no model")
+        if stage and stage not in STAGE_ROUTES:
+            raise ValueError(f"--model '{spec}': unknown stage '{stage}' (one of {', '.join(STAGE_ROUTES)})")
+        for name in [stage] if stage else STAGE_ROUTES:
+            os.environ[f"MODEL_STAGE_{name.upper()}"] = model
+
+
+def resolve_input(path: str, glob: str = None) -> tuple:
+    """
+    Return (input directory, document glob) for the input argument.
+
+    Raises:
+        ValueError: The input does not exist
+    """
+    path = os.path.realpath(path)
+    if os.path.isfile(path):
+        if glob:
+            raise ValueError("--glob cannot be combined with a single input document")
+        return os.path.dirname(path), os.path.basename(path)
+    if not os.path.isdir(path):
+        raise ValueError(f"Input '{path}' does not exist")
+    return path, glob
+
+
+def load_schedule(path: str) -> dict:
+    """
+    Read a --schedule file: document name or glob pattern -> (priority, deadline timestamp).
+
+    Raises:
+        ValueError: The file is unreadable or has an invalid entry
+    """
+    from .tools.scheduling import VALID_PRIORITIES, parse_deadline
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"--schedule '{path}': {e}")
+    if not isinstance(entries, dict):
+        raise ValueError(f"--schedule '{path}' must hold a JSON object")
+    schedule = {}
+    for pattern, entry in entries.items():
+        if not isinstance(entry, dict):
+            raise ValueError(f"--schedule entry '{pattern}' must be an object with priority and/or deadline")
+        priority = entry.get("priority", "normal")
+        if priority not in VALID_PRIORITIES:
+            raise ValueError(f"--schedule entry '{pattern}': invalid priority '{priority}'")
+        deadline = parse_deadline(entry.get("deadline"))
+        if entry.get("deadline") is not None and deadline is None:
+            raise ValueError(f"--schedule entry '{pattern}': invalid deadline '{entry['deadline']}'")
+        schedule[pattern] = (priority, deadline)
+    return schedule
+
+
+def apply_schedule(todo_list: list, schedule: dict) -> list:
+    """Set the priority and deadline of the todo list entries matching a schedule (first match wins)."""
+    for task in todo_list:
+        for pattern, (priority, deadline) in schedule.items():
+            if task["filename"] == pattern or fnmatch.fnmatch(task["filename"], pattern):
+                task["priority"] = priority
+                task["deadline"] = deadline
+                break
+    return todo_list
+
+
+class BatchProgress:
+    """Per-document results of a batch run, written as they complete, and its throughput."""
+
+    def __init__(self, todo_list: list, sizes: dict, output, stream=sys.stderr):
+        self.output = output
+        self.stream = stream
+        self.sizes = sizes
+        self.total = len(todo_list)
+        self.started_at = time.time()
+        self.finished = set()
+        self.completed = 0
+        self.failed = 0
+        self.completed_bytes = 0
+        # Session state as of the last event (merged from the events' state deltas)
+        self.state = {}
+        self.tty = stream.isatty()
+        self.last_progress = 0.0
+
+    def observe(self, event):
+        """Fold an event's state delta into the state and write the documents it completed."""
+        delta = event.actions.state_delta if event.actions else None
+        if not delta:
+            return
+        self.state.update(delta)
+        todo_list = delta.get("todo_list_result")
+        if todo_list is None:
+            return
+        from .agents.utils import parse_todo_list
+        tasks = parse_todo_list(todo_list)
+        # The planner rewrites the list; it is the authority on what is being analyzed
+        self.total = max(self.total, len(tasks))
+        for task in tasks:
+            if isinstance(task, dict) and task.get("status") == "completed" and task.get("filename") not in self.finished:
+                self.write_result(task, "completed")
+        self.show_progress()
+
+    def analysis_for(self, task: dict):
+        """The analysis of a document, from the result store (or its analyzer's state without one)."""
+        from .tools.result_store import RESULT_RUN_ID_KEY, RESULT_STORE_ENABLED, load_analysis
+        run_id = self.state.get(RESULT_RUN_ID_KEY)
+        if RESULT_STORE_ENABLED and run_id:
+            analysis = load_analysis(run_id, task["filename"])
+            if analysis is not None:
+                return analysis
+        agent_number = (task.get("assigned_agent") or "").replace("DocumentAnalyzer", "")
+        sections = self.state.get(f"document_analyses_{agent_number}") or {}
+        return sections.get(task["filename"]) or self.state.get(f"document_analysis_{agent_number}")
+
+    def write_result(self, task: dict, status: str, error: str = None):
+        filename = task.get("filename")
+        self.finished.add(filename)
+        record = {
+            "document_id": filename,
+            "status": status,
+            "analyzer": task.get("assigned_agent"),
+            "processed_at": task.get("processed_at"),
+            "bytes": self.sizes.get(filename),
+        }
+        if task.get("deadline") is not None:
+            record["priority"] = task.get("priority")
+            record["deadline"] = task["deadline"]
+            record["deadline_missed"] = bool(task.get("deadline_missed")) or status != "completed"
+        if status == "completed":
+            self.completed += 1
+            self.completed_bytes += self.sizes.get(filename, 0)
+            record["analysis"] = self.analysis_for(task)
+        else:
+            self.failed += 1
+            record["error"] = error
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+
+    def finish(self, todo_list: list, error: str = None):
+        """Write a failure record for every document that was not analyzed."""
+        for task in todo_list:
+            if isinstance(task, dict) and task.get("filename") not in self.finished:
+                if task.get("status") == "completed":
+                    self.write_result(task, "completed")
+                else:
+                    self.write_result(
+                        task, "failed", task.get("error") or error or f"not analyzed (status '{task.get('status')}')"
+                    )
+        self.show_progress(final=True)
+
+    def show_progress(self, final: bool = False):
+        now = time.time()
+        interval = TTY_PROGRESS_INTERVAL_SECONDS if self.tty else PROGRESS_INTERVAL_SECONDS
+        if not final and now - self.last_progress < interval:
+            return
+        self.last_progress = now
+        elapsed = max(now - self.started_at, 1e-9)
+        rate = self.completed / elapsed
+        line = (f"[Batch] {self.completed}/{self.total} document(s)"
+                + (f", {self.failed} failed" if self.failed else "")
+                + f" | {rate:.2f} docs/s, {self.completed_bytes / elapsed / 1024:.1f} KB/s | {elapsed:.0f}s elapsed")
+        remaining = self.total - self.completed - self.failed
+        if remaining and rate > 0 and not final:
+            line += f", ~{math.ceil(remaining / rate)}s left"
+        if self.tty:
+            self.stream.write("\r\033[K" + line + ("\n" if final else ""))
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+
+async def run_batch(root_agent, todo_list: list, sizes: dict, output, prompt: str = DEFAULT_PROMPT) -> tuple:
+    """
+    Run the pipeline once over a seeded todo list, writing results as documents complete.
+
+    Args:
+        root_agent: Pipeline to run
+        todo_list: Pending todo list of the documents to analyze
+        sizes: document_id -> size in bytes
+        output: Text stream receiving one JSON line per document
+        prompt: Message that starts the run
+
+    Returns:
+        (BatchProgress, final report or None)
+    """
+    from google.adk.runners import InMemoryRunner
+    from google.genai import types
+    from .agents.file_todo_list_agent import SEEDED_TODO_LIST_KEY
+    from .agents.utils import parse_todo_list
+
+    runner = InMemoryRunner(agent=root_agent, app_name=APP_NAME)
+    session = await runner.session_service.create_session(
+        app_name=APP_NAME, user_id=USER_ID, state={SEEDED_TODO_LIST_KEY: todo_list}
+    )
+    progress = BatchProgress(todo_list, sizes, output)
+    progress.show_progress(final=False)
+    message = types.Content(role="user", parts=[types.Part(text=prompt)])
+    error = None
+    try:
+        async for event in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=message):
+            progress.observe(event)
+    except Exception as e:
+        error = f"pipeline failed: {type(e).__name__}: {e}"
+    final_todo = parse_todo_list(progress.state.get("todo_list_result")) or todo_list
+    progress.finish(final_todo, error)
+    if error:
+        print(f"[Batch] ERROR: {error}", file=sys.stderr)
+    return progress, progress.state.get("synthesized_report")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        data_dir, document_glob = resolve_input(args.input, args.glob)
+        configure_environment(args)
+        schedule = load_schedule(args.schedule) if args.schedule else {}
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    from .agents.file_todo_list_agent import build_todo_list
+    from .tools.document_source import list_documents
+    from .tools.workspace import Workspace, reset_workspace, set_workspace
+
+    state_dir = args.state_dir or tempfile.mkdtemp(prefix="e3-batch-")
+    os.makedirs(state_dir, exist_ok=True)
+    token = set_workspace(Workspace("batch", data_dir, state_dir, document_glob))
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    log = open(args.log, "a", encoding="utf-8") if args.log else (sys.stderr if args.output == "-" else None)
+    try:
+        documents = list_documents()
+        if not documents:
+            print(f"[Batch] No documents in {data_dir}" + (f" match '{document_glob}'" if document_glob else ""),
+                  file=sys.stderr)
+            return EXIT_FAILURES
+        print(f"[Batch] Analyzing {len(documents)} document(s) from {data_dir} (state in {state_dir})", file=sys.stderr)
+
+        with contextlib.redirect_stdout(log) if log is not None else contextlib.nullcontext():
+            from .agent import root_agent
+            progress, report = asyncio.run(run_batch(
+                root_agent,
+                apply_schedule(build_todo_list(documents), schedule),
+                {doc["document_id"]: doc["size"] for doc in documents},
+                output,
+                prompt=args.prompt,
+            ))
+        if args.report and report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(report)
+        return EXIT_OK if progress.failed == 0 else EXIT_FAILURES
+    finally:
+        reset_workspace(token)
+        if output is not sys.stdout:
+            output.close()
+        if args.log and log is not None:
+            log.close()
+        if not args.keep_state and not args.state_dir:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
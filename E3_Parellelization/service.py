@@ -0,0 +1,397 @@
+"""Job service - runs document-analysis jobs in one long-lived process.
+
+Each job analyzes its own input directory. Jobs wait in a queue and are
+admitted while the shared analyzer pool has room for them. All running jobs
+share one agent tree, the model connections, the file cache and the corpus
+index, and split the analyzer pool by weighted fair share (see
+AnalyzerShares in agents/analyzer_autoscaler.py).
+
+Start it from the repository root:
+
+    python -m E3_Parellelization.service --port 8090
+
+API:
+    POST   /jobs              submit {"input_dir": "...", "weight": 1, "max_analyzers": null, "prompt": "..."}
+    GET    /jobs              every job and its status
+    GET    /jobs/{id}         status and progress of one job
+    GET    /jobs/{id}/result  final report of a completed job
+    DELETE /jobs/{id}         cancel a queued or running job
+    GET    /pool              analyzer pool, fair shares and queue
+    GET    /metrics           live metrics in the Prometheus text format (tools/live_metrics.py)
+
+Admission control: a job is admitted while fewer than SERVICE_MAX_RUNNING_JOBS
+run and every running job would still get SERVICE_MIN_ANALYZERS_PER_JOB
+analyzers. The pool is SERVICE_ANALYZER_POOL analyzers, lowered to what fits
+LLM_REQUESTS_PER_MINUTE at the measured model latency. Submissions beyond
+SERVICE_MAX_QUEUED_JOBS waiting jobs are refused with 429.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# The pool is shared by resizing it per iteration, which needs the autoscaled pipeline
+os.environ.setdefault("ANALYZER_AUTOSCALING", "1")
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from pydantic import BaseModel
+from .agents.analyzer_autoscaler import ANALYZER_POOL_MAX, AnalyzerShares, fair_share, rate_limited_pool_size
+from .agents.utils import parse_todo_list
+from .tools.chunking import release_workspace
+from .tools.live_metrics import CONTENT_TYPE, register_collector, render_metrics
+from .tools.result_store import close_result_store
+from .tools.workspace import Workspace, get_project_dir, reset_workspace, set_workspace
+
+APP_NAME = "E3_Parellelization"
+SERVICE_MAX_RUNNING_JOBS = int(os.getenv("SERVICE_MAX_RUNNING_JOBS", "4"))
+SERVICE_MAX_QUEUED_JOBS = int(os.getenv("SERVICE_MAX_QUEUED_JOBS", "100"))
+SERVICE_ANALYZER_POOL = int(os.getenv("SERVICE_ANALYZER_POOL", str(ANALYZER_POOL_MAX)))
+SERVICE_MIN_ANALYZERS_PER_JOB = int(os.getenv("SERVICE_MIN_ANALYZERS_PER_JOB", "1"))
+# Where each job keeps its trackers and report (jobs/<job_id>/)
+SERVICE_JOBS_DIR = os.getenv("SERVICE_JOBS_DIR", os.path.join(get_project_dir(), "jobs"))
+# If set, input directories must be inside it
+SERVICE_INPUT_ROOT = os.getenv("SERVICE_INPUT_ROOT")
+# Admission is re-checked this often, since the rate-limited pool follows the measured latency
+SERVICE_ADMISSION_INTERVAL_SECONDS = float(os.getenv("SERVICE_ADMISSION_INTERVAL_SECONDS", "5"))
+
+DEFAULT_PROMPT = "Analyze all documents in the input directory and write the final report."
+REPORT_FILENAME = "report.md"
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+class JobRequest(BaseModel):
+    """Body of POST /jobs."""
+    input_dir: str
+    weight: float = 1.0
+    max_analyzers: Optional[int] = None
+    prompt: str = DEFAULT_PROMPT
+
+
+class QueueFullError(Exception):
+    """The job queue is at SERVICE_MAX_QUEUED_JOBS."""
+
+
+class Job:
+    """A submitted job and its progress."""
+
+    def __init__(self, job_id: str, request: JobRequest, input_dir: str):
+        self.job_id = job_id
+        self.request = request
+        self.workspace = Workspace(job_id, input_dir, os.path.join(SERVICE_JOBS_DIR, job_id))
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.session_id = None
+        self.task = None
+        self.events = 0
+        # Final document counts, kept after the job's session is deleted
+        self.documents = None
+
+    @property
+    def report_path(self) -> str:
+        return os.path.join(self.workspace.state_dir, REPORT_FILENAME)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "input_dir": self.workspace.data_dir,
+            "weight": self.request.weight,
+            "max_analyzers": self.request.max_analyzers,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "events": self.events,
+            "documents": self.documents,
+        }
+
+
+def document_counts(state) -> dict:
+    """Count the documents of a job's todo list by status."""
+    counts = {"total": 0}
+    for task in parse_todo_list(state.get("todo_list_result")):
+        if isinstance(task, dict):
+            counts["total"] += 1
+            status = task.get("status", "unknown")
+            counts[status] = counts.get(status, 0) + 1
+            if task.get("deadline_missed"):
+                counts["deadline_missed"] = counts.get("deadline_missed", 0) + 1
+    return counts
+
+
+class JobService:
+    """Queue, admission control and execution of jobs on one shared agent tree."""
+
+    def __init__(self, root_agent, analyzer_pool: int = SERVICE_ANALYZER_POOL,
+                 max_running_jobs: int = SERVICE_MAX_RUNNING_JOBS):
+        self.runner = InMemoryRunner(agent=root_agent, app_name=APP_NAME)
+        self.analyzer_pool = analyzer_pool
+        self.max_running_jobs = max_running_jobs
+        # job_id -> Job, in submission order
+        self.jobs = {}
+        self.queue = deque()
+        self.running = {}
+        self.wakeup = asyncio.Event()
+        self.scheduler_task = None
+
+    def analyzer_capacity(self) -> int:
+        """Analyzers all jobs may run together: the pool, lowered to what fits the request budget."""
+        rate_cap = rate_limited_pool_size()
+        return self.analyzer_pool if rate_cap is None else min(self.analyzer_pool, rate_cap)
+
+    def can_admit(self) -> bool:
+        """Return True if one more job fits the running-job limit and the analyzer budget."""
+        if len(self.running) >= self.max_running_jobs:
+            return False
+        # An idle service always takes a job, however small the budget
+        return not self.running or self.analyzer_capacity() // (len(self.running) + 1) >= SERVICE_MIN_ANALYZERS_PER_JOB
+
+    def submit(self, request: JobRequest) -> Job:
+        """
+        Queue a job.
+
+        Raises:
+            ValueError: The input directory does not exist or is outside SERVICE_INPUT_ROOT
+            QueueFullError: SERVICE_MAX_QUEUED_JOBS jobs are already waiting
+        """
+        input_dir = os.path.realpath(request.input_dir)
+        if not os.path.isdir(input_dir):
+            raise ValueError(f"Input directory '{request.input_dir}' does not exist")
+        if SERVICE_INPUT_ROOT:
+            root = os.path.realpath(SERVICE_INPUT_ROOT)
+            if os.path.commonpath([root, input_dir]) != root:
+                raise ValueError(f"Input directory must be inside {SERVICE_INPUT_ROOT}")
+        if request.weight <= 0:
+            raise ValueError("weight must be positive")
+        if request.max_analyzers is not None and request.max_analyzers < 1:
+            raise ValueError("max_analyzers must be at least 1")
+        if len(self.queue) >= SERVICE_MAX_QUEUED_JOBS:
+            raise QueueFullError(f"{len(self.queue)} job(s) are already queued")
+
+        job = Job(f"job-{uuid.uuid4().hex[:8]}", request, input_dir)
+        os.makedirs(job.workspace.state_dir, exist_ok=True)
+        self.jobs[job.job_id] = job
+        self.queue.append(job)
+        print(f"[JobService] Queued {job.job_id} for {input_dir} ({len(self.queue)} waiting)")
+        self.wakeup.set()
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """Cancel a queued or running job; returns False if it had already finished."""
+        if job.status == "queued":
+            self.queue.remove(job)
+            job.status, job.finished_at = "cancelled", time.time()
+            print(f"[JobService] Cancelled queued {job.job_id}")
+            return True
+        if job.status == "running":
+            job.task.cancel()
+            return True
+        return False
+
+    async def progress(self, job: Job) -> Optional[dict]:
+        """Document counts of a running job, read from its session."""
+        if job.session_id is None:
+            return job.documents
+        session = await self.runner.session_service.get_session(
+            app_name=APP_NAME, user_id=job.job_id, session_id=job.session_id
+        )
+        return document_counts(session.state) if session is not None else job.documents
+
+    def start(self):
+        """Start admitting jobs (call from the running event loop)."""
+        self.scheduler_task = asyncio.get_running_loop().create_task(self._admit_loop())
+
+    async def stop(self):
+        """Stop admitting jobs and cancel the running ones."""
+        if self.scheduler_task is not None:
+            self.scheduler_task.cancel()
+        for job in list(self.running.values()):
+            job.task.cancel()
+        await asyncio.gather(*(job.task for job in list(self.running.values())), return_exceptions=True)
+
+    async def _admit_loop(self):
+        while True:
+            AnalyzerShares.pool_size = self.analyzer_capacity()
+            while self.queue and self.can_admit():
+                self._admit(self.queue.popleft())
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=SERVICE_ADMISSION_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _admit(self, job: Job):
+        job.status, job.started_at = "running", time.time()
+        AnalyzerShares.weights[job.job_id] = job.request.weight
+        if job.request.max_analyzers is not None:
+            AnalyzerShares.limits[job.job_id] = job.request.max_analyzers
+        self.running[job.job_id] = job
+        job.task = asyncio.get_running_loop().create_task(self._run_job(job))
+        print(f"[JobService] Started {job.job_id} ({len(self.running)} running, "
+              f"fair share {fair_share(job.job_id)} of {AnalyzerShares.pool_size} analyzer(s))")
+
+    async def _run_job(self, job: Job):
+        # The workspace follows every task ADK creates for this job
+        token = set_workspace(job.workspace)
+        session_service = self.runner.session_service
+        try:
+            session = await session_service.create_session(
+                app_name=APP_NAME, user_id=job.job_id, state={"job_id": job.job_id}
+            )
+            job.session_id = session.id
+            message = types.Content(role="user", parts=[types.Part(text=job.request.prompt)])
+            async for _ in self.runner.run_async(user_id=job.job_id, session_id=session.id, new_message=message):
+                job.events += 1
+            session = await session_service.get_session(app_name=APP_NAME, user_id=job.job_id, session_id=session.id)
+            job.documents = document_counts(session.state)
+            with open(job.report_path, "w", encoding="utf-8") as f:
+                f.write(session.state.get("synthesized_report") or "")
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+            reset_workspace(token)
+            await self._release(job)
+        print(f"[JobService] {job.job_id} {job.status} after {job.finished_at - job.started_at:.1f}s"
+              + (f": {job.error}" if job.error else ""))
+
+    async def _release(self, job: Job):
+        self.running.pop(job.job_id, None)
+        for registry in (AnalyzerShares.weights, AnalyzerShares.limits, AnalyzerShares.demands):
+            registry.pop(job.job_id, None)
+        release_workspace(job.job_id)
+        close_result_store(job.workspace.state_dir)
+        self.wakeup.set()
+        if job.session_id is not None:
+            # The counts are kept on the job; the session state holds every analysis
+            session_id, job.session_id = job.session_id, None
+            await self.runner.session_service.delete_session(
+                app_name=APP_NAME, user_id=job.job_id, session_id=session_id
+            )
+
+    def pool_status(self) -> dict:
+        return {
+            "analyzer_pool": self.analyzer_pool,
+            "analyzer_capacity": self.analyzer_capacity(),
+            "max_running_jobs": self.max_running_jobs,
+            "running": {job_id: {
+                "weight": AnalyzerShares.weights.get(job_id),
+                "demand": AnalyzerShares.demands.get(job_id),
+                "fair_share": fair_share(job_id),
+            } for job_id in self.running},
+            "queued": [job.job_id for job in self.queue],
+        }
+
+    def live_metrics(self) -> list:
+        """Job queue and analyzer pool metrics for the live metrics endpoint."""
+        return [
+            ("e3_service_jobs", "gauge", "Jobs of the job service per status.",
+             [({"status": "queued"}, len(self.queue)), ({"status": "running"}, len(self.running))]),
+            ("e3_service_analyzer_capacity", "gauge", "Analyzers the running jobs may use together.",
+             [({}, self.analyzer_capacity())]),
+        ]
+
+
+def create_app(service: JobService) -> FastAPI:
+    """Build the HTTP API of a job service."""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        service.start()
+        yield
+        await service.stop()
+
+    app = FastAPI(title="E3 document analysis job service", lifespan=lifespan)
+    register_collector(service.live_metrics)
+
+    def get_job(job_id: str) -> Job:
+        job = service.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+        return job
+
+    @app.post("/jobs", status_code=202)
+    async def submit_job(request: JobRequest):
+        try:
+            job = service.submit(request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e),
+                                headers={"Retry-After": str(int(SERVICE_ADMISSION_INTERVAL_SECONDS * 6))})
+        return job.to_dict()
+
+    @app.get("/jobs")
+    async def list_jobs():
+        return [job.to_dict() for job in service.jobs.values()]
+
+    @app.get("/jobs/{job_id}")
+    async def job_status(job_id: str):
+        job = get_job(job_id)
+        status = job.to_dict()
+        status["documents"] = await service.progress(job)
+        if job.status == "queued":
+            status["queue_position"] = list(service.queue).index(job) + 1
+        return status
+
+    @app.get("/jobs/{job_id}/result")
+    async def job_result(job_id: str):
+        job = get_job(job_id)
+        if job.status != "completed":
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' is {job.status}")
+        with open(job.report_path, "r", encoding="utf-8") as f:
+            report = f.read()
+        return {"job_id": job_id, "documents": job.documents, "report": report}
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        job = get_job(job_id)
+        if not service.cancel(job):
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' already {job.status}")
+        return {"job_id": job_id, "status": "cancelling" if job.status == "running" else job.status}
+
+    @app.get("/pool")
+    async def pool():
+        return service.pool_status()
+
+    @app.get("/metrics")
+    async def metrics():
+        # Reading the trackers must not stall the jobs' event loop
+        return PlainTextResponse(await asyncio.to_thread(render_metrics), media_type=CONTENT_TYPE)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the E3 document analysis job service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--clean", action="store_true", help="Delete the state of earlier jobs at startup")
+    args = parser.parse_args()
+
+    import uvicorn
+    from .agent import root_agent
+
+    if args.clean and os.path.isdir(SERVICE_JOBS_DIR):
+        shutil.rmtree(SERVICE_JOBS_DIR)
+    uvicorn.run(create_app(JobService(root_agent)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Shared fixtures: an isolated workspace and a deterministic stand-in for the chunk analyzer's model."""
+
+import random
+import re
+import uuid
+from typing import AsyncGenerator
+import pytest
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from ..tools import corpus_index
+from ..tools.chunking import release_workspace
+from ..tools.result_store import close_result_store
+from ..tools.workspace import Workspace, reset_workspace, set_workspace
+
+
+def write_document(directory, name: str, chars: int, seed: int = 0) -> str:
+    """Write a document of random words (no two chunks alike, so dedup keeps them all)."""
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < chars:
+        word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+        words.append(word)
+        length += len(word) + 1
+    path = directory / name
+    path.write_text(" ".join(words)[:chars], encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Run the test in its own workspace, with documents in tmp_path/data and trackers in tmp_path/state."""
+    (tmp_path / "data").mkdir()
+    (tmp_path / "state").mkdir()
+    monkeypatch.setattr(corpus_index, "get_index_dir", lambda: str(tmp_path / "corpus_index"))
+    ws = Workspace(f"test-{uuid.uuid4().hex[:8]}", str(tmp_path / "data"), str(tmp_path / "state"))
+    token = set_workspace(ws)
+    try:
+        yield ws
+    finally:
+        reset_workspace(token)
+        release_workspace(ws.workspace_id)
+        close_result_store(ws.state_dir)
+
+
+class EchoAnalysisModel(BaseLlm):
+    """Extends the existing analysis in its instruction with a line for the chunk it was given."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        instruction = llm_request.config.system_instruction or ""
+        if not isinstance(instruction, str):
+            instruction = "".join(part.text or "" for part in instruction.parts)
+        existing = re.search(r"EXISTING ANALYSIS[^:]*:(.*)", instruction).group(1).strip()
+        chunk_number = re.search(r"'chunk_number': (\d+)", instruction).group(1)
+        total_chunks = re.search(r"'total_chunks': (\d+)", instruction).group(1)
+        text = f"{existing} [chunk {chunk_number}/{total_chunks}]".strip()
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+async def run_agent(agent, state: dict) -> dict:
+    """Run an agent in a fresh in-memory session seeded with state; returns the final state."""
+    from google.adk.runners import InMemoryRunner
+
+    runner = InMemoryRunner(agent=agent, app_name="tests")
+    session = await runner.session_service.create_session(app_name="tests", user_id="test", state=state)
+    message = types.Content(role="user", parts=[types.Part(text="Analyze the assigned documents.")])
+    async for _ in runner.run_async(user_id="test", session_id=session.id, new_message=message):
+        pass
+    session = await runner.session_service.get_session(app_name="tests", user_id="test", session_id=session.id)
+    return dict(session.state)
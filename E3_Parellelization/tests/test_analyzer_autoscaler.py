@@ -0,0 +1,79 @@
+import pytest
+from ..agents import analyzer_autoscaler
+from ..agents.analyzer_autoscaler import DOCUMENT_LATENCY_KEY, AnalyzerShares, decide_pool_size, fair_share
+from ..agents.hedged_model import LatencyTracker
+
+
+@pytest.fixture(autouse=True)
+def no_samples(monkeypatch):
+    """Size pools from the test's own latency samples and defaults."""
+    monkeypatch.setattr(LatencyTracker, "samples", {})
+    monkeypatch.setattr(analyzer_autoscaler, "ANALYZER_BYTES_PER_AGENT", 50000)
+    monkeypatch.setattr(analyzer_autoscaler, "ANALYZER_TARGET_ITERATION_SECONDS", 300)
+    monkeypatch.setattr(analyzer_autoscaler, "LLM_REQUESTS_PER_MINUTE", 0)
+    monkeypatch.setattr(analyzer_autoscaler, "ASSUMED_LLM_CALL_SECONDS", 5)
+
+
+@pytest.fixture
+def shared_pool(monkeypatch):
+    monkeypatch.setattr(AnalyzerShares, "pool_size", 12)
+    monkeypatch.setattr(AnalyzerShares, "weights", {})
+    monkeypatch.setattr(AnalyzerShares, "limits", {})
+    monkeypatch.setattr(AnalyzerShares, "demands", {})
+
+
+def test_no_pending_files_needs_no_analyzers():
+    assert decide_pool_size(0, 0)[0] == 0
+
+
+def test_pending_bytes_size_the_pool_before_latency_is_known():
+    assert decide_pool_size(10, 120000, max_agents=32)[0] == 3
+    # Never more analyzers than files, never more than the pre-built pool
+    assert decide_pool_size(2, 10**7, max_agents=32)[0] == 2
+    assert decide_pool_size(100, 10**7, max_agents=8)[0] == 8
+    assert decide_pool_size(5, 10, min_agents=2, max_agents=8)[0] == 2
+
+
+def test_document_latency_sizes_the_pool_for_the_target_iteration_time():
+    for seconds in (50, 60, 70):
+        LatencyTracker.record(DOCUMENT_LATENCY_KEY, seconds)
+
+    size, reason = decide_pool_size(20, 0, max_agents=32)
+
+    # 20 files at 60s each in a 300s iteration
+    assert size == 4
+    assert "60s each" in reason
+
+
+def test_request_budget_caps_the_pool(monkeypatch):
+    monkeypatch.setattr(analyzer_autoscaler, "LLM_REQUESTS_PER_MINUTE", 36)
+    for seconds in (8, 10, 12):
+        LatencyTracker.record("chunk_analysis:gemini", seconds)
+
+    size, reason = decide_pool_size(50, 10**7, max_agents=32)
+
+    # Each analyzer keeps one 10s call in flight: 6 requests a minute
+    assert size == 6
+    assert "capped by 36 requests/min" in reason
+
+
+def test_fair_share_splits_the_pool_by_weight(shared_pool):
+    AnalyzerShares.weights.update({"a": 1.0, "b": 2.0})
+
+    assert fair_share("a") == 4
+    assert fair_share("b") == 8
+
+
+def test_fair_share_gives_unused_capacity_to_the_other_jobs(shared_pool):
+    AnalyzerShares.weights.update({"a": 1.0, "b": 1.0, "c": 1.0})
+    AnalyzerShares.demands.update({"a": 2})
+
+    assert fair_share("b") == 5
+    assert fair_share("c") == 5
+    assert fair_share("a") == 2
+
+
+def test_fair_share_is_at_least_one_analyzer(shared_pool):
+    AnalyzerShares.weights.update({f"job{i}": 1.0 for i in range(20)})
+
+    assert fair_share("job0") == 1
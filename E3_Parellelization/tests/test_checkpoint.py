@@ -0,0 +1,27 @@
+import asyncio
+import json
+from ..agents.file_todo_list_agent import create_file_todo_list_agent
+from ..agents.utils import parse_todo_list
+from ..tools import checkpoint
+from ..tools.checkpoint import PipelineCheckpoint
+from .conftest import run_agent
+from .test_scheduling import UnusedModel
+
+
+def test_resume_keeps_the_saved_todo_list(tmp_path, monkeypatch):
+    todo_list = [
+        {"filename": "a.txt", "status": "completed", "assigned_agent": "DocumentAnalyzer1"},
+        {"filename": "b.txt", "status": "pending", "assigned_agent": "DocumentAnalyzer2"},
+    ]
+    path = tmp_path / "pipeline_checkpoint.json"
+    path.write_text(json.dumps({"saved_at": 0, "session_state": {"todo_list_result": todo_list}}), encoding="utf-8")
+    monkeypatch.setattr(checkpoint, "RESUME_FROM_CHECKPOINT", True)
+    monkeypatch.setattr(checkpoint, "get_checkpoint_path", lambda: str(path))
+    for name, value in (("resume_data", None), ("session_state", {}), ("pending_cursors", {})):
+        monkeypatch.setattr(PipelineCheckpoint, name, value)
+    todo_agent = create_file_todo_list_agent()
+    todo_agent.model = UnusedModel(model="unused")
+
+    state = asyncio.run(run_agent(todo_agent, {}))
+
+    assert parse_todo_list(state["todo_list_result"]) == todo_list
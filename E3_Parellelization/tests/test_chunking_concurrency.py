@@ -0,0 +1,81 @@
+import asyncio
+import time
+from collections import Counter
+from pathlib import Path
+from ..tools import chunking
+from ..tools.chunking import CHUNK_SIZE, AgentChunkState, _cursor_of, get_next_chunk_async
+from .conftest import write_document
+
+AGENTS = 100
+# Longest the event loop may go without running the heartbeat while the agents chunk
+MAX_EVENT_LOOP_STALL_SECONDS = 0.5
+
+
+async def _drain(document_id: str, agent_id: str) -> list:
+    """Request chunks of a document until the agent's cursor is exhausted."""
+    served = []
+    while True:
+        chunk_info = await get_next_chunk_async(document_id=document_id, agent_id=agent_id)
+        if not chunk_info.get("more_chunks_exist"):
+            assert not chunk_info.get("error"), chunk_info
+            return served
+        served.append(chunk_info)
+
+
+async def _heartbeat(stop: asyncio.Event, gaps: list):
+    last = time.monotonic()
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+        now = time.monotonic()
+        gaps.append(now - last)
+        last = now
+
+
+async def _run_agents(documents: list) -> tuple:
+    stop = asyncio.Event()
+    gaps = []
+    heartbeat = asyncio.create_task(_heartbeat(stop, gaps))
+    try:
+        results = await asyncio.gather(
+            *(_drain(document_id, f"StressAgent{i}") for i, document_id in enumerate(documents))
+        )
+    finally:
+        stop.set()
+        await heartbeat
+    return results, gaps
+
+
+def test_concurrent_agents_get_every_chunk_exactly_once(workspace):
+    documents = [f"doc{i:03d}.txt" for i in range(AGENTS)]
+    for seed, name in enumerate(documents):
+        write_document(Path(workspace.data_dir), name, int(CHUNK_SIZE * 2.5), seed=seed)
+
+    results, gaps = asyncio.run(_run_agents(documents))
+
+    for document_id, served in zip(documents, results):
+        assert served, f"no chunks served for {document_id}"
+        assert {chunk["current_document"] for chunk in served} == {document_id}
+        total = served[0]["total_chunks"]
+        counts = Counter(chunk["chunk_number"] for chunk in served)
+        assert counts == Counter(range(1, total + 1)), f"{document_id} served chunks {sorted(counts.elements())}"
+    assert max(gaps) < MAX_EVENT_LOOP_STALL_SECONDS
+
+
+def test_cursor_of_a_state_being_released_is_readable():
+    state = AgentChunkState()
+    state.current_document = "doc.txt"
+    # release_document has replaced the chunk arrays but not yet reset current_index
+    state.current_index = 3
+
+    assert _cursor_of(state)["resume_chunk"] == 0
+    assert _cursor_of(state, reserve_last=False)["resume_chunk"] == 0
+
+
+def test_state_being_handed_out_is_not_evicted(workspace, monkeypatch):
+    monkeypatch.setattr(chunking, "CHUNKER_MAX_AGENT_STATES", 1)
+    with chunking._locked_agent_state("busy"):
+        # The registry is over its limit and the only other state is in use
+        with chunking._locked_agent_state("new") as state:
+            assert chunking.DocumentChunker.agent_states.get("new") is state
+    for agent_id in ("busy", "new"):
+        chunking._reset_state(agent_id)
@@ -0,0 +1,45 @@
+import json
+import multiprocessing
+from array import array
+import pytest
+from ..tools import corpus_index
+from ..tools.corpus_index import CorpusIndex, index_passage, search_passages
+
+
+@pytest.fixture
+def empty_index(workspace, monkeypatch):
+    """An index with nothing loaded in this process, stored under the workspace's tmp_path."""
+    for name, value in {"loaded": False, "postings": {}, "lengths": array("I"), "passages": [], "texts": [],
+                        "latest": {}, "unflushed": 0}.items():
+        monkeypatch.setattr(CorpusIndex, name, value)
+    return corpus_index.get_index_dir()
+
+
+def _index_from_worker(index_dir: str, worker: int, count: int):
+    corpus_index.get_index_dir = lambda: index_dir
+    # Snapshots are rewritten while the other workers append
+    corpus_index.INDEX_FLUSH_EVERY = 2
+    for number in range(1, count + 1):
+        index_passage(f"worker{worker} passage{number} " * 2000, "chunk", f"worker{worker}.txt", number)
+
+
+def test_reanalysis_by_another_agent_supersedes_the_first(empty_index):
+    index_passage("findings about turbines", "chunk_analysis", "a.txt", 1, agent="DocumentAnalyzer1")
+    latest = index_passage("revised findings about turbines", "chunk_analysis", "a.txt", 1, agent="DocumentAnalyzer1_speculative")
+
+    assert [passage_id for _, passage_id in search_passages("turbines")] == [latest]
+
+
+def test_worker_processes_share_one_index(empty_index):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_index_from_worker, args=(empty_index, worker, 20)) for worker in (1, 2, 3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+    with open(f"{empty_index}/passages.jsonl", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 60
+    assert len(search_passages("worker2", k=100)) == 20
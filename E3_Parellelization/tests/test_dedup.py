@@ -0,0 +1,37 @@
+"""Deduplication state does not carry over from one run of the pipeline to the next."""
+
+from ..tools.chunking import forget_previous_runs_callback
+from ..tools.dedup import ChunkDeduplicator, deduplicate_chunks, get_dedup_report
+from .conftest import write_document
+
+
+def test_next_run_does_not_alias_documents_of_an_earlier_run(workspace, tmp_path):
+    with open(write_document(tmp_path, "chunk.txt", 2000, seed=7), encoding="utf-8") as f:
+        chunk = f.read()
+    assert deduplicate_chunks("report.txt", [chunk])["kept_indices"] == [0]
+    # Within a run, the same text under another name is aliased
+    assert deduplicate_chunks("report_copy.txt", [chunk])["duplicate_of"] == "report.txt"
+
+    # The document was renamed before the next run in the same process
+    forget_previous_runs_callback(None)
+    assert deduplicate_chunks("report_final.txt", [chunk]) == {"kept_indices": [0], "duplicate_of": None}
+
+
+def test_next_run_frees_the_index_and_reports_only_its_own_chunks(workspace, tmp_path):
+    with open(write_document(tmp_path, "chunk.txt", 2000, seed=8), encoding="utf-8") as f:
+        chunk = f.read()
+    deduplicate_chunks("a.txt", [chunk, chunk])
+    scope = workspace.workspace_id
+    assert len(ChunkDeduplicator.chunk_owners[scope]) == 1
+    assert "Exact duplicate chunks dropped: 1" in get_dedup_report()
+
+    forget_previous_runs_callback(None)
+    assert scope not in ChunkDeduplicator.chunk_owners
+    assert scope not in ChunkDeduplicator.chunk_signatures
+    assert not any(key[0] == scope for key in ChunkDeduplicator.lsh_buckets)
+
+    deduplicate_chunks("b.txt", [chunk])
+    report = get_dedup_report()
+    assert "Chunks checked: 1" in report
+    assert "Exact duplicate chunks dropped: 0" in report
+    assert "a.txt" not in report
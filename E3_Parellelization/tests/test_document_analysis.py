@@ -0,0 +1,86 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncGenerator
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from ..agents import chunk_feeder
+from ..agents.document_analysis_agent import create_document_analysis_agent
+from ..tools.chunking import CHUNK_SIZE
+from ..tools.result_store import RESULT_RUN_ID_KEY, load_analysis
+from .conftest import EchoAnalysisModel, run_agent, write_document
+
+
+class FirstSectionModel(BaseLlm):
+    """Answers a batch with a section for its first document only."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        text = "### Document: a.txt\nFindings of a."
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def test_stored_analysis_covers_every_chunk(workspace):
+    write_document(Path(workspace.data_dir), "long.txt", int(CHUNK_SIZE * 2.5))
+    analyzer = create_document_analysis_agent(1)
+    analyzer.sub_agents[1].model = EchoAnalysisModel(model="echo")
+    todo_list = [{"filename": "long.txt", "status": "pending", "assigned_agent": "DocumentAnalyzer1"}]
+
+    state = asyncio.run(run_agent(analyzer, {"todo_list_result": todo_list}))
+
+    analysis = load_analysis(state[RESULT_RUN_ID_KEY], "long.txt")
+    assert analysis == "[chunk 1/3] [chunk 2/3] [chunk 3/3]"
+    assert state["todo_list_result"][0]["status"] == "completed"
+
+
+def test_each_document_completes_when_its_last_chunk_is_analyzed(workspace):
+    write_document(Path(workspace.data_dir), "first.txt", int(CHUNK_SIZE * 1.5), seed=1)
+    write_document(Path(workspace.data_dir), "second.txt", int(CHUNK_SIZE * 1.5), seed=2)
+    analyzer = create_document_analysis_agent(1)
+    analyzer.sub_agents[1].model = EchoAnalysisModel(model="echo")
+    todo_list = [
+        {"filename": name, "status": "pending", "assigned_agent": "DocumentAnalyzer1"}
+        for name in ("first.txt", "second.txt")
+    ]
+
+    state = asyncio.run(run_agent(analyzer, {"todo_list_result": todo_list}))
+
+    first, second = state["todo_list_result"]
+    assert first["processed_at"] < second["processed_at"] <= state["DocumentAnalyzer1_completed_at"]
+
+
+def test_batched_document_without_a_section_fails(workspace):
+    for seed, name in enumerate(("a.txt", "b.txt")):
+        write_document(Path(workspace.data_dir), name, CHUNK_SIZE // 4, seed=seed)
+    analyzer = create_document_analysis_agent(1)
+    analyzer.sub_agents[1].model = FirstSectionModel(model="first-section")
+    todo_list = [
+        {"filename": name, "status": "pending", "assigned_agent": "DocumentAnalyzer1"} for name in ("a.txt", "b.txt")
+    ]
+
+    state = asyncio.run(run_agent(analyzer, {"todo_list_result": todo_list}))
+
+    a, b = state["todo_list_result"]
+    assert a["status"] == "completed"
+    assert load_analysis(state[RESULT_RUN_ID_KEY], "a.txt") == "### Document: a.txt\nFindings of a."
+    assert b["status"] == "failed"
+    assert load_analysis(state[RESULT_RUN_ID_KEY], "b.txt") is None
+
+
+def test_documents_are_listed_once_per_run(workspace, monkeypatch):
+    listings = []
+    list_documents = chunk_feeder.list_documents
+
+    def counting_list_documents():
+        listings.append(1)
+        return list_documents()
+
+    monkeypatch.setattr(chunk_feeder, "list_documents", counting_list_documents)
+    write_document(Path(workspace.data_dir), "long.txt", int(CHUNK_SIZE * 2.5))
+    analyzer = create_document_analysis_agent(1)
+    analyzer.sub_agents[1].model = EchoAnalysisModel(model="echo")
+    todo_list = [{"filename": "long.txt", "status": "pending", "assigned_agent": "DocumentAnalyzer1"}]
+
+    asyncio.run(run_agent(analyzer, {"todo_list_result": todo_list}))
+
+    assert len(listings) == 1
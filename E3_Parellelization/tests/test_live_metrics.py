@@ -0,0 +1,40 @@
+import threading
+from ..agents.run_metrics import _todo_list_counter
+from ..tools import live_metrics
+from ..tools.live_metrics import render_metrics, unwatch_run, watch_run
+
+
+def test_documents_are_counted_from_the_session_todo_list():
+    session_state = {"todo_list_result": [{"filename": "a.txt", "status": "pending"}]}
+    watch_run("inv-1", "tests", _todo_list_counter(session_state))
+    try:
+        assert 'e3_documents{workspace="tests",status="pending"} 1' in render_metrics()
+        # The endpoint follows the live session state
+        session_state["todo_list_result"] = [{"filename": "a.txt", "status": "completed"}]
+        text = render_metrics()
+        assert 'e3_documents{workspace="tests",status="pending"} 0' in text
+        assert 'e3_documents{workspace="tests",status="completed"} 1' in text
+    finally:
+        unwatch_run("inv-1")
+    assert 'workspace="tests"' not in render_metrics()
+
+
+def test_concurrent_scrapes_share_the_chunk_rate_window(monkeypatch):
+    monkeypatch.setattr(live_metrics.LiveMetrics, "chunk_samples", live_metrics.deque())
+    monkeypatch.setattr(live_metrics, "CHUNK_RATE_WINDOW_SECONDS", 0.0)
+    errors = []
+
+    def scrape(offset: int):
+        try:
+            for i in range(2000):
+                live_metrics._chunk_rate(i, offset + i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=scrape, args=(n * 10000,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(live_metrics.LiveMetrics.chunk_samples) <= 2
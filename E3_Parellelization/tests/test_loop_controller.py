@@ -0,0 +1,24 @@
+import asyncio
+import pytest
+from google.adk.agents import LoopAgent
+from ..agents.loop_controller import create_loop_controller
+from .conftest import run_agent
+
+
+def _iterations_run(todo_list_result) -> int:
+    loop = LoopAgent(
+        name="FileProcessingLoop",
+        sub_agents=[create_loop_controller("FileProcessingLoop", max_iterations=3)],
+        max_iterations=3,
+    )
+    state = asyncio.run(run_agent(loop, {"todo_list_result": todo_list_result}))
+    return state["FileProcessingLoop_iteration"]
+
+
+@pytest.mark.parametrize("todo_list_result", [[], "[]", [{"filename": "a.txt", "status": "completed"}]])
+def test_loop_stops_when_nothing_is_pending(todo_list_result):
+    assert _iterations_run(todo_list_result) == 1
+
+
+def test_unreadable_todo_list_keeps_the_loop_going():
+    assert _iterations_run("The files have been assigned.") == 3
@@ -0,0 +1,92 @@
+import asyncio
+from typing import AsyncGenerator
+import pytest
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from ..agents.hedged_model import LatencyTracker
+from ..agents.model_routing import MODEL_TIERS, ModelUsage, RoutedModel, stage_route
+
+
+class FixedModel(BaseLlm):
+    """Answer with the model name after an optional delay, or fail."""
+
+    delay: float = 0.0
+    error: bool = False
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(f"{self.model} is unavailable")
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=self.model)]))
+
+
+@pytest.fixture(autouse=True)
+def fresh_usage(monkeypatch):
+    monkeypatch.setattr(ModelUsage, "stats", {})
+    monkeypatch.setattr(ModelUsage, "run_latencies", {})
+    monkeypatch.setattr(LatencyTracker, "samples", {})
+
+
+def _answer(model: RoutedModel) -> str:
+    async def call():
+        request = LlmRequest(contents=[types.Content(role="user", parts=[types.Part(text="hello")])])
+        return [response.content.parts[0].text async for response in model.generate_content_async(request)]
+    return asyncio.run(call())[-1]
+
+
+def test_stage_is_routed_to_its_tier_with_fallbacks(monkeypatch):
+    monkeypatch.setenv("MODEL_STAGE_CHUNK_ANALYSIS", "fast")
+    monkeypatch.setenv("MODEL_STAGE_CHUNK_ANALYSIS_FALLBACKS", "balanced, fast, custom-model")
+    monkeypatch.setenv("MODEL_STAGE_CHUNK_ANALYSIS_TIMEOUT_SECONDS", "20")
+
+    model, fallbacks, timeout = stage_route("chunk_analysis")
+
+    assert model == MODEL_TIERS["fast"]
+    # The primary model is never its own fallback
+    assert fallbacks == [MODEL_TIERS["balanced"], "custom-model"]
+    assert timeout == 20
+
+
+def test_unconfigured_stage_uses_the_default_tier_without_a_timeout(monkeypatch):
+    monkeypatch.setenv("MODEL_STAGE_UNKNOWN_STAGE_TIMEOUT_SECONDS", "0")
+
+    assert stage_route("unknown_stage") == (MODEL_TIERS["balanced"], [], None)
+
+
+def test_timed_out_call_falls_back():
+    routed = RoutedModel(
+        model="slow",
+        candidates=[FixedModel(model="slow", delay=1.0), FixedModel(model="backup")],
+        stage="synthesis",
+        timeout_seconds=0.05,
+    )
+
+    assert _answer(routed) == "backup"
+    assert ModelUsage.stats[("synthesis", "slow")]["timeouts"] == 1
+    assert ModelUsage.stats[("synthesis", "backup")]["fallbacks"] == 1
+    assert len(ModelUsage.stats[("synthesis", "backup")]["latencies"]) == 1
+
+
+def test_failed_call_falls_back():
+    routed = RoutedModel(
+        model="broken",
+        candidates=[FixedModel(model="broken", error=True), FixedModel(model="backup")],
+        stage="plan",
+    )
+
+    assert _answer(routed) == "backup"
+    assert ModelUsage.stats[("plan", "broken")]["errors"] == 1
+    assert ModelUsage.stats[("plan", "backup")]["calls"] == 1
+
+
+def test_last_error_is_raised_when_every_model_fails():
+    routed = RoutedModel(
+        model="broken",
+        candidates=[FixedModel(model="broken", error=True), FixedModel(model="also-broken", error=True)],
+        stage="plan",
+    )
+
+    with pytest.raises(RuntimeError, match="also-broken is unavailable"):
+        _answer(routed)
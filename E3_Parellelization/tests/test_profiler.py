@@ -0,0 +1,32 @@
+import asyncio
+import threading
+import pytest
+from google.adk.agents import BaseAgent
+from ..agents import profiler
+from ..agents.profiler import PipelineProfiler, create_profiling_guard, start_profiling_callback, stop_profiling_callback
+from .conftest import run_agent
+
+
+class FailingPipeline(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        raise RuntimeError("analysis failed")
+        yield
+
+
+def test_failed_run_stops_its_profile(monkeypatch):
+    monkeypatch.setattr(profiler, "PIPELINE_PROFILING", True)
+    monkeypatch.setattr(profiler, "PROFILING_MEMORY", False)
+    written = []
+    monkeypatch.setattr(profiler, "_write_reports", written.append)
+    pipeline = FailingPipeline(
+        name="FileExtractionPipelineAgent",
+        before_agent_callback=start_profiling_callback,
+        after_agent_callback=stop_profiling_callback,
+    )
+
+    with pytest.raises(RuntimeError, match="analysis failed"):
+        asyncio.run(run_agent(create_profiling_guard(pipeline), {}))
+
+    assert PipelineProfiler.invocation_id is None
+    assert written == [PipelineProfiler.output_dir]
+    assert not any(thread.name == "pipeline-profiler" for thread in threading.enumerate())
@@ -0,0 +1,29 @@
+import time
+from types import SimpleNamespace
+from ..agents import run_metrics
+from ..agents.model_routing import ModelUsage, RoutedModel
+from ..agents.run_metrics import log_run_metrics_callback, start_run_metrics_callback
+from ..tools.async_file_tools import EventLoopLag
+from .conftest import EchoAnalysisModel
+
+
+def test_latency_and_lag_cover_only_the_run(workspace, monkeypatch):
+    logged = []
+    monkeypatch.setattr(run_metrics, "log_run_to_mlflow", lambda metrics, *args, **kwargs: logged.append(metrics))
+    model = EchoAnalysisModel(model="echo")
+    routed = RoutedModel(model="echo", candidates=[model], stage="stress")
+    monkeypatch.setattr(ModelUsage, "stats", {})
+    # An earlier run in the same process
+    monkeypatch.setattr(EventLoopLag, "max_lag", 5.0)
+    for _ in range(10):
+        routed._record(model, time.monotonic() - 100, [])
+    context = SimpleNamespace(invocation_id="inv-run-metrics", state={}, session=SimpleNamespace(state={}))
+
+    start_run_metrics_callback(context)
+    routed._record(model, time.monotonic() - 1, [])
+    log_run_metrics_callback(context)
+
+    (metrics,) = logged
+    assert 1 <= metrics["llm.stress.p99_seconds"] < 2
+    assert metrics["event_loop.max_lag_ms"] < 5000
+    assert "inv-run-metrics" not in ModelUsage.run_latencies
@@ -0,0 +1,18 @@
+from ..tools import salience
+from ..tools.chunking import forget_previous_runs_callback
+from ..tools.salience import select_salient_chunks
+
+
+def test_budget_is_renewed_for_each_run(workspace, monkeypatch):
+    monkeypatch.setattr(salience, "SALIENCE_FILTER_ENABLED", True)
+    monkeypatch.setattr(salience, "SALIENCE_LLM_CALL_BUDGET", 4)
+    chunks = [f"chunk {number} with key findings" for number in range(6)]
+
+    forget_previous_runs_callback(None)
+    assert select_salient_chunks("a.txt", chunks) == [0, 1, 2, 3]
+    # The first run spent the whole budget
+    assert select_salient_chunks("c.txt", chunks) == []
+
+    # The next run in the same process
+    forget_previous_runs_callback(None)
+    assert select_salient_chunks("b.txt", chunks) == [0, 1, 2, 3]
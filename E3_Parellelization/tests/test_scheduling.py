@@ -0,0 +1,70 @@
+import asyncio
+import json
+from typing import AsyncGenerator
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from ..agents import plan_and_assign_tasks_agent
+from ..agents.plan_and_assign_tasks_agent import create_plan_and_assign_tasks_agent
+from .conftest import run_agent
+
+
+class UnusedModel(BaseLlm):
+    """Fails the test if the planner's model is called."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        raise AssertionError("the planner model should not be called")
+        yield
+
+
+class RoundRobinPlanModel(BaseLlm):
+    """Answers with a fixed plan and records the instructions it was given."""
+
+    instructions: list = []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.instructions.append(llm_request.config.system_instruction)
+        plan = [
+            {"filename": "a.txt", "status": "pending", "assigned_agent": "DocumentAnalyzer1"},
+            {"filename": "b.txt", "status": "pending", "assigned_agent": "DocumentAnalyzer2"},
+        ]
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=json.dumps(plan))]))
+
+
+def test_model_plans_without_priority_scheduling(workspace, monkeypatch):
+    monkeypatch.setattr(plan_and_assign_tasks_agent, "PRIORITY_SCHEDULING", False)
+    planner = create_plan_and_assign_tasks_agent(num_agents=2)
+    model = RoundRobinPlanModel(model="planner", instructions=[])
+    planner.model = model
+    todo_list = [{"filename": "a.txt", "status": "pending"}, {"filename": "b.txt", "status": "pending", "priority": "critical"}]
+
+    state = asyncio.run(run_agent(planner, {"todo_list_result": todo_list}))
+
+    assert len(model.instructions) == 1
+    assert "DocumentAnalyzer1, DocumentAnalyzer2" in model.instructions[0]
+    assert "b.txt" in model.instructions[0]
+    # The model's plan is kept as is, without reordering by priority
+    assert [task["filename"] for task in json.loads(state["todo_list_result"])] == ["a.txt", "b.txt"]
+
+
+def test_priority_scheduling_plans_without_the_model(workspace, monkeypatch):
+    monkeypatch.setattr(plan_and_assign_tasks_agent, "PRIORITY_SCHEDULING", True)
+    planner = create_plan_and_assign_tasks_agent(num_agents=2)
+    planner.model = UnusedModel(model="unused")
+    todo_list = [
+        {"filename": "routine.txt", "status": "pending"},
+        {"filename": "urgent.txt", "status": "pending", "priority": "critical"},
+        {"filename": "later.txt", "status": "pending", "priority": "high", "deadline": 2000000000},
+        {"filename": "sooner.txt", "status": "pending", "priority": "high", "deadline": 1900000000},
+    ]
+
+    state = asyncio.run(run_agent(planner, {"todo_list_result": todo_list}))
+
+    scheduled = json.loads(state["todo_list_result"])
+    assert [task["filename"] for task in scheduled] == ["urgent.txt", "sooner.txt", "later.txt", "routine.txt"]
+    assert [task["assigned_agent"] for task in scheduled] == [
+        "DocumentAnalyzer1", "DocumentAnalyzer2", "DocumentAnalyzer1", "DocumentAnalyzer2",
+    ]
@@ -0,0 +1,52 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncGenerator
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from ..agents.document_analysis_agent import (
+    create_document_analysis_agent,
+    create_speculative_replica,
+    settle_speculative_race,
+)
+from ..agents.speculative_parallel_agent import SpeculativeParallelAgent
+from ..tools.chunking import CHUNK_SIZE
+from ..tools.result_store import RESULT_RUN_ID_KEY, load_analysis
+from .conftest import EchoAnalysisModel, run_agent, write_document
+
+
+class StalledModel(BaseLlm):
+    """Never answers, so the analyzer using it becomes a straggler."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(3600)
+        yield LlmResponse()
+
+
+def _echo_replica(agent):
+    replica = create_speculative_replica(agent)
+    replica.sub_agents[1].model = EchoAnalysisModel(model="echo")
+    return replica
+
+
+def test_winning_replica_analysis_is_promoted(workspace):
+    write_document(Path(workspace.data_dir), "long.txt", int(CHUNK_SIZE * 2.5))
+    straggler = create_document_analysis_agent(1)
+    straggler.sub_agents[1].model = StalledModel(model="stalled")
+    # Has nothing assigned, so it finishes at once and leaves capacity for a replica
+    idle = create_document_analysis_agent(2)
+    pool = SpeculativeParallelAgent(
+        name="AnalyzerPool",
+        sub_agents=[straggler, idle],
+        replica_factory=_echo_replica,
+        race_settler=settle_speculative_race,
+        deadline_seconds=0,
+    )
+    todo_list = [{"filename": "long.txt", "status": "pending", "assigned_agent": "DocumentAnalyzer1"}]
+
+    state = asyncio.run(run_agent(pool, {"todo_list_result": todo_list}))
+
+    assert load_analysis(state[RESULT_RUN_ID_KEY], "long.txt") == "[chunk 1/3] [chunk 2/3] [chunk 3/3]"
+    assert state["todo_list_result"][0]["status"] == "completed"
+    assert not state.get("document_analysis_DocumentAnalyzer1_speculative")
+    assert not state.get("DocumentAnalyzer1_speculative_staged_analyses")
@@ -0,0 +1,105 @@
+import asyncio
+import re
+from pathlib import Path
+from typing import AsyncGenerator
+from google.adk.agents import ParallelAgent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from ..agents import synthesis_agent
+from ..agents.document_analysis_agent import create_document_analysis_agent
+from ..agents.synthesis_agent import StreamingSynthesis, create_merger_agent
+from ..tools.chunking import CHUNK_SIZE
+from .conftest import EchoAnalysisModel, run_agent, write_document
+
+
+class MergingModel(BaseLlm):
+    """Returns the current report with one line added for the new analysis."""
+
+    calls: list = []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        prompt = llm_request.contents[-1].parts[0].text
+        report = re.search(r"CURRENT REPORT:\n(.*?)\n\nNEW ANALYSIS", prompt, re.S).group(1)
+        source = re.search(r"NEW ANALYSIS \((.*?)\):", prompt).group(1)
+        self.calls.append(f"fold {source.split()[0]}")
+        # Give the other analyzer a chance to fold concurrently
+        await asyncio.sleep(0.05)
+        lines = [] if report.startswith("(empty") else [report]
+        text = "\n".join(lines + [f"- merged {source}"])
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+class LoggingAnalysisModel(EchoAnalysisModel):
+    """Echo analysis that logs which document each chunk belongs to."""
+
+    calls: list = []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        document = re.search(r"'current_document': '([^']+)'", llm_request.config.system_instruction).group(1)
+        self.calls.append(f"chunk {document}")
+        async for response in super().generate_content_async(llm_request, stream):
+            yield response
+
+
+class InstructionEchoModel(BaseLlm):
+    """Answers with its system instruction."""
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=llm_request.config.system_instruction)]))
+
+
+def test_parallel_analyses_fold_into_one_report(workspace, monkeypatch):
+    monkeypatch.setattr(synthesis_agent, "STREAMING_SYNTHESIS", True)
+    monkeypatch.setattr(StreamingSynthesis, "model", MergingModel(model="merging"))
+    analyzers = []
+    todo_list = []
+    for number in (1, 2):
+        write_document(Path(workspace.data_dir), f"doc{number}.txt", CHUNK_SIZE // 2, seed=number)
+        analyzer = create_document_analysis_agent(number)
+        analyzer.sub_agents[1].model = EchoAnalysisModel(model="echo")
+        analyzers.append(analyzer)
+        todo_list.append({"filename": f"doc{number}.txt", "status": "pending", "assigned_agent": f"DocumentAnalyzer{number}"})
+    pool = ParallelAgent(name="ParallelDocumentAnalyzerAgent", sub_agents=analyzers)
+
+    state = asyncio.run(run_agent(pool, {"todo_list_result": todo_list}))
+
+    # Neither fold overwrote the other's
+    merged = sorted(state["partial_report_synthesis"].splitlines())
+    assert merged == ["- merged doc1.txt from DocumentAnalyzer1", "- merged doc2.txt from DocumentAnalyzer2"]
+    assert state["partial_report_version"] == 2
+    assert state["partial_report"].startswith("# Partial Synthesis Report (version 2)")
+
+
+def test_synthesis_reads_every_analyzer_of_the_pool(workspace):
+    merger = create_merger_agent(num_agents=8)
+    merger.model = InstructionEchoModel(model="echo")
+
+    state = asyncio.run(run_agent(merger, {"document_analysis_8": "Findings of the eighth analyzer."}))
+
+    assert "Analysis from DocumentAnalyzer8 ---\nFindings of the eighth analyzer." in state["synthesized_report"]
+
+
+def test_each_document_is_folded_when_its_last_chunk_is_analyzed(workspace, monkeypatch):
+    monkeypatch.setattr(synthesis_agent, "STREAMING_SYNTHESIS", True)
+    merging, analysis = MergingModel(model="merging"), LoggingAnalysisModel(model="echo")
+    # One log shared by both models (assigned, since validation would copy it)
+    calls = merging.calls = analysis.calls = []
+    monkeypatch.setattr(StreamingSynthesis, "model", merging)
+    analyzer = create_document_analysis_agent(1)
+    analyzer.sub_agents[1].model = analysis
+    todo_list = []
+    for number in (1, 2):
+        write_document(Path(workspace.data_dir), f"doc{number}.txt", int(CHUNK_SIZE * 1.5), seed=number)
+        todo_list.append({"filename": f"doc{number}.txt", "status": "pending", "assigned_agent": "DocumentAnalyzer1"})
+
+    state = asyncio.run(run_agent(analyzer, {"todo_list_result": todo_list}))
+
+    # The first document is in the report before the analyzer starts on the second
+    assert calls == ["chunk doc1.txt", "chunk doc1.txt", "fold doc1.txt", "chunk doc2.txt", "chunk doc2.txt", "fold doc2.txt"]
+    assert state["partial_report_version"] == 2
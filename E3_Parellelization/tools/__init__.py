@@ -3,7 +3,40 @@
 from .calculator import calculator, calculator_tool
 from .read_data import read_data, read_data_tool
 from .list_example_files import list_example_files, list_example_files_tool
-from .chunking import get_next_chunk, get_next_chunk_tool
+from .chunking import (
+    get_next_chunk,
+    get_next_chunk_tool,
+    get_next_chunk_async,
+    get_next_chunk_async_tool,
+    get_chunker_memory_report,
+    get_chunker_memory_report_tool,
+    forget_previous_runs_callback,
+)
+from .dedup import get_dedup_report, get_dedup_report_tool, reset_dedup_index
+from .corpus_index import search_corpus, search_corpus_tool, index_passage, flush_corpus_index
+from .checkpoint import (
+    capture_session_state,
+    save_checkpoint,
+    checkpoint_callback,
+    restore_checkpoint_callback,
+    clear_checkpoint_callback,
+)
+from .async_file_tools import (
+    read_data_async,
+    read_data_async_tool,
+    list_example_files_async,
+    list_example_files_async_tool,
+    get_processing_status_async,
+    get_processing_status_async_tool,
+    update_processing_status_async,
+    update_processing_status_async_tool,
+    assign_file_for_work_async,
+    assign_file_for_work_async_tool,
+    complete_assignment_async,
+    complete_assignment_async_tool,
+    get_event_loop_lag_report,
+)
+from .live_metrics import start_metrics_server, render_metrics, register_collector
 from .processing_tracker import (
     get_processing_status,
     get_processing_status_tool,
@@ -36,5 +69,38 @@ __all__ = [
     "get_work_assignments_tool",
     "complete_assignment",
     "complete_assignment_tool",
-    "get_next_chunk_tool"
+    "read_data_async",
+    "read_data_async_tool",
+    "list_example_files_async",
+    "list_example_files_async_tool",
+    "get_processing_status_async",
+    "get_processing_status_async_tool",
+    "update_processing_status_async",
+    "update_processing_status_async_tool",
+    "assign_file_for_work_async",
+    "assign_file_for_work_async_tool",
+    "complete_assignment_async",
+    "complete_assignment_async_tool",
+    "get_event_loop_lag_report",
+    "get_next_chunk_tool",
+    "get_next_chunk_async",
+    "get_next_chunk_async_tool",
+    "get_chunker_memory_report",
+    "get_chunker_memory_report_tool",
+    "forget_previous_runs_callback",
+    "get_dedup_report",
+    "get_dedup_report_tool",
+    "reset_dedup_index",
+    "search_corpus",
+    "search_corpus_tool",
+    "index_passage",
+    "flush_corpus_index",
+    "capture_session_state",
+    "save_checkpoint",
+    "checkpoint_callback",
+    "restore_checkpoint_callback",
+    "clear_checkpoint_callback",
+    "start_metrics_server",
+    "render_metrics",
+    "register_collector",
 ]
@@ -0,0 +1,217 @@
+"""Async, non-blocking variants of the file-based tools.
+
+ADK runs tools inside its asyncio event loop, so a slow synchronous disk read
+in one analyzer's tool call stalls every other agent's model call. These
+variants run the synchronous tools on a bounded thread pool (FILE_TOOL_THREADS)
+and share the parsed-file cache in file_cache with them.
+
+While async tools are in use, a monitor task samples event-loop lag (how late
+a short sleep wakes up); get_event_loop_lag_report summarizes it.
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from google.adk.tools import FunctionTool
+from .read_data import read_data
+from .list_example_files import list_example_files
+from .processing_tracker import get_processing_status, update_processing_status
+from .work_assignment import assign_file_for_work, complete_assignment
+from .file_cache import get_file_cache_stats
+from .live_metrics import observe_tool_call
+from .workspace import bind_workspace
+
+FILE_TOOL_THREADS = int(os.getenv("FILE_TOOL_THREADS", "4"))
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.1"))
+# Lag above this is reported as a stall
+EVENT_LOOP_STALL_SECONDS = float(os.getenv("EVENT_LOOP_STALL_SECONDS", "0.1"))
+
+LAG_WINDOW = 1000
+
+
+class FileToolPool:
+    """Thread pool and call statistics for offloaded file tools."""
+    executor = None
+    # tool name -> {"calls": int, "seconds": float}
+    call_stats = {}
+
+
+class EventLoopLag:
+    """Event-loop lag samples collected by the monitor task."""
+    samples = deque(maxlen=LAG_WINDOW)
+    max_lag = 0.0
+    stalls = 0
+    # invocation_id -> largest lag while the run is in progress (see track_run_lag)
+    run_max_lag = {}
+    # event loop -> monitor task
+    monitors = weakref.WeakKeyDictionary()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    if FileToolPool.executor is None:
+        FileToolPool.executor = ThreadPoolExecutor(max_workers=FILE_TOOL_THREADS, thread_name_prefix="file-tool")
+    return FileToolPool.executor
+
+
+async def _monitor_event_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        EventLoopLag.samples.append(lag)
+        EventLoopLag.max_lag = max(EventLoopLag.max_lag, lag)
+        for invocation_id, run_max in list(EventLoopLag.run_max_lag.items()):
+            if lag > run_max:
+                EventLoopLag.run_max_lag[invocation_id] = lag
+        if lag >= EVENT_LOOP_STALL_SECONDS:
+            EventLoopLag.stalls += 1
+
+
+def start_event_loop_lag_monitor():
+    """Start sampling lag on the running event loop (once per loop)."""
+    loop = asyncio.get_running_loop()
+    task = EventLoopLag.monitors.get(loop)
+    if task is None or task.done():
+        EventLoopLag.monitors[loop] = loop.create_task(_monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL_SECONDS))
+
+
+def track_run_lag(invocation_id: str):
+    """Keep the largest event-loop lag seen from now until pop_run_lag(invocation_id)."""
+    EventLoopLag.run_max_lag[invocation_id] = 0.0
+
+
+def pop_run_lag(invocation_id: str) -> float:
+    """Largest event-loop lag in seconds since track_run_lag(invocation_id), and stop tracking it."""
+    return EventLoopLag.run_max_lag.pop(invocation_id, 0.0)
+
+
+async def run_file_tool(func, *args):
+    """Run a synchronous file tool on the file-tool thread pool."""
+    start_event_loop_lag_monitor()
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    try:
+        return await loop.run_in_executor(_get_executor(), bind_workspace(func), *args)
+    finally:
+        seconds = time.monotonic() - started
+        stats = FileToolPool.call_stats.setdefault(func.__name__, {"calls": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        observe_tool_call(func.__name__, seconds)
+
+
+async def read_data_async(filename: str = None) -> str:
+    """Read example data files from the example_data directory.
+
+    Compressed files (.gz, .bz2, .xz) are decompressed transparently, and
+    members of tar/zip archives can be read as 'archive.tar.gz::member.txt'.
+
+    Args:
+        filename: Optional specific filename to read. If None, lists all files in the directory.
+
+    Returns:
+        Content of the requested file or list of available files
+    """
+    return await run_file_tool(read_data, filename)
+
+
+async def list_example_files_async() -> str:
+    """List all files in the example_data directory with metadata.
+
+    Members of tar/zip archives are listed as virtual documents named
+    'archive.tar.gz::member.txt'; compressed files are marked as such.
+
+    Returns:
+        Formatted string with list of files and their metadata (size, modification time)
+    """
+    return await run_file_tool(list_example_files)
+
+
+async def get_processing_status_async(filename: str = None) -> str:
+    """Check if a file has been processed by looking at a tracking JSON file.
+
+    Args:
+        filename: Optional specific filename to check status. If None, returns all tracked files.
+
+    Returns:
+        Processing status information in a formatted string
+    """
+    return await run_file_tool(get_processing_status, filename)
+
+
+async def update_processing_status_async(filename: str, status: str) -> str:
+    """Update the processing status of a file in the tracking JSON.
+
+    Args:
+        filename: Name of the file to update
+        status: Processing status (e.g., 'pending', 'processing', 'completed', 'failed')
+
+    Returns:
+        Confirmation message
+    """
+    return await run_file_tool(update_processing_status, filename, status)
+
+
+async def assign_file_for_work_async(filename: str, assigned_to: str, priority: str = "normal", deadline: str = None) -> str:
+    """Assign a file for work to a specific agent or worker.
+
+    Args:
+        filename: Name of the file to assign
+        assigned_to: Name/identifier of the agent or worker assigned to process the file
+        priority: Priority level (low, normal, high, critical) - default is normal
+        deadline: Optional time the file must be processed by (ISO 8601, e.g. 2025-01-31T17:00)
+
+    Returns:
+        Confirmation message with assignment details
+    """
+    return await run_file_tool(assign_file_for_work, filename, assigned_to, priority, deadline)
+
+
+async def complete_assignment_async(filename: str) -> str:
+    """Mark a file assignment as completed.
+
+    Args:
+        filename: Name of the file whose assignment is being completed
+
+    Returns:
+        Confirmation message
+    """
+    return await run_file_tool(complete_assignment, filename)
+
+
+def get_event_loop_lag_report() -> str:
+    """Report event-loop lag observed while async tools were running, and file cache efficiency.
+
+    Returns:
+        Formatted event-loop lag and file tool summary
+    """
+    samples = sorted(EventLoopLag.samples)
+    cache = get_file_cache_stats()
+    lines = ["Event Loop Lag Report:"]
+    if samples:
+        p50 = samples[len(samples) // 2]
+        p99 = samples[min(len(samples) - 1, int(0.99 * len(samples)))]
+        lines.append(f"  - Samples: {len(samples)} (every {EVENT_LOOP_LAG_INTERVAL_SECONDS * 1000:.0f} ms)")
+        lines.append(f"  - Lag p50: {p50 * 1000:.1f} ms, p99: {p99 * 1000:.1f} ms, max: {EventLoopLag.max_lag * 1000:.1f} ms")
+        lines.append(f"  - Stalls >= {EVENT_LOOP_STALL_SECONDS * 1000:.0f} ms: {EventLoopLag.stalls}")
+    else:
+        lines.append("  - No samples yet")
+    for name, stats in sorted(FileToolPool.call_stats.items()):
+        lines.append(f"  - {name}: {stats['calls']} call(s), avg {stats['seconds'] / stats['calls'] * 1000:.1f} ms")
+    lines.append(
+        f"  - File cache: {cache['hits']} hit(s), {cache['misses']} miss(es), "
+        f"{cache['entries']} entr(ies), {cache['bytes'] / 1024:.1f} KB"
+    )
+    return "\n".join(lines)
+
+
+read_data_async_tool = FunctionTool(func=read_data_async)
+list_example_files_async_tool = FunctionTool(func=list_example_files_async)
+get_processing_status_async_tool = FunctionTool(func=get_processing_status_async)
+update_processing_status_async_tool = FunctionTool(func=update_processing_status_async)
+assign_file_for_work_async_tool = FunctionTool(func=assign_file_for_work_async)
+complete_assignment_async_tool = FunctionTool(func=complete_assignment_async)
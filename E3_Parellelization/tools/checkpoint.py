@@ -0,0 +1,234 @@
+"""Periodic checkpoints of pipeline progress, and resume after a crash or restart.
+
+A checkpoint captures:
+- the chunk cursor of every agent (document, next chunk to analyze, document queue)
+- the seek index, so resumed documents skip straight to their chunk
+- session state needed to continue (todo list, partial document_analysis_N, ...)
+- the processing tracker and work assignment files
+
+Checkpointing is opt-in (CHECKPOINT_ENABLED=1): a forced save after every
+completed document serializes the cursors, seek index and trackers, which
+costs more than small runs gain from it. It is written atomically to
+checkpoints/pipeline_checkpoint.json at most once per
+CHECKPOINT_INTERVAL_SECONDS (and immediately when a document completes), so a
+crash loses at most one interval of work. With RESUME_FROM_CHECKPOINT=1 the
+pipeline restores state instead of rebuilding the todo list, and each agent
+continues from the last chunk it was given; a resumed run keeps checkpointing
+unless CHECKPOINT_ENABLED=0.
+
+Jobs of the job service are not checkpointed: the checkpoint holds one run's
+progress, and a failed job is resubmitted instead.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from .document_source import DocumentSeekIndex
+from .workspace import get_project_dir, get_workspace
+
+RESUME_FROM_CHECKPOINT = os.getenv("RESUME_FROM_CHECKPOINT", "0") == "1"
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "1" if RESUME_FROM_CHECKPOINT else "0") == "1"
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "30"))
+
+# Session state keys (exact or prefix) that are saved in the checkpoint
+CHECKPOINT_STATE_PREFIXES = ("todo_list_result", "document_analysis_", "partial_report", "DocumentAnalyzer", "result_run_id")
+
+TRACKER_FILES = ("processing_tracker.json", "work_assignments.json")
+
+
+class PipelineCheckpoint:
+    """Latest captured progress and the checkpoint loaded for resume."""
+    session_state = {}
+    last_saved = 0.0
+    # Checkpoint loaded from disk when resuming (None until loaded)
+    resume_data = None
+    # Cursors not yet handed back to an agent: agent_id -> cursor dict
+    pending_cursors = {}
+    # Chunk loader threads may save concurrently; one writer at a time
+    save_lock = threading.Lock()
+
+
+def get_checkpoint_path() -> str:
+    """Return the path of the pipeline checkpoint file."""
+    return os.path.join(get_project_dir(), "checkpoints", "pipeline_checkpoint.json")
+
+
+def capture_session_state(state) -> None:
+    """Copy the checkpointed keys of the session state into the pending snapshot."""
+    values = state.to_dict() if hasattr(state, "to_dict") else dict(state)
+    for key, value in values.items():
+        if key.startswith(CHECKPOINT_STATE_PREFIXES):
+            PipelineCheckpoint.session_state[key] = value
+
+
+def _read_tracker_files() -> dict:
+    trackers = {}
+    for filename in TRACKER_FILES:
+        path = os.path.join(get_project_dir(), filename)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    trackers[filename] = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[Checkpoint] WARNING: Could not read {filename}: {e}")
+    return trackers
+
+
+def save_checkpoint(force: bool = False) -> bool:
+    """
+    Write a checkpoint if the interval has elapsed (or force is set).
+
+    Returns:
+        True if a checkpoint was written
+    """
+    if not CHECKPOINT_ENABLED or get_workspace() is not None:
+        return False
+    now = time.time()
+    if not force and now - PipelineCheckpoint.last_saved < CHECKPOINT_INTERVAL_SECONDS:
+        return False
+
+    # A periodic save is skipped while another thread is writing one
+    if not PipelineCheckpoint.save_lock.acquire(blocking=force):
+        return False
+    try:
+        return _write_checkpoint(now)
+    finally:
+        PipelineCheckpoint.save_lock.release()
+
+
+def _write_checkpoint(now: float) -> bool:
+    from .chunking import get_chunk_cursors
+
+    cursors = dict(PipelineCheckpoint.pending_cursors)
+    cursors.update(get_chunk_cursors())
+    checkpoint = {
+        "saved_at": now,
+        "chunk_cursors": cursors,
+        "seek_index": dict(DocumentSeekIndex.entries),
+        "session_state": dict(PipelineCheckpoint.session_state),
+        "trackers": _read_tracker_files(),
+    }
+
+    path = get_checkpoint_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[Checkpoint] WARNING: Could not write checkpoint: {e}")
+        return False
+    PipelineCheckpoint.last_saved = now
+    print(f"[Checkpoint] Saved {len(cursors)} chunk cursor(s) and {len(PipelineCheckpoint.session_state)} state key(s)")
+    return True
+
+
+def checkpoint_callback(callback_context: CallbackContext):
+    """After-agent callback: capture session progress and checkpoint if due."""
+    if get_workspace() is not None:
+        return None
+    capture_session_state(callback_context.state)
+    save_checkpoint()
+    return None
+
+
+def load_checkpoint() -> Optional[dict]:
+    """Load the checkpoint for resume (once per process); None if absent or resume is off."""
+    if not RESUME_FROM_CHECKPOINT or get_workspace() is not None:
+        return None
+    if PipelineCheckpoint.resume_data is None:
+        path = get_checkpoint_path()
+        if not os.path.exists(path):
+            PipelineCheckpoint.resume_data = {}
+        else:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    PipelineCheckpoint.resume_data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[Checkpoint] WARNING: Ignoring unreadable checkpoint: {e}")
+                PipelineCheckpoint.resume_data = {}
+            else:
+                data = PipelineCheckpoint.resume_data
+                PipelineCheckpoint.pending_cursors = dict(data.get("chunk_cursors", {}))
+                PipelineCheckpoint.session_state = dict(data.get("session_state", {}))
+                for document_id, entry in data.get("seek_index", {}).items():
+                    DocumentSeekIndex.entries.setdefault(document_id, entry)
+    return PipelineCheckpoint.resume_data or None
+
+
+def pop_resume_cursor(agent_id: str, document_id: str = None) -> Optional[dict]:
+    """
+    Take the saved chunk cursor to resume for an agent, at most once.
+
+    If the agent's own cursor is for a different document than requested, a
+    cursor saved by another agent for that document is used instead (the
+    document may have been reassigned after the restart).
+
+    Args:
+        agent_id: Agent asking for its next chunk
+        document_id: Document the agent asked for, if any
+
+    Returns:
+        Cursor dict or None
+    """
+    if load_checkpoint() is None:
+        return None
+    cursor = PipelineCheckpoint.pending_cursors.get(agent_id)
+    if cursor is not None and document_id in (None, cursor.get("current_document")):
+        return PipelineCheckpoint.pending_cursors.pop(agent_id)
+    if document_id is not None:
+        for other_id, other in list(PipelineCheckpoint.pending_cursors.items()):
+            if other.get("current_document") == document_id:
+                return PipelineCheckpoint.pending_cursors.pop(other_id)
+    return None
+
+
+def restore_checkpoint_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+    """
+    Before-agent callback for the todo list agent: restore a saved run instead of starting over.
+
+    Restores checkpointed session state and any missing tracker files, then
+    skips the agent by returning content, so the loop continues with the
+    saved todo list.
+    """
+    checkpoint = load_checkpoint()
+    if not checkpoint or not checkpoint.get("session_state", {}).get("todo_list_result"):
+        return None
+
+    for key, value in checkpoint["session_state"].items():
+        callback_context.state[key] = value
+    for filename, content in checkpoint.get("trackers", {}).items():
+        path = os.path.join(get_project_dir(), filename)
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(content, f, indent=2)
+
+    cursors = len(PipelineCheckpoint.pending_cursors)
+    age = time.time() - checkpoint.get("saved_at", time.time())
+    print(f"[Checkpoint] Resumed from checkpoint saved {age:.0f}s ago: restored {len(checkpoint['session_state'])} "
+          f"state key(s) and {cursors} chunk cursor(s).")
+    # The todo list agent's output_key stores the returned text as todo_list_result, so return the saved list
+    todo_list = checkpoint["session_state"]["todo_list_result"]
+    text = todo_list if isinstance(todo_list, str) else json.dumps(todo_list)
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+def clear_checkpoint_callback(callback_context: CallbackContext):
+    """After-agent callback for the final stage: the run finished, so drop its checkpoint."""
+    if get_workspace() is not None:
+        return None
+    path = get_checkpoint_path()
+    if os.path.exists(path):
+        os.remove(path)
+        print("[Checkpoint] Run complete, checkpoint removed")
+    PipelineCheckpoint.session_state = {}
+    PipelineCheckpoint.pending_cursors = {}
+    PipelineCheckpoint.resume_data = {}
+    return None
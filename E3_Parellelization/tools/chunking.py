@@ -1,28 +1,267 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from google.adk.tools import FunctionTool
 from .read_data import read_data, read_data_tool
+from .document_source import iter_document_text, get_seek_offset, record_seek_offsets, get_document_mtime, DocumentSeekIndex
+from .dedup import deduplicate_chunks, forget_workspace_signatures
+from .salience import select_salient_chunks, forget_workspace_budget
+from .corpus_index import index_passage
+from .checkpoint import pop_resume_cursor, save_checkpoint
+from .async_file_tools import start_event_loop_lag_monitor
+from .live_metrics import observe_tool_call
+from .workspace import bind_workspace, scoped_key, workspace_id
+
+# Chunking parameters: 2000-character segments with 5% overlap by default
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "2000"))
+OVERLAP_PERCENTAGE = float(os.getenv("CHUNK_OVERLAP_PERCENTAGE", "0.05"))
+
+# Idle agent states are evicted after this many seconds, and the least recently
+# used ones once more than CHUNKER_MAX_AGENT_STATES are held
+CHUNKER_STATE_TTL_SECONDS = float(os.getenv("CHUNKER_STATE_TTL_SECONDS", "900"))
+CHUNKER_MAX_AGENT_STATES = int(os.getenv("CHUNKER_MAX_AGENT_STATES", "64"))
+# Cursors of evicted agents are tiny, so many more of them are kept
+CHUNKER_MAX_EVICTED_CURSORS = int(os.getenv("CHUNKER_MAX_EVICTED_CURSORS", "4096"))
+# Worker threads that load and chunk documents for get_next_chunk_async
+CHUNK_LOADER_THREADS = int(os.getenv("CHUNK_LOADER_THREADS", "8"))
+# Read-ahead: the next documents of an agent's queue are loaded and chunked in the
+# background while the current chunk is being analyzed. CHUNK_PREFETCH_DOCUMENTS is
+# the window per agent, CHUNK_PREFETCH_MAX_DOCUMENTS the most held across agents.
+CHUNK_PREFETCH_ENABLED = os.getenv("CHUNK_PREFETCH_ENABLED", "1") == "1"
+CHUNK_PREFETCH_DOCUMENTS = int(os.getenv("CHUNK_PREFETCH_DOCUMENTS", "2"))
+CHUNK_PREFETCH_MAX_DOCUMENTS = int(os.getenv("CHUNK_PREFETCH_MAX_DOCUMENTS", "32"))
+CHUNK_PREFETCH_THREADS = int(os.getenv("CHUNK_PREFETCH_THREADS", "2"))
+
+
+class AgentChunkState:
+    """Chunking progress of one agent.
+    
+    The loaded document's text is held once, and chunks are references into it:
+    chunk i is text[chunk_starts[i]:chunk_starts[i] + CHUNK_SIZE]. Offsets and
+    chunk numbers are stored in compact arrays instead of per-chunk strings.
+    """
+    __slots__ = (
+        "text",
+        "chunk_starts",
+        "chunk_numbers",
+        "current_index",
+        "current_document",
+        "documents_processed",
+        "all_documents",
+        "current_document_index",
+        "total_chunks",
+        "duplicate_of",
+        "skip_reason",
+        "last_used",
+        "lock",
+        "users",
+    )
+    
+    def __init__(self):
+        self.text = ""
+        self.chunk_starts = array("L")
+        self.chunk_numbers = array("L")
+        self.current_index = 0
+        self.current_document = None
+        self.documents_processed = set()
+        self.all_documents = ()
+        self.current_document_index = 0
+        self.total_chunks = 0
+        self.duplicate_of = None
+        self.skip_reason = None
+        self.last_used = time.monotonic()
+        # Serializes calls for this agent; users counts callers holding or waiting for it
+        self.lock = threading.Lock()
+        self.users = 0
+    
+    @property
+    def chunk_count(self) -> int:
+        return len(self.chunk_starts)
+    
+    def chunk(self, index: int) -> str:
+        start = self.chunk_starts[index]
+        return self.text[start:start + CHUNK_SIZE]
+    
+    def release_document(self):
+        """Drop the loaded document's text and chunk references."""
+        self.text = ""
+        self.chunk_starts = array("L")
+        self.chunk_numbers = array("L")
+        self.current_index = 0
+        self.total_chunks = 0
+    
+    def memory_bytes(self) -> int:
+        """Approximate memory held by this state, in bytes."""
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.text)
+            + sys.getsizeof(self.chunk_starts)
+            + sys.getsizeof(self.chunk_numbers)
+            + sys.getsizeof(self.documents_processed)
+            + sys.getsizeof(self.all_documents)
+            + sum(sys.getsizeof(d) for d in self.all_documents)
+        )
 
 
 class DocumentChunker:
     """Manages document chunking state per agent to support parallel processing."""
-    # Store state per agent_id: agent_id -> {chunks, current_index, current_document, ...}
-    agent_states = {}
+    # agent_id -> AgentChunkState, least recently used first
+    agent_states = OrderedDict()
+    # Cursors of evicted agents that were mid-document: agent_id -> cursor dict
+    evicted_cursors = OrderedDict()
+    # Documents set aside for more urgent work: agent_id -> {document_id: next chunk to serve}
+    parked_cursors = {}
+    stats = {"evicted": 0, "peak_states": 0, "chunks_served": 0}
+    # Guards agent_states and evicted_cursors; never held while waiting for an agent lock
+    registry_lock = threading.Lock()
+    # Guards the run-wide dedup, salience and corpus index updates of document loading
+    shared_index_lock = threading.Lock()
+    executor = None
+
+
+class ChunkPrefetcher:
+    """Documents read and chunked ahead of the agents that will ask for them.
+    
+    Only the streamed chunks are prepared; dedup, salience and indexing still
+    run when an agent loads the document, so a read-ahead document that is
+    never asked for leaves no trace in the run.
+    """
+    # scoped document_id -> Future of (mod_time, chunks, offsets), oldest first
+    entries = OrderedDict()
+    stats = {"submitted": 0, "hits": 0, "waited": 0, "dropped": 0}
+    lock = threading.Lock()
+    executor = None
+
 
+def _get_loader_executor() -> ThreadPoolExecutor:
+    if DocumentChunker.executor is None:
+        with DocumentChunker.registry_lock:
+            if DocumentChunker.executor is None:
+                DocumentChunker.executor = ThreadPoolExecutor(
+                    max_workers=CHUNK_LOADER_THREADS, thread_name_prefix="chunk-loader"
+                )
+    return DocumentChunker.executor
 
-def _get_agent_state(agent_id: str) -> dict:
-    """Get or initialize state for a specific agent."""
-    if agent_id not in DocumentChunker.agent_states:
-        DocumentChunker.agent_states[agent_id] = {
-            "chunks": [],
-            "current_index": 0,
-            "current_document": None,
-            "documents_processed": set(),
-            "all_documents": [],
-            "current_document_index": 0
-        }
-    return DocumentChunker.agent_states[agent_id]
 
+def _get_prefetch_executor() -> ThreadPoolExecutor:
+    # Separate from the loader pool, so read-ahead never delays a document an agent is waiting for
+    with ChunkPrefetcher.lock:
+        if ChunkPrefetcher.executor is None:
+            ChunkPrefetcher.executor = ThreadPoolExecutor(
+                max_workers=CHUNK_PREFETCH_THREADS, thread_name_prefix="chunk-prefetch"
+            )
+    return ChunkPrefetcher.executor
 
-def get_next_chunk(document_id: str = None, agent_id: str = "default") -> dict:
+
+def prefetch_documents(document_ids) -> int:
+    """
+    Start loading and chunking documents in the background, ahead of the agent that will ask for them.
+    
+    At most CHUNK_PREFETCH_DOCUMENTS of the given documents are read ahead;
+    ones already read ahead are skipped. Returns immediately.
+    
+    Args:
+        document_ids: Upcoming documents of an agent's queue, in the order it will ask for them
+    
+    Returns:
+        Number of documents submitted
+    """
+    if not CHUNK_PREFETCH_ENABLED or CHUNK_PREFETCH_DOCUMENTS <= 0:
+        return 0
+    executor = _get_prefetch_executor()
+    submitted = 0
+    with ChunkPrefetcher.lock:
+        for document_id in list(document_ids)[:CHUNK_PREFETCH_DOCUMENTS]:
+            key = scoped_key(document_id)
+            if key in ChunkPrefetcher.entries:
+                continue
+            ChunkPrefetcher.entries[key] = executor.submit(bind_workspace(_read_ahead), document_id)
+            ChunkPrefetcher.stats["submitted"] += 1
+            submitted += 1
+        # Bounded read-ahead: drop the oldest documents nobody has asked for yet
+        while len(ChunkPrefetcher.entries) > CHUNK_PREFETCH_MAX_DOCUMENTS:
+            _, future = ChunkPrefetcher.entries.popitem(last=False)
+            future.cancel()
+            ChunkPrefetcher.stats["dropped"] += 1
+    return submitted
+
+
+def _read_ahead(document_id: str):
+    mod_time = get_document_mtime(document_id)
+    chunks, offsets = _load_chunks(document_id, 0)
+    return mod_time, chunks, offsets
+
+
+def _take_prefetched(document_id: str):
+    """Claim a document's read-ahead chunks, waiting if they are still loading; None if there are none."""
+    with ChunkPrefetcher.lock:
+        future = ChunkPrefetcher.entries.pop(scoped_key(document_id), None)
+    if future is None or future.cancelled():
+        return None
+    waited = not future.done()
+    try:
+        mod_time, chunks, offsets = future.result()
+        current = get_document_mtime(document_id)
+    except Exception:
+        # Read errors surface again, with their message, when the document is loaded directly
+        return None
+    with ChunkPrefetcher.lock:
+        if mod_time != current:
+            ChunkPrefetcher.stats["dropped"] += 1
+            return None
+        ChunkPrefetcher.stats["hits"] += 1
+        ChunkPrefetcher.stats["waited"] += waited
+    return chunks, offsets
+
+
+def _get_agent_state(agent_id: str) -> AgentChunkState:
+    """Get or initialize state for a specific agent, evicting idle states of other agents.
+    
+    Must be called with the registry lock held.
+    """
+    states = DocumentChunker.agent_states
+    state = states.get(agent_id)
+    if state is None:
+        state = states[agent_id] = AgentChunkState()
+    else:
+        states.move_to_end(agent_id)
+    state.last_used = time.monotonic()
+    _evict_idle_states(state.last_used, keep=agent_id)
+    DocumentChunker.stats["peak_states"] = max(DocumentChunker.stats["peak_states"], len(states))
+    return state
+
+
+def _evict_idle_states(now: float, keep: str = None):
+    """Evict states idle longer than the TTL, then the least recently used over the limit.
+    
+    The state of agent keep is being handed to a caller that has not counted
+    itself as a user yet, so it is never evicted.
+    """
+    states = DocumentChunker.agent_states
+    for agent_id, oldest in list(states.items()):
+        expired = now - oldest.last_used > CHUNKER_STATE_TTL_SECONDS
+        if not expired and len(states) <= CHUNKER_MAX_AGENT_STATES:
+            break
+        if oldest.users or agent_id == keep:
+            # In use by a running call; it will be touched again when that call finishes
+            continue
+        del states[agent_id]
+        DocumentChunker.stats["evicted"] += 1
+        # Keep the small cursor so the agent resumes where it was if it comes back
+        if oldest.current_document is not None:
+            DocumentChunker.evicted_cursors[agent_id] = _cursor_of(oldest, reserve_last=False)
+            while len(DocumentChunker.evicted_cursors) > CHUNKER_MAX_EVICTED_CURSORS:
+                DocumentChunker.evicted_cursors.popitem(last=False)
+        print(f"[Chunking] Evicted {'idle' if expired else 'least recently used'} state of '{agent_id}'")
+
+
+def get_next_chunk(document_id: str = None, agent_id: str = "default", start_chunk: int = 0) -> dict:
     """
     Retrieves the next chunk of the specified document for analysis.
     
@@ -34,95 +273,191 @@ def get_next_chunk(document_id: str = None, agent_id: str = "default") -> dict:
                     If None on first call, fetches all documents.
         agent_id: Unique identifier for the agent calling this function.
                  Each agent maintains separate chunking state.
+        start_chunk: Zero-based chunk to resume from when the document is loaded.
+                    Uses the seek index to skip the beginning of the file.
     
     Returns:
         Dictionary with chunk content and metadata, or signal when finished
     """
-    state = _get_agent_state(agent_id)
+    # Jobs of the job service run the same agents; each job has its own cursors
+    agent_id = scoped_key(agent_id)
+    with _locked_agent_state(agent_id) as state:
+        chunk_info = _next_chunk(state, document_id, agent_id, start_chunk)
+    if chunk_info.get("more_chunks_exist"):
+        save_checkpoint()
+    return chunk_info
+
+
+async def get_next_chunk_async(document_id: str = None, agent_id: str = "default", start_chunk: int = 0) -> dict:
+    """
+    Retrieves the next chunk of the specified document for analysis, without blocking other agents.
+    
+    Handles multiple documents sequentially, chunking each one.
+    When document_id is None on first call, processes all available documents.
+    
+    Args:
+        document_id: The identifier/name of the document to chunk. 
+                    If None on first call, fetches all documents.
+        agent_id: Unique identifier for the agent calling this function.
+                 Each agent maintains separate chunking state.
+        start_chunk: Zero-based chunk to resume from when the document is loaded.
+    
+    Returns:
+        Dictionary with chunk content and metadata, or signal when finished
+    """
+    # Document loading reads and decompresses files, so it runs on the loader pool
+    start_event_loop_lag_monitor()
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    try:
+        return await loop.run_in_executor(
+            _get_loader_executor(), bind_workspace(get_next_chunk), document_id, agent_id, start_chunk
+        )
+    finally:
+        observe_tool_call("get_next_chunk", time.monotonic() - started)
+
+
+@contextmanager
+def _locked_agent_state(agent_id: str):
+    """Hold an agent's state exclusively; calls for other agents proceed in parallel."""
+    with DocumentChunker.registry_lock:
+        state = _get_agent_state(agent_id)
+        state.users += 1
+    try:
+        with state.lock:
+            yield state
+    finally:
+        with DocumentChunker.registry_lock:
+            state.users -= 1
+            state.last_used = time.monotonic()
+
+
+def park_document(agent_id: str = "default") -> dict:
+    """
+    Set aside the document an agent is in the middle of, so it can serve a more urgent one first.
+    
+    The next request for the parked document continues at the chunk after the
+    last one handed out.
+    
+    Args:
+        agent_id: Agent whose current document is parked
+    
+    Returns:
+        Dictionary with the parked document and the chunk it resumes at, or an empty dict
+    """
+    agent_id = scoped_key(agent_id)
+    with _locked_agent_state(agent_id) as state:
+        if state.current_document is None or state.current_index >= state.chunk_count:
+            return {}
+        cursor = _cursor_of(state, reserve_last=False)
+        document_id = state.current_document
+        state.release_document()
+        state.current_document = None
+    with DocumentChunker.registry_lock:
+        DocumentChunker.parked_cursors.setdefault(agent_id, {})[document_id] = cursor["resume_chunk"]
+    print(f"[Chunking][{agent_id}] Parked '{document_id}' at chunk {cursor['resume_chunk'] + 1}")
+    return {"parked_document": document_id, "resume_chunk": cursor["resume_chunk"]}
+
+
+def _pop_parked_chunk(agent_id: str, document_id: str):
+    """Zero-based chunk a parked document resumes at, or None if it is not parked."""
+    with DocumentChunker.registry_lock:
+        parked = DocumentChunker.parked_cursors.get(agent_id)
+        if not parked or document_id not in parked:
+            return None
+        resume_chunk = parked.pop(document_id)
+        if not parked:
+            del DocumentChunker.parked_cursors[agent_id]
+    return resume_chunk
+
+
+def _next_chunk(state: AgentChunkState, document_id: str, agent_id: str, start_chunk: int) -> dict:
+    """Advance an agent's cursor and return the next chunk; the caller holds the agent's lock."""
+    # A document parked for more urgent work continues where it stopped
+    if document_id is not None and not start_chunk:
+        start_chunk = _pop_parked_chunk(agent_id, document_id) or 0
+    
+    # 0. After a restart or eviction, continue from the saved cursor instead of chunk 1
+    if state.current_document is None and not start_chunk:
+        _restore_cursor(state, agent_id, document_id)
     
     # 1. Handle requests for a specific document that differs from the current one
-    if document_id is not None and state["current_document"] != document_id:
+    if document_id is not None and state.current_document != document_id:
         # Switch to the requested document by resetting and reinitializing
-        state["chunks"] = []
-        state["current_index"] = 0
-        state["current_document"] = None
-        state["documents_processed"] = set()
-        state["all_documents"] = [document_id]
-        state["current_document_index"] = 0
-        _initialize_document(document_id, agent_id)
+        state.release_document()
+        state.current_document = None
+        state.documents_processed = set()
+        state.all_documents = (document_id,)
+        state.current_document_index = 0
+        _initialize_document(state, document_id, agent_id, start_chunk)
         
         # Return first chunk of the newly initialized document
-        if state["chunks"]:
-            chunk = state["chunks"][0]
-            chunk_info = {
-                "chunk_content": chunk,
-                "chunk_number": 1,
-                "total_chunks": len(state["chunks"]),
-                "current_document": state["current_document"],
-                "more_chunks_exist": True
-            }
-            state["current_index"] = 1
+        if state.chunk_count:
+            chunk_info = _build_chunk_info(state, 0)
+            state.current_index = 1
             return chunk_info
+        elif state.current_document is not None:
+            # Every chunk was filtered out before analysis (duplicates or budget)
+            return {
+                "more_chunks_exist": False,
+                "current_document": document_id,
+                "reason": state.skip_reason,
+                "duplicate_of": state.duplicate_of
+            }
         else:
             return {"more_chunks_exist": False, "error": f"Could not initialize document '{document_id}'"}
     
     # 2. Initialization on first call (when no document is currently loaded)
-    if not state["chunks"] and state["current_document"] is None:
+    if not state.chunk_count and state.current_document is None:
         if document_id is None:
             # Get all documents from example_data
             try:
                 all_docs_str = read_data()  # Call with no args to list files
                 # Parse the file list
                 lines = all_docs_str.split('\n')[1:]  # Skip header
-                state["all_documents"] = [line.strip() for line in lines if line.strip()]
+                state.all_documents = tuple(line.strip() for line in lines if line.strip())
             except Exception as e:
                 print(f"[{agent_id}] Error fetching document list: {e}")
                 return {"more_chunks_exist": False, "error": str(e)}
         else:
-            state["all_documents"] = [document_id]
+            state.all_documents = (document_id,)
         
-        state["current_document_index"] = 0
+        state.current_document_index = 0
         
         # Initialize first document if we have any
-        if state["all_documents"]:
-            _initialize_document(state["all_documents"][0], agent_id)
+        if state.all_documents:
+            _initialize_document(state, state.all_documents[0], agent_id, start_chunk)
+            prefetch_documents(state.all_documents[1:])
         else:
             return {"more_chunks_exist": False, "reason": "No documents found"}
     
     # 3. Check if current document has more chunks
-    if state["current_index"] < len(state["chunks"]):
-        chunk = state["chunks"][state["current_index"]]
-        chunk_info = {
-            "chunk_content": chunk,
-            "chunk_number": state["current_index"] + 1,
-            "total_chunks": len(state["chunks"]),
-            "current_document": state["current_document"],
-            "more_chunks_exist": True
-        }
-        state["current_index"] += 1
+    if state.current_index < state.chunk_count:
+        chunk_info = _build_chunk_info(state, state.current_index)
+        state.current_index += 1
         return chunk_info
     
     # 4. Current document is done, move to next document
     else:
-        state["documents_processed"].add(state["current_document"])
-        state["current_document_index"] += 1
+        state.documents_processed.add(state.current_document)
+        state.current_document_index += 1
+        
+        # Skip documents that yield no chunks (unreadable or entirely duplicate)
+        while state.current_document_index < len(state.all_documents):
+            next_doc = state.all_documents[state.current_document_index]
+            _initialize_document(state, next_doc, agent_id)
+            if state.chunk_count:
+                break
+            state.documents_processed.add(next_doc)
+            state.current_document_index += 1
         
         # Check if there are more documents to process
-        if state["current_document_index"] < len(state["all_documents"]):
-            next_doc = state["all_documents"][state["current_document_index"]]
-            _initialize_document(next_doc, agent_id)
-            
+        if state.current_document_index < len(state.all_documents):
+            prefetch_documents(state.all_documents[state.current_document_index + 1:])
             # Return first chunk of next document
-            chunk = state["chunks"][0]
-            chunk_info = {
-                "chunk_content": chunk,
-                "chunk_number": 1,
-                "total_chunks": len(state["chunks"]),
-                "current_document": state["current_document"],
-                "document_changed": True,
-                "more_chunks_exist": True
-            }
-            state["current_index"] = 1
+            chunk_info = _build_chunk_info(state, 0)
+            chunk_info["document_changed"] = True
+            state.current_index = 1
             return chunk_info
         else:
             # All documents processed
@@ -130,46 +465,277 @@ def get_next_chunk(document_id: str = None, agent_id: str = "default") -> dict:
             return {
                 "more_chunks_exist": False,
                 "reason": "All documents processed",
-                "documents_processed": list(state["documents_processed"])
+                "documents_processed": list(state.documents_processed)
             }
 
 
-def _initialize_document(document_id: str, agent_id: str):
-    """Initialize chunking for a new document with overlapping chunks."""
-    state = _get_agent_state(agent_id)
+def _cursor_of(state: AgentChunkState, reserve_last: bool = True) -> dict:
+    """Cursor of an agent's state.
+    
+    With reserve_last it points at the last chunk handed out, which is re-served
+    on resume after a crash; otherwise at the next chunk not yet handed out.
+    """
+    # Checkpoints read states without their locks; release_document may have just
+    # replaced the chunk arrays, so the position is clamped to the numbers read here
+    chunk_numbers = state.chunk_numbers
+    served = min(state.current_index, len(chunk_numbers))
+    if not reserve_last:
+        if served < len(chunk_numbers):
+            resume_chunk = chunk_numbers[served] - 1
+        else:
+            resume_chunk = state.total_chunks
+    elif served > 0:
+        resume_chunk = chunk_numbers[served - 1] - 1
+    elif chunk_numbers:
+        resume_chunk = chunk_numbers[0] - 1
+    else:
+        resume_chunk = state.total_chunks
+    return {
+        "current_document": state.current_document,
+        "resume_chunk": resume_chunk,
+        "all_documents": list(state.all_documents),
+        "current_document_index": state.current_document_index,
+        "documents_processed": sorted(d for d in state.documents_processed if d),
+    }
+
+
+def get_chunk_cursors() -> dict:
+    """
+    Snapshot every agent's chunk cursor for checkpointing.
+    
+    The cursor points at the last chunk handed out (not the one after it), since
+    that chunk may not have been analyzed yet; resuming re-serves it. Cursors of
+    evicted agents are included. Agent locks are not taken, since a checkpoint
+    saved from the event loop must not wait for a document being loaded.
+    
+    Returns:
+        Dict of agent_id -> cursor (current_document, resume_chunk, document queue)
+    """
+    with DocumentChunker.registry_lock:
+        cursors = dict(DocumentChunker.evicted_cursors)
+        states = list(DocumentChunker.agent_states.items())
+    for agent_id, state in states:
+        if state.current_document is not None:
+            cursors[agent_id] = _cursor_of(state)
+    return cursors
+
+
+def _restore_cursor(state: AgentChunkState, agent_id: str, document_id: str = None):
+    """Load the document an agent was working on before a restart or eviction, positioned at its saved chunk."""
+    with DocumentChunker.registry_lock:
+        cursor = DocumentChunker.evicted_cursors.pop(agent_id, None)
+    if cursor is not None and document_id not in (None, cursor["current_document"]):
+        cursor = None
+    source = "eviction"
+    if cursor is None:
+        cursor = pop_resume_cursor(agent_id, document_id)
+        source = "checkpoint"
+    if cursor is None:
+        return
+    resumed_document = cursor["current_document"]
+    state.all_documents = tuple(cursor.get("all_documents") or [resumed_document])
+    state.current_document_index = cursor.get("current_document_index", 0)
+    state.documents_processed = set(cursor.get("documents_processed", []))
+    print(f"[Chunking][{agent_id}] Resuming '{resumed_document}' at chunk {cursor['resume_chunk'] + 1} after {source}")
+    _initialize_document(state, resumed_document, agent_id, cursor["resume_chunk"])
+
+
+def _build_chunk_info(state: AgentChunkState, index: int) -> dict:
+    """Build the chunk_info payload for the chunk at position index of the loaded document."""
+    with DocumentChunker.registry_lock:
+        DocumentChunker.stats["chunks_served"] += 1
+    return {
+        "chunk_content": state.chunk(index),
+        "chunk_number": state.chunk_numbers[index],
+        "total_chunks": state.total_chunks,
+        "chunks_to_analyze": state.chunk_count,
+        # The document's analysis is final once this chunk has been analyzed
+        "last_chunk": index == state.chunk_count - 1,
+        "current_document": state.current_document,
+        "more_chunks_exist": True
+    }
+
+
+def _stream_chunks(document_id: str, chunk_size: int, step_size: int, start_chunk: int = 0):
+    """
+    Stream overlapping chunks of a document without materializing the full text.
+    
+    Starts at the seek-index offset of start_chunk when one is recorded,
+    otherwise decodes from the beginning and skips the leading chunks.
+    
+    Yields:
+        (chunk_text, byte_offset) tuples, where byte_offset is the chunk's start
+        in the decompressed stream
+    """
+    start_byte = get_seek_offset(document_id, start_chunk) if start_chunk else 0
+    skip = 0
+    if start_byte is None:
+        start_byte, skip = 0, start_chunk
+    
+    buffer, pos = "", 0
+    buffer_byte = start_byte
+    for block in iter_document_text(document_id, start_byte):
+        buffer = buffer[pos:] + block
+        pos = 0
+        # Emit every chunk that is followed by more text; the last one waits for EOF
+        while len(buffer) - pos > chunk_size:
+            if skip:
+                skip -= 1
+            else:
+                yield buffer[pos:pos + chunk_size], buffer_byte
+            buffer_byte += len(buffer[pos:pos + step_size].encode("utf-8"))
+            pos += step_size
+    
+    tail = buffer[pos:]
+    if tail and not skip:
+        yield tail, buffer_byte
+
+
+def _load_chunks(document_id: str, start_chunk: int):
+    """Stream a document into its list of overlapping chunks and their byte offsets."""
+    step_size = CHUNK_SIZE - int(CHUNK_SIZE * OVERLAP_PERCENTAGE)
+    chunks = []
+    offsets = []
+    for chunk, byte_offset in _stream_chunks(document_id, CHUNK_SIZE, step_size, start_chunk):
+        chunks.append(chunk)
+        offsets.append(byte_offset)
+    return chunks, offsets
+
+
+def _initialize_document(state: AgentChunkState, document_id: str, agent_id: str, start_chunk: int = 0):
+    """Initialize chunking for a new document with overlapping chunks.
+    
+    The document is stream-decompressed into the chunker, and the byte offset of
+    every chunk is recorded in the seek index so later reads can resume mid-file.
+    Exact and near-duplicate chunks are dropped before they reach the analyzer,
+    and the optional salience pre-filter keeps only the chunks most relevant to
+    the analysis goal. The agent keeps the text once plus the start offset of
+    each kept chunk. A document read ahead by prefetch_documents skips the
+    streaming step.
+    """
     try:
-        full_text = read_data(document_id)
-        
-        # Chunking logic: split into 2000-character segments with 5% overlap
-        chunk_size = 2000
-        overlap_percentage = 0.05  # 5% overlap
+        chunk_size = CHUNK_SIZE
+        overlap_percentage = OVERLAP_PERCENTAGE
         overlap_size = int(chunk_size * overlap_percentage)
         step_size = chunk_size - overlap_size
         
-        chunks = []
-        for i in range(0, len(full_text), step_size):
-            chunk = full_text[i:i + chunk_size]
-            if chunk:  # Only add non-empty chunks
-                chunks.append(chunk)
-            # Stop if we've captured the rest of the document
-            if i + chunk_size >= len(full_text):
-                break
+        start_chunk = max(0, start_chunk or 0)
+        prefetched = _take_prefetched(document_id) if start_chunk == 0 else None
+        if prefetched is not None:
+            chunks, offsets = prefetched
+        else:
+            chunks, offsets = _load_chunks(document_id, start_chunk)
+        
+        # Keep already-indexed offsets for the chunks we skipped over
+        known = DocumentSeekIndex.entries.get(scoped_key(document_id), {}).get("offsets", [])
+        if start_chunk == 0 or len(known) >= start_chunk:
+            record_seek_offsets(document_id, known[:start_chunk] + offsets)
         
-        state["chunks"] = chunks
-        state["current_index"] = 0
-        state["current_document"] = document_id
-        print(f"[Chunking][{agent_id}] Initialized document '{document_id}' with {len(state['chunks'])} overlapping chunk(s)")
+        # Only one agent at a time claims chunks, so concurrent agents never both keep a duplicate
+        with DocumentChunker.shared_index_lock:
+            dedup_result = deduplicate_chunks(document_id, chunks, first_chunk_number=start_chunk + 1)
+            candidates = dedup_result["kept_indices"]
+            salient = select_salient_chunks(document_id, [chunks[i] for i in candidates])
+            kept_indices = [candidates[j] for j in salient]
+        
+        # Chunk i starts step_size * i characters into the streamed text
+        state.text = "".join(chunk[:step_size] for chunk in chunks[:-1]) + (chunks[-1] if chunks else "")
+        state.chunk_starts = array("L", (i * step_size for i in kept_indices))
+        state.chunk_numbers = array("L", (start_chunk + i + 1 for i in kept_indices))
+        state.total_chunks = start_chunk + len(chunks)
+        state.duplicate_of = dedup_result["duplicate_of"]
+        if not candidates:
+            state.skip_reason = "All chunks are duplicates of already analyzed content"
+        elif not kept_indices:
+            state.skip_reason = "LLM call budget exhausted"
+        else:
+            state.skip_reason = None
+        state.current_index = 0
+        state.current_document = document_id
+        for i, chunk_number in zip(kept_indices, state.chunk_numbers):
+            index_passage(chunks[i], "chunk", document_id, chunk_number, agent_id)
+        print(f"[Chunking][{agent_id}] Initialized document '{document_id}' with {state.chunk_count} overlapping chunk(s)")
+        if len(chunks) != len(kept_indices):
+            print(f"[Chunking][{agent_id}] Skipped {len(chunks) - len(candidates)} duplicate and "
+                  f"{len(candidates) - len(kept_indices)} low-salience chunk(s)")
+        if start_chunk:
+            print(f"[Chunking][{agent_id}] Resumed at chunk {start_chunk + 1}")
         print(f"[Chunking][{agent_id}] Chunk size: {chunk_size}, Overlap: {overlap_percentage*100}% ({overlap_size} chars), Step: {step_size}")
     except Exception as e:
         print(f"[Chunking][{agent_id}] Error reading document '{document_id}': {e}")
-        state["chunks"] = []
-        state["current_document"] = None
+        state.release_document()
+        state.current_document = None
 
 
 def _reset_state(agent_id: str):
     """Reset the chunker state for a specific agent."""
-    if agent_id in DocumentChunker.agent_states:
-        del DocumentChunker.agent_states[agent_id]
+    with DocumentChunker.registry_lock:
+        DocumentChunker.agent_states.pop(agent_id, None)
+        DocumentChunker.evicted_cursors.pop(agent_id, None)
+
+
+def release_workspace(scope: str):
+    """Free the chunker, seek index, dedup and budget state of a workspace whose job has finished."""
+    prefix = f"{scope}/"
+    with DocumentChunker.registry_lock:
+        for agent_id in [a for a in DocumentChunker.agent_states if a.startswith(prefix)]:
+            del DocumentChunker.agent_states[agent_id]
+        for agent_id in [a for a in DocumentChunker.evicted_cursors if a.startswith(prefix)]:
+            del DocumentChunker.evicted_cursors[agent_id]
+        for agent_id in [a for a in DocumentChunker.parked_cursors if a.startswith(prefix)]:
+            del DocumentChunker.parked_cursors[agent_id]
+    with ChunkPrefetcher.lock:
+        for document_key in [d for d in ChunkPrefetcher.entries if d.startswith(prefix)]:
+            ChunkPrefetcher.entries.pop(document_key).cancel()
+    for document_key in [d for d in DocumentSeekIndex.entries if d.startswith(prefix)]:
+        DocumentSeekIndex.entries.pop(document_key, None)
+    with DocumentChunker.shared_index_lock:
+        forget_workspace_signatures(scope)
+        forget_workspace_budget(scope)
+
+
+def forget_previous_runs_callback(callback_context):
+    """Before-agent callback of the pipeline: drop the dedup signatures and LLM-call budget of earlier runs in this workspace."""
+    scope = workspace_id()
+    with DocumentChunker.shared_index_lock:
+        forget_workspace_signatures(scope)
+        forget_workspace_budget(scope)
+    return None
+
+
+def get_chunker_memory_report() -> str:
+    """Report the memory held by per-agent chunking state and how much has been evicted.
+
+    Returns:
+        Formatted chunker memory summary
+    """
+    now = time.monotonic()
+    with DocumentChunker.registry_lock:
+        states = dict(DocumentChunker.agent_states)
+    total = sum(state.memory_bytes() for state in states.values())
+    lines = [
+        "Chunker Memory Report:",
+        f"  - Agent states: {len(states)} (peak {DocumentChunker.stats['peak_states']}, "
+        f"limit {CHUNKER_MAX_AGENT_STATES}, idle TTL {CHUNKER_STATE_TTL_SECONDS:.0f}s)",
+        f"  - Approximate size: {total / 1024:.1f} KB",
+        f"  - States evicted: {DocumentChunker.stats['evicted']} "
+        f"({len(DocumentChunker.evicted_cursors)} cursor(s) kept for resume)",
+    ]
+    if CHUNK_PREFETCH_ENABLED:
+        prefetch = ChunkPrefetcher.stats
+        lines.append(
+            f"  - Read-ahead: {prefetch['hits']}/{prefetch['submitted']} document(s) used "
+            f"({prefetch['waited']} still loading when asked for, {prefetch['dropped']} dropped), "
+            f"{len(ChunkPrefetcher.entries)} held (window {CHUNK_PREFETCH_DOCUMENTS}, limit {CHUNK_PREFETCH_MAX_DOCUMENTS})"
+        )
+    for agent_id, state in states.items():
+        lines.append(
+            f"    * {agent_id}: '{state.current_document}' chunk {state.current_index}/{state.chunk_count}, "
+            f"{state.memory_bytes() / 1024:.1f} KB, idle {now - state.last_used:.0f}s"
+        )
+    return "\n".join(lines)
 
 
-get_next_chunk_tool = FunctionTool(func=get_next_chunk)
\ No newline at end of file
+get_next_chunk_tool = FunctionTool(func=get_next_chunk)
+get_next_chunk_async_tool = FunctionTool(func=get_next_chunk_async)
+get_chunker_memory_report_tool = FunctionTool(func=get_chunker_memory_report)
@@ -0,0 +1,299 @@
+"""Persistent inverted index over analyzed chunks and their analyses.
+
+Passages (document chunks and the per-chunk / per-document analyses produced
+from them) are indexed as the pipeline produces them, so follow-up questions
+can be answered with a local lookup instead of re-running the pipeline.
+
+On-disk layout (corpus_index/ next to example_data):
+    passages.jsonl   append-only log of every indexed passage (source of truth)
+    lexicon.json     term -> [offset, count] into the postings arrays
+    postings.bin     passage ids (uint32) followed by term frequencies (uint32)
+    lengths.bin      token count of each passage (uint32)
+
+The binary files are a snapshot that is rebuilt from passages.jsonl whenever
+they are missing or stale.
+
+The index is shared by all jobs of the job service; passages indexed inside a
+job's workspace record it, so the same document name in two jobs stays apart.
+Queue workers are separate processes that share the same files, so appends and
+snapshots are serialized with a lock file (index.lock) besides the thread lock.
+"""
+
+import json
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+import numpy as np
+from google.adk.tools import FunctionTool
+from .text_features import tokenize, query_terms
+from .workspace import get_project_dir, workspace_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+# Flush the binary postings snapshot after this many new passages
+INDEX_FLUSH_EVERY = int(os.getenv("CORPUS_INDEX_FLUSH_EVERY", "50"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class CorpusIndex:
+    """In-memory view of the corpus index, loaded lazily from disk."""
+    loaded = False
+    # term -> (array('I') of passage ids, array('I') of term frequencies)
+    postings = {}
+    lengths = array("I")
+    # passage id -> metadata dict (without text), and passage id -> text
+    passages = []
+    texts = []
+    # (workspace, kind, document_id, chunk_number) -> latest passage id
+    latest = {}
+    unflushed = 0
+    # Chunk loader threads and agent callbacks index concurrently
+    lock = threading.RLock()
+
+
+def get_index_dir() -> str:
+    """Return the directory holding the corpus index files."""
+    return os.path.join(get_project_dir(), "corpus_index")
+
+
+def _passage_key(passage: dict) -> tuple:
+    # Not the agent: a re-analysis by another agent (or a speculative replica) supersedes the earlier one
+    return (passage.get("workspace"), passage["kind"], passage.get("document_id"), passage.get("chunk_number"))
+
+
+@contextmanager
+def _index_file_lock():
+    """Hold the index files exclusively across processes; callers hold CorpusIndex.lock."""
+    index_dir = get_index_dir()
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, "index.lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        yield
+
+
+def _add_to_memory(passage: dict, text: str):
+    """Add a passage to the in-memory postings."""
+    passage_id = len(CorpusIndex.passages)
+    tokens = tokenize(text)
+    counts = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    for term, count in counts.items():
+        ids, tfs = CorpusIndex.postings.setdefault(term, (array("I"), array("I")))
+        ids.append(passage_id)
+        tfs.append(count)
+    CorpusIndex.lengths.append(len(tokens))
+    CorpusIndex.passages.append(passage)
+    CorpusIndex.texts.append(text)
+    CorpusIndex.latest[_passage_key(passage)] = passage_id
+    return passage_id
+
+
+def _load_index():
+    """Load the index from disk, rebuilding postings from the passage log if needed."""
+    if CorpusIndex.loaded:
+        return
+    CorpusIndex.loaded = True
+    index_dir = get_index_dir()
+    log_path = os.path.join(index_dir, "passages.jsonl")
+    if not os.path.exists(log_path):
+        return
+    with _index_file_lock():
+        _read_index(index_dir, log_path)
+
+
+def _read_index(index_dir: str, log_path: str):
+    """Load the passage log and the postings snapshot (under _index_file_lock)."""
+    with open(log_path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    lexicon_path = os.path.join(index_dir, "lexicon.json")
+    postings_path = os.path.join(index_dir, "postings.bin")
+    lengths_path = os.path.join(index_dir, "lengths.bin")
+    snapshot_ok = False
+    if os.path.exists(lexicon_path) and os.path.exists(postings_path) and os.path.exists(lengths_path):
+        with open(lexicon_path, "r", encoding="utf-8") as f:
+            lexicon = json.load(f)
+        snapshot_ok = lexicon.get("passage_count") == len(records)
+
+    if not snapshot_ok:
+        print(f"[CorpusIndex] Rebuilding postings from {len(records)} logged passage(s)")
+        for record in records:
+            text = record.pop("text")
+            _add_to_memory(record, text)
+        _write_snapshot()
+        return
+
+    flat = array("I")
+    with open(postings_path, "rb") as f:
+        flat.frombytes(f.read())
+    total = len(flat) // 2
+    for term, (offset, count) in lexicon["terms"].items():
+        CorpusIndex.postings[term] = (flat[offset:offset + count], flat[total + offset:total + offset + count])
+    with open(lengths_path, "rb") as f:
+        CorpusIndex.lengths.frombytes(f.read())
+    for passage_id, record in enumerate(records):
+        CorpusIndex.texts.append(record.pop("text"))
+        CorpusIndex.passages.append(record)
+        CorpusIndex.latest[_passage_key(record)] = passage_id
+    print(f"[CorpusIndex] Loaded {len(records)} passage(s), {len(CorpusIndex.postings)} term(s)")
+
+
+def _write_snapshot():
+    """Write lexicon, postings and lengths for the current in-memory index (under _index_file_lock).
+
+    Another process may have appended passages this one has not loaded; the
+    snapshot's passage_count then differs from the log and the next load rebuilds.
+    """
+    index_dir = get_index_dir()
+    os.makedirs(index_dir, exist_ok=True)
+    ids_flat, tfs_flat = array("I"), array("I")
+    terms = {}
+    for term, (ids, tfs) in CorpusIndex.postings.items():
+        terms[term] = [len(ids_flat), len(ids)]
+        ids_flat.extend(ids)
+        tfs_flat.extend(tfs)
+
+    with open(os.path.join(index_dir, "postings.bin"), "wb") as f:
+        ids_flat.tofile(f)
+        tfs_flat.tofile(f)
+    with open(os.path.join(index_dir, "lengths.bin"), "wb") as f:
+        CorpusIndex.lengths.tofile(f)
+    with open(os.path.join(index_dir, "lexicon.json"), "w", encoding="utf-8") as f:
+        json.dump({"passage_count": len(CorpusIndex.passages), "terms": terms}, f)
+    CorpusIndex.unflushed = 0
+
+
+def index_passage(text: str, kind: str, document_id: str = None, chunk_number: int = None, agent: str = None) -> int:
+    """
+    Add a passage to the corpus index.
+
+    Re-indexing the same unchanged chunk is a no-op; a newer analysis with the
+    same key supersedes the older one in search results.
+
+    Args:
+        text: Passage text
+        kind: 'chunk', 'chunk_analysis' or 'document_analysis'
+        document_id: Document the passage comes from, if known
+        chunk_number: 1-based chunk number, if the passage is chunk-level
+        agent: Agent that produced the passage
+
+    Returns:
+        The passage id, or -1 if nothing was indexed
+    """
+    if not text or not text.strip():
+        return -1
+    with CorpusIndex.lock:
+        _load_index()
+        passage = {"kind": kind, "document_id": document_id, "chunk_number": chunk_number, "agent": agent}
+        if workspace_id() is not None:
+            passage["workspace"] = workspace_id()
+        previous = CorpusIndex.latest.get(_passage_key(passage))
+        if previous is not None and CorpusIndex.texts[previous] == text:
+            return previous
+
+        with _index_file_lock():
+            with open(os.path.join(get_index_dir(), "passages.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(dict(passage, text=text)) + "\n")
+            passage_id = _add_to_memory(passage, text)
+
+            CorpusIndex.unflushed += 1
+            if CorpusIndex.unflushed >= INDEX_FLUSH_EVERY:
+                _write_snapshot()
+        return passage_id
+
+
+def flush_corpus_index():
+    """Write the postings snapshot for any passages added since the last flush."""
+    with CorpusIndex.lock:
+        if CorpusIndex.unflushed:
+            with _index_file_lock():
+                _write_snapshot()
+
+
+def search_passages(query: str, k: int = 5) -> list:
+    """
+    Rank indexed passages against a query with BM25.
+
+    Args:
+        query: Free-text query
+        k: Number of results
+
+    Returns:
+        List of (score, passage_id) tuples, best first
+    """
+    # Postings arrays cannot grow while numpy views of them exist
+    with CorpusIndex.lock:
+        return _rank_passages(query, k)
+
+
+def _rank_passages(query: str, k: int) -> list:
+    _load_index()
+    n = len(CorpusIndex.passages)
+    terms = set(query_terms(query))
+    if not n or not terms:
+        return []
+
+    lengths = np.frombuffer(CorpusIndex.lengths, dtype=np.uint32).astype(np.float64)
+    avg_length = lengths.mean() or 1.0
+    scores = np.zeros(n)
+    for term in terms:
+        if term not in CorpusIndex.postings:
+            continue
+        ids_arr, tfs_arr = CorpusIndex.postings[term]
+        ids = np.frombuffer(ids_arr, dtype=np.uint32)
+        tf = np.frombuffer(tfs_arr, dtype=np.uint32).astype(np.float64)
+        idf = np.log1p((n - len(ids) + 0.5) / (len(ids) + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / avg_length)
+        np.add.at(scores, ids, idf * tf * (BM25_K1 + 1) / (tf + norm))
+
+    # Only the latest version of each passage key is searchable
+    live = np.zeros(n, dtype=bool)
+    live[list(CorpusIndex.latest.values())] = True
+    scores[~live] = 0.0
+
+    k = max(1, min(k, n))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(float(scores[i]), int(i)) for i in top if scores[i] > 0]
+
+
+def search_corpus(query: str, k: int = 5) -> str:
+    """Search previously analyzed documents, chunks and analyses for passages relevant to a query.
+
+    Use this to answer follow-up questions about the corpus without re-reading the files.
+
+    Args:
+        query: What to look for (keywords or a question)
+        k: Maximum number of passages to return (default 5)
+
+    Returns:
+        Formatted list of matching passages with their source document and chunk
+    """
+    results = search_passages(query, k)
+    if not results:
+        return f"No indexed passages match '{query}'"
+
+    lines = [f"Top {len(results)} passage(s) for '{query}':"]
+    for rank, (score, passage_id) in enumerate(results, 1):
+        passage = CorpusIndex.passages[passage_id]
+        source = passage.get("document_id") or passage.get("agent") or "unknown"
+        if passage.get("workspace"):
+            source = f"{passage['workspace']}/{source}"
+        if passage.get("chunk_number"):
+            source = f"{source} (chunk {passage['chunk_number']})"
+        text = CorpusIndex.texts[passage_id]
+        snippet = text if len(text) <= 800 else text[:800] + "..."
+        lines.append(f"\n[{rank}] {passage['kind']} from {source} (score {score:.2f})\n{snippet}")
+    return "\n".join(lines)
+
+
+search_corpus_tool = FunctionTool(func=search_corpus)
@@ -0,0 +1,283 @@
+"""Near-duplicate detection for chunks and documents before LLM analysis.
+
+Chunks are compared by an exact hash of their normalized text and by MinHash
+signatures over word shingles (computed with NumPy). Candidate pairs are found
+with LSH banding, so each lookup is independent of how many chunks were seen.
+A document whose signature is near-identical to an earlier document is aliased
+to it as a whole; otherwise only its duplicate chunks are dropped.
+
+Documents are only compared with documents of the same workspace, so a job of
+the job service never drops a chunk because another job analyzed it. Each run
+of the pipeline starts with no signatures registered in its workspace, so
+documents analyzed by an earlier run in the same process are not duplicates.
+"""
+
+import os
+import numpy as np
+from google.adk.tools import FunctionTool
+from .text_features import tokenize, content_hash, shingle_hashes
+from .workspace import workspace_id
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+CHUNK_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_CHUNK_THRESHOLD", "0.85"))
+DOCUMENT_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_DOCUMENT_THRESHOLD", "0.95"))
+
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# Each chunk handed to a DocumentAnalyzer costs one chunk-analyzer call (the feeder is code)
+LLM_CALLS_PER_CHUNK = 1
+
+# Multiply-shift hash family: h(x) = (a * x + b) >> 32 with odd 64-bit multipliers
+_rng = np.random.default_rng(0x5EED)
+_HASH_A = _rng.integers(1, 2**63, size=NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2**63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_EMPTY_SIGNATURE = np.full(NUM_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+
+_STAT_KEYS = ("chunks_checked", "exact_duplicates", "near_duplicates", "documents_aliased", "chunks_in_aliased_documents")
+
+
+class ChunkDeduplicator:
+    """Process-wide registry of chunk and document signatures, kept per workspace."""
+    # (workspace, content hash) -> (document_id, chunk_number)
+    exact_hashes = {}
+    # (workspace, band, band bytes) -> list of indices into that workspace's chunk_owners / chunk_signatures
+    lsh_buckets = {}
+    # workspace -> list of chunk signatures, and workspace -> list of (document_id, chunk_number)
+    chunk_signatures = {}
+    chunk_owners = {}
+    # (workspace, document_id) -> MinHash signature of the whole document
+    document_signatures = {}
+    # workspace -> records of dropped chunks / aliased documents and what they duplicate
+    aliases = {}
+    # workspace -> counters since the workspace's current run started
+    stats = {}
+    # Cumulative counters of the process (run metrics log the difference over a run)
+    totals = dict.fromkeys(_STAT_KEYS, 0)
+
+
+def _count(key: str, amount: int = 1):
+    """Add to a counter of the current workspace and to the process total."""
+    stats = ChunkDeduplicator.stats.setdefault(workspace_id(), dict.fromkeys(_STAT_KEYS, 0))
+    stats[key] += amount
+    ChunkDeduplicator.totals[key] += amount
+
+
+def _record_alias(alias: dict):
+    ChunkDeduplicator.aliases.setdefault(workspace_id(), []).append(alias)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Compute the MinHash signature of a text's word shingles."""
+    hashes = shingle_hashes(tokenize(text))
+    if not hashes:
+        return _EMPTY_SIGNATURE.copy()
+    x = np.asarray(hashes, dtype=np.uint64)
+    # (permutations x shingles) matrix of hashed values; uint64 products wrap mod 2**64
+    permuted = (_HASH_A[:, None] * x[None, :] + _HASH_B[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def estimate_similarity(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+    """Estimate Jaccard similarity from two MinHash signatures."""
+    return float(np.mean(signature_a == signature_b))
+
+
+def _band_keys(signature: np.ndarray) -> list:
+    """Split a signature into LSH band keys of the current workspace."""
+    bands = signature.reshape(LSH_BANDS, LSH_ROWS)
+    scope = workspace_id()
+    return [(scope, band, bands[band].tobytes()) for band in range(LSH_BANDS)]
+
+
+def _find_near_duplicate(signature: np.ndarray, owner: tuple):
+    """Return (owner, similarity) of the most similar registered chunk above the threshold."""
+    scope = workspace_id()
+    owners = ChunkDeduplicator.chunk_owners.get(scope, [])
+    signatures = ChunkDeduplicator.chunk_signatures.get(scope, [])
+    candidates = set()
+    for key in _band_keys(signature):
+        candidates.update(ChunkDeduplicator.lsh_buckets.get(key, ()))
+    candidates = [i for i in candidates if owners[i] != owner]
+    if not candidates:
+        return None, 0.0
+    matrix = np.stack([signatures[i] for i in candidates])
+    similarities = (matrix == signature[None, :]).mean(axis=1)
+    best = int(np.argmax(similarities))
+    if similarities[best] >= CHUNK_SIMILARITY_THRESHOLD:
+        return owners[candidates[best]], float(similarities[best])
+    return None, 0.0
+
+
+def _register_chunk(signature: np.ndarray, owner: tuple):
+    """Add a chunk signature to the LSH index."""
+    scope = workspace_id()
+    owners = ChunkDeduplicator.chunk_owners.setdefault(scope, [])
+    index = len(owners)
+    ChunkDeduplicator.chunk_signatures.setdefault(scope, []).append(signature)
+    owners.append(owner)
+    for key in _band_keys(signature):
+        ChunkDeduplicator.lsh_buckets.setdefault(key, []).append(index)
+
+
+def find_duplicate_document(document_id: str, signature: np.ndarray):
+    """Return (document_id, similarity) of an earlier near-identical document, if any."""
+    scope = workspace_id()
+    others = [
+        doc for doc_scope, doc in ChunkDeduplicator.document_signatures
+        if doc_scope == scope and doc != document_id
+    ]
+    if not others:
+        return None, 0.0
+    matrix = np.stack([ChunkDeduplicator.document_signatures[(scope, doc)] for doc in others])
+    similarities = (matrix == signature[None, :]).mean(axis=1)
+    best = int(np.argmax(similarities))
+    if similarities[best] >= DOCUMENT_SIMILARITY_THRESHOLD:
+        return others[best], float(similarities[best])
+    return None, 0.0
+
+
+def deduplicate_chunks(document_id: str, chunks: list, first_chunk_number: int = 1) -> dict:
+    """
+    Drop exact and near-duplicate chunks of a document before they are analyzed.
+
+    Chunks are checked against every chunk registered so far (including earlier
+    chunks of the same document). A chunk at the same position of the same
+    document is never its own duplicate, so re-loading a document is safe.
+
+    Args:
+        document_id: Document the chunks belong to
+        chunks: Chunk texts in order
+        first_chunk_number: 1-based chunk number of chunks[0]
+
+    Returns:
+        Dict with kept_indices (positions in chunks to analyze) and duplicate_of
+        (the aliased document_id when the whole document is a near duplicate)
+    """
+    if not DEDUP_ENABLED or not chunks:
+        return {"kept_indices": list(range(len(chunks))), "duplicate_of": None}
+
+    signatures = [minhash_signature(chunk) for chunk in chunks]
+
+    # Whole-document check: MinHash of the union of shingles is the element-wise min
+    document_signature = np.minimum.reduce(signatures)
+    duplicate_doc, similarity = find_duplicate_document(document_id, document_signature)
+    if duplicate_doc is not None:
+        _count("documents_aliased")
+        _count("chunks_in_aliased_documents", len(chunks))
+        _record_alias({
+            "document_id": document_id,
+            "duplicate_of": duplicate_doc,
+            "similarity": round(similarity, 3),
+        })
+        print(f"[Dedup] Document '{document_id}' aliased to '{duplicate_doc}' (similarity {similarity:.2f}), skipping {len(chunks)} chunk(s)")
+        return {"kept_indices": [], "duplicate_of": duplicate_doc}
+    if first_chunk_number == 1:
+        ChunkDeduplicator.document_signatures[(workspace_id(), document_id)] = document_signature
+
+    kept_indices = []
+    for i, (chunk, signature) in enumerate(zip(chunks, signatures)):
+        owner = (document_id, first_chunk_number + i)
+        _count("chunks_checked")
+
+        digest = (workspace_id(), content_hash(chunk))
+        exact_owner = ChunkDeduplicator.exact_hashes.get(digest)
+        if exact_owner == owner:
+            # Same chunk of a document that is being loaded again
+            kept_indices.append(i)
+            continue
+        if exact_owner is not None:
+            _count("exact_duplicates")
+            _record_alias({
+                "document_id": document_id,
+                "chunk_number": owner[1],
+                "duplicate_of": f"{exact_owner[0]}#{exact_owner[1]}",
+                "similarity": 1.0,
+            })
+            continue
+
+        near_owner, similarity = _find_near_duplicate(signature, owner)
+        if near_owner is not None:
+            _count("near_duplicates")
+            _record_alias({
+                "document_id": document_id,
+                "chunk_number": owner[1],
+                "duplicate_of": f"{near_owner[0]}#{near_owner[1]}",
+                "similarity": round(similarity, 3),
+            })
+            continue
+
+        ChunkDeduplicator.exact_hashes[digest] = owner
+        _register_chunk(signature, owner)
+        kept_indices.append(i)
+
+    dropped = len(chunks) - len(kept_indices)
+    if dropped:
+        print(f"[Dedup] Dropped {dropped} duplicate chunk(s) of '{document_id}'")
+    return {"kept_indices": kept_indices, "duplicate_of": None}
+
+
+def _workspace_stats() -> dict:
+    return ChunkDeduplicator.stats.get(workspace_id()) or dict.fromkeys(_STAT_KEYS, 0)
+
+
+def chunks_skipped() -> int:
+    """Number of chunks of the current run that were not sent for analysis."""
+    stats = _workspace_stats()
+    return stats["exact_duplicates"] + stats["near_duplicates"] + stats["chunks_in_aliased_documents"]
+
+
+def get_dedup_report() -> str:
+    """Report how many duplicate chunks and documents the current run skipped and the LLM calls saved.
+
+    Returns:
+        Formatted deduplication summary
+    """
+    stats = _workspace_stats()
+    skipped = chunks_skipped()
+    lines = [
+        "Deduplication Report:",
+        f"  - Chunks checked: {stats['chunks_checked']}",
+        f"  - Exact duplicate chunks dropped: {stats['exact_duplicates']}",
+        f"  - Near-duplicate chunks dropped: {stats['near_duplicates']}",
+        f"  - Documents aliased: {stats['documents_aliased']} ({stats['chunks_in_aliased_documents']} chunk(s))",
+        f"  - LLM calls saved: {skipped * LLM_CALLS_PER_CHUNK}",
+    ]
+    for alias in ChunkDeduplicator.aliases.get(workspace_id(), [])[-20:]:
+        source = alias["document_id"]
+        if "chunk_number" in alias:
+            source = f"{source}#{alias['chunk_number']}"
+        lines.append(f"    * {source} → {alias['duplicate_of']} (similarity {alias['similarity']})")
+    return "\n".join(lines)
+
+
+def reset_dedup_index():
+    """Forget all registered signatures and statistics."""
+    ChunkDeduplicator.exact_hashes.clear()
+    ChunkDeduplicator.lsh_buckets.clear()
+    ChunkDeduplicator.chunk_signatures.clear()
+    ChunkDeduplicator.chunk_owners.clear()
+    ChunkDeduplicator.document_signatures.clear()
+    ChunkDeduplicator.aliases.clear()
+    ChunkDeduplicator.stats.clear()
+    for key in ChunkDeduplicator.totals:
+        ChunkDeduplicator.totals[key] = 0
+
+
+def forget_workspace_signatures(scope: str):
+    """Drop the signatures, statistics and aliases of one workspace (a finished job or run)."""
+    for key in [key for key in ChunkDeduplicator.exact_hashes if key[0] == scope]:
+        del ChunkDeduplicator.exact_hashes[key]
+    for key in [key for key in ChunkDeduplicator.document_signatures if key[0] == scope]:
+        del ChunkDeduplicator.document_signatures[key]
+    for key in [key for key in ChunkDeduplicator.lsh_buckets if key[0] == scope]:
+        del ChunkDeduplicator.lsh_buckets[key]
+    ChunkDeduplicator.chunk_signatures.pop(scope, None)
+    ChunkDeduplicator.chunk_owners.pop(scope, None)
+    ChunkDeduplicator.stats.pop(scope, None)
+    ChunkDeduplicator.aliases.pop(scope, None)
+
+
+get_dedup_report_tool = FunctionTool(func=get_dedup_report)
@@ -0,0 +1,299 @@
+"""Data-access layer for documents in the example_data directory.
+
+Documents are addressed by a ``document_id``:
+
+- ``report.txt``                 plain UTF-8 text file
+- ``report.txt.gz``              single compressed file (.gz, .bz2, .xz), decompressed on the fly
+- ``corpus.tar.gz::dir/a.txt``   member of a tar or zip archive (a "virtual document")
+
+Compressed files and archive members are stream-decompressed with the standard
+library codecs, so nothing has to be extracted to disk before chunking.
+"""
+
+import bz2
+import codecs
+import fnmatch
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import time
+import zipfile
+from contextlib import contextmanager
+from .file_cache import cached
+from .workspace import get_project_dir, get_workspace, scoped_key
+
+# Separator between an archive filename and a member path in a document_id
+ARCHIVE_MEMBER_SEPARATOR = "::"
+
+# Single-file compression codecs, keyed by file suffix
+COMPRESSION_CODECS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+ZIP_SUFFIXES = (".zip",)
+
+# Size of the decompressed blocks handed to the text decoder
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class DocumentSeekIndex:
+    """Byte offsets of chunk starts in the decompressed stream of each document.
+
+    Recorded by the chunker while it streams a document, so a later read can
+    resume at chunk N without decoding and re-chunking everything before it.
+    """
+    # scoped document_id -> {"mod_time": float, "offsets": [byte offset of chunk 1, chunk 2, ...]}
+    entries = {}
+
+
+def get_example_data_dir() -> str:
+    """Return the absolute path of the document directory (example_data, or the job's input directory)."""
+    workspace = get_workspace()
+    if workspace is not None:
+        return workspace.data_dir
+    return os.path.abspath(os.path.join(get_project_dir(), "example_data"))
+
+
+def is_archive(filename: str) -> bool:
+    """Return True if the filename looks like a tar or zip archive."""
+    lowered = filename.lower()
+    return lowered.endswith(TAR_SUFFIXES) or lowered.endswith(ZIP_SUFFIXES)
+
+
+def is_compressed(filename: str) -> bool:
+    """Return True if the filename is a single compressed file (not an archive)."""
+    lowered = filename.lower()
+    return not is_archive(lowered) and os.path.splitext(lowered)[1] in COMPRESSION_CODECS
+
+
+def split_document_id(document_id: str) -> tuple:
+    """Split a document_id into (filename, member); member is None for regular files."""
+    if ARCHIVE_MEMBER_SEPARATOR in document_id:
+        filename, member = document_id.split(ARCHIVE_MEMBER_SEPARATOR, 1)
+        return filename, member
+    return document_id, None
+
+
+def _resolve_path(filename: str) -> str:
+    """Resolve a filename inside example_data, rejecting paths that escape it."""
+    example_data_dir = get_example_data_dir()
+    filepath = os.path.abspath(os.path.join(example_data_dir, filename))
+    if not filepath.startswith(example_data_dir + os.sep):
+        raise ValueError("Invalid file path")
+    return filepath
+
+
+def _list_archive_members(filepath: str) -> list:
+    """List regular-file members of an archive as (name, size, mod_time) tuples."""
+    return cached("members", filepath, filepath, lambda: _read_archive_members(filepath),
+                  size_of=lambda members: 100 * len(members))
+
+
+def _read_archive_members(filepath: str) -> list:
+    members = []
+    if filepath.lower().endswith(ZIP_SUFFIXES):
+        with zipfile.ZipFile(filepath) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    mod_time = _zip_mod_time(info)
+                    members.append((info.filename, info.file_size, mod_time))
+    else:
+        with tarfile.open(filepath, "r:*") as archive:
+            for info in archive:
+                if info.isfile():
+                    members.append((info.name, info.size, float(info.mtime)))
+    return members
+
+
+def _zip_mod_time(info: zipfile.ZipInfo) -> float:
+    """Convert a zip member's DOS timestamp to epoch seconds."""
+    return time.mktime(info.date_time + (0, 0, -1))
+
+
+def list_documents() -> list:
+    """List all documents in example_data, expanding archives into their members.
+
+    In a workspace with a document_glob, only matching documents are listed.
+
+    Returns:
+        List of dicts with document_id, size, mod_time and kind
+        ('text', 'compressed' or 'archive_member'), sorted by document_id
+    """
+    example_data_dir = get_example_data_dir()
+    documents = []
+    for filename in sorted(os.listdir(example_data_dir)):
+        filepath = os.path.join(example_data_dir, filename)
+        if not os.path.isfile(filepath):
+            continue
+        if is_archive(filename):
+            try:
+                members = _list_archive_members(filepath)
+            except (tarfile.TarError, zipfile.BadZipFile, OSError, EOFError) as e:
+                print(f"[DocumentSource] Skipping unreadable archive '{filename}': {e}")
+                continue
+            for member, size, mod_time in members:
+                documents.append({
+                    "document_id": f"{filename}{ARCHIVE_MEMBER_SEPARATOR}{member}",
+                    "size": size,
+                    "mod_time": mod_time,
+                    "kind": "archive_member",
+                })
+        else:
+            documents.append({
+                "document_id": filename,
+                "size": os.path.getsize(filepath),
+                "mod_time": os.path.getmtime(filepath),
+                "kind": "compressed" if is_compressed(filename) else "text",
+            })
+    workspace = get_workspace()
+    if workspace is not None and workspace.document_glob:
+        documents = [doc for doc in documents if fnmatch.fnmatch(doc["document_id"], workspace.document_glob)]
+    return documents
+
+
+def document_exists(document_id: str) -> bool:
+    """Return True if the document (or archive member) exists in example_data."""
+    filename, member = split_document_id(document_id)
+    try:
+        filepath = _resolve_path(filename)
+    except ValueError:
+        return False
+    if not os.path.isfile(filepath):
+        return False
+    if member is None:
+        return True
+    try:
+        return any(name == member for name, _, _ in _list_archive_members(filepath))
+    except (tarfile.TarError, zipfile.BadZipFile, OSError, EOFError):
+        return False
+
+
+def get_document_mtime(document_id: str) -> float:
+    """Return the modification time of the file that holds the document."""
+    filename, _ = split_document_id(document_id)
+    return os.path.getmtime(_resolve_path(filename))
+
+
+@contextmanager
+def open_document(document_id: str):
+    """Open a document as a binary stream of its decompressed bytes.
+
+    The returned stream supports forward ``seek`` (compressed streams emulate
+    it by decompressing and discarding), which the seek index relies on.
+
+    Args:
+        document_id: Filename, compressed filename or 'archive::member' id
+
+    Yields:
+        Readable binary file object
+    """
+    filename, member = split_document_id(document_id)
+    filepath = _resolve_path(filename)
+    if not os.path.isfile(filepath):
+        raise FileNotFoundError(f"File '{filename}' not found in example_data directory")
+
+    if member is not None:
+        if filepath.lower().endswith(ZIP_SUFFIXES):
+            with zipfile.ZipFile(filepath) as archive, archive.open(member) as stream:
+                yield stream
+        else:
+            with tarfile.open(filepath, "r:*") as archive:
+                stream = archive.extractfile(member)
+                if stream is None:
+                    raise FileNotFoundError(f"Member '{member}' in '{filename}' is not a regular file")
+                with stream:
+                    yield stream
+    elif is_compressed(filename):
+        opener = COMPRESSION_CODECS[os.path.splitext(filename.lower())[1]]
+        with opener(filepath, "rb") as stream:
+            yield stream
+    else:
+        with open(filepath, "rb") as stream:
+            yield stream
+
+
+def iter_document_text(document_id: str, start_byte: int = 0, block_size: int = READ_BLOCK_SIZE):
+    """Stream a document as decoded UTF-8 text blocks.
+
+    Args:
+        document_id: Document to read
+        start_byte: Offset in the decompressed stream to start from (from the seek index)
+        block_size: Number of decompressed bytes to read per block
+
+    Yields:
+        Text blocks in document order
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open_document(document_id) as stream:
+        if start_byte:
+            stream.seek(start_byte)
+        while True:
+            block = stream.read(block_size)
+            if not block:
+                break
+            text = decoder.decode(block)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def read_document_text(document_id: str) -> str:
+    """Read a whole document as text, decompressing it if needed.
+
+    The text is cached until the file holding the document changes. The cache
+    key is the file's absolute path, so jobs reading the same input share it.
+    """
+    filename, member = split_document_id(document_id)
+    filepath = _resolve_path(filename)
+
+    def load() -> str:
+        buffer = io.StringIO()
+        for block in iter_document_text(document_id):
+            buffer.write(block)
+        return buffer.getvalue()
+
+    key = filepath if member is None else f"{filepath}{ARCHIVE_MEMBER_SEPARATOR}{member}"
+    return cached("text", key, filepath, load, size_of=lambda text: len(text))
+
+
+def record_seek_offsets(document_id: str, offsets: list):
+    """Store the chunk-start byte offsets of a document in the seek index."""
+    try:
+        mod_time = get_document_mtime(document_id)
+    except (OSError, ValueError):
+        return
+    DocumentSeekIndex.entries[scoped_key(document_id)] = {"mod_time": mod_time, "offsets": list(offsets)}
+
+
+def get_seek_offset(document_id: str, chunk_index: int):
+    """Return the byte offset of a chunk start, or None if it is not indexed.
+
+    Entries recorded before the document was modified are discarded.
+
+    Args:
+        document_id: Document to look up
+        chunk_index: Zero-based chunk index
+
+    Returns:
+        Byte offset in the decompressed stream, or None
+    """
+    entry = DocumentSeekIndex.entries.get(scoped_key(document_id))
+    if entry is None:
+        return None
+    try:
+        if entry["mod_time"] != get_document_mtime(document_id):
+            DocumentSeekIndex.entries.pop(scoped_key(document_id), None)
+            return None
+    except (OSError, ValueError):
+        return None
+    offsets = entry["offsets"]
+    if 0 <= chunk_index < len(offsets):
+        return offsets[chunk_index]
+    return None
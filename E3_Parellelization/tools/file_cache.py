@@ -0,0 +1,119 @@
+"""Shared cache of opened and parsed files for the file-based tools.
+
+Tracker and assignment JSON files, archive member listings and document texts
+are cached by path and validated against the file's mtime and size, so repeated
+tool calls from parallel agents do not re-open and re-parse unchanged files.
+Entries are evicted least recently used once FILE_CACHE_MAX_BYTES is exceeded.
+
+JSON read-modify-write cycles hold a per-file lock (json_file_lock) so that
+concurrent updates from tool threads are not lost.
+"""
+
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class FileCache:
+    """Process-wide cache shared by the sync and async file tools."""
+    # (kind, key) -> (stamp, value, size in bytes), least recently used first
+    entries = OrderedDict()
+    total_bytes = 0
+    stats = {"hits": 0, "misses": 0, "evictions": 0}
+    lock = threading.Lock()
+    # path -> lock held while a JSON file is read, modified and written back
+    file_locks = {}
+
+
+def file_stamp(path: str) -> tuple:
+    """Return (mtime_ns, size) of a file; raises OSError if it does not exist."""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def cached(kind: str, key: str, path: str, loader, size_of=None):
+    """
+    Return loader() for a file, reusing the cached value while the file is unchanged.
+
+    Args:
+        kind: Cache namespace (e.g. 'json', 'text', 'members')
+        key: Entry key within the namespace
+        path: File whose mtime and size validate the entry
+        loader: Zero-argument callable producing the value
+        size_of: Optional callable giving the value's size in bytes (default: file size)
+
+    Returns:
+        The cached or freshly loaded value (shared; callers must not mutate it)
+    """
+    stamp = file_stamp(path)
+    cache_key = (kind, key)
+    with FileCache.lock:
+        entry = FileCache.entries.get(cache_key)
+        if entry is not None and entry[0] == stamp:
+            FileCache.entries.move_to_end(cache_key)
+            FileCache.stats["hits"] += 1
+            return entry[1]
+        FileCache.stats["misses"] += 1
+
+    value = loader()
+    size = size_of(value) if size_of else stamp[1]
+    _store(cache_key, stamp, value, size)
+    return value
+
+
+def _store(cache_key: tuple, stamp: tuple, value, size: int):
+    with FileCache.lock:
+        previous = FileCache.entries.pop(cache_key, None)
+        if previous is not None:
+            FileCache.total_bytes -= previous[2]
+        if size > FILE_CACHE_MAX_BYTES:
+            return
+        FileCache.entries[cache_key] = (stamp, value, size)
+        FileCache.total_bytes += size
+        while FileCache.total_bytes > FILE_CACHE_MAX_BYTES:
+            _, (_, _, evicted_size) = FileCache.entries.popitem(last=False)
+            FileCache.total_bytes -= evicted_size
+            FileCache.stats["evictions"] += 1
+
+
+@contextmanager
+def json_file_lock(path: str):
+    """Serialize read-modify-write cycles on one JSON file across threads."""
+    with FileCache.lock:
+        lock = FileCache.file_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with lock:
+        yield
+
+
+def load_json(path: str):
+    """
+    Load a JSON file through the cache.
+
+    Returns:
+        A private copy of the parsed content, safe to modify
+    """
+    def parse():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    return copy.deepcopy(cached("json", os.path.abspath(path), path, parse))
+
+
+def write_json(path: str, data) -> None:
+    """Atomically write a JSON file and keep the cache in step with it."""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+    _store(("json", os.path.abspath(path)), file_stamp(path), copy.deepcopy(data), os.path.getsize(path))
+
+
+def get_file_cache_stats() -> dict:
+    """Return cache counters plus the current entry count and size."""
+    with FileCache.lock:
+        return dict(FileCache.stats, entries=len(FileCache.entries), bytes=FileCache.total_bytes)
@@ -3,32 +3,35 @@
 import os
 import json
 from google.adk.tools import FunctionTool
+from .document_source import get_example_data_dir, list_documents
 
 
 def list_example_files() -> str:
     """List all files in the example_data directory with metadata.
 
+    Members of tar/zip archives are listed as virtual documents named
+    'archive.tar.gz::member.txt'; compressed files are marked as such.
+
     Returns:
         Formatted string with list of files and their metadata (size, modification time)
     """
-    tools_dir = os.path.dirname(__file__)
-    example_data_dir = os.path.join(os.path.dirname(tools_dir), "example_data")
+    example_data_dir = get_example_data_dir()
     
     if not os.path.exists(example_data_dir):
         return f"Error: example_data directory not found at {example_data_dir}"
     
     try:
-        files = os.listdir(example_data_dir)
-        if not files:
+        if not os.listdir(example_data_dir):
             return "No files found in example_data directory"
         
         file_info = []
-        for filename in sorted(files):
-            filepath = os.path.join(example_data_dir, filename)
-            if os.path.isfile(filepath):
-                size = os.path.getsize(filepath)
-                mod_time = os.path.getmtime(filepath)
-                file_info.append(f"  - {filename} ({size} bytes, modified: {mod_time})")
+        for doc in list_documents():
+            marker = ""
+            if doc["kind"] == "compressed":
+                marker = " [compressed]"
+            elif doc["kind"] == "archive_member":
+                marker = " [archive member]"
+            file_info.append(f"  - {doc['document_id']} ({doc['size']} bytes, modified: {doc['mod_time']}){marker}")
         
         if not file_info:
             return "No regular files found in example_data directory"
@@ -0,0 +1,302 @@
+"""Live metrics - a Prometheus endpoint for watching a pipeline while it runs.
+
+MLflow traces and run metrics (agents/run_metrics.py) describe a run after it
+ended. With METRICS_PORT set, a background thread serves the current state in
+the Prometheus text format at http://METRICS_HOST:METRICS_PORT/metrics:
+
+- e3_llm_in_flight{agent,stage}: model calls waiting for a response
+- e3_llm_call_seconds{stage,model}: model call latency histogram
+- e3_tool_call_seconds{tool}: file tool latency histogram
+- e3_documents{workspace,status}: documents of the runs in progress per todo list status
+- e3_chunks_served_total and e3_chunks_per_second
+- e3_executor_queue_depth{pool}: work waiting for a file-tool, loader or read-ahead thread
+- e3_event_loop_lag_seconds, e3_event_loop_lag_max_seconds, e3_event_loop_stalls_total
+- e3_process_resident_memory_bytes and e3_process_peak_resident_memory_bytes
+
+plus what other modules register with register_collector (model usage, job
+and work queue depths).
+
+Recording a call costs a bucket lookup and two increments; everything else is
+read from the statistics the pipeline keeps anyway, and only when the endpoint
+is scraped, so the endpoint can stay on in production.
+"""
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# chunks/sec is averaged over the scrapes of this window
+CHUNK_RATE_WINDOW_SECONDS = float(os.getenv("METRICS_CHUNK_RATE_WINDOW_SECONDS", "60"))
+
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOOL_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Latency histogram per label set, with fixed bucket bounds."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> [count per bucket (last one +Inf)..., sum]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values: tuple, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                lines.append(_sample(f"{self.name}_bucket", {**labels, "le": _format_bound(bound)}, cumulative))
+            lines.append(_sample(f"{self.name}_sum", labels, values[-1]))
+            lines.append(_sample(f"{self.name}_count", labels, cumulative))
+        return lines
+
+
+class LiveMetrics:
+    """Metrics recorded as the pipeline runs, and the endpoint serving them."""
+    llm_latency = Histogram("e3_llm_call_seconds", "Latency of model calls.", ("stage", "model"), LLM_BUCKETS)
+    tool_latency = Histogram("e3_tool_call_seconds", "Latency of file tool calls.", ("tool",), TOOL_BUCKETS)
+    # (agent, stage) -> model calls waiting for a response
+    in_flight = {}
+    in_flight_lock = threading.Lock()
+    # invocation_id -> (workspace label, document counter) of the runs in progress
+    runs = {}
+    # (time, chunks served) at recent scrapes, for chunks/sec; scrapes are served on several threads
+    chunk_samples = deque()
+    chunk_samples_lock = threading.Lock()
+    # Functions returning extra metric families, see register_collector
+    collectors = []
+    server = None
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_bound(bound) -> str:
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+def _sample(name: str, labels: dict, value) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f"{name}{{{label_text}}} {value}"
+    return f"{name} {value}"
+
+
+def _family(name: str, metric_type: str, help_text: str, samples: list) -> list:
+    """Text of one metric family; samples are (labels dict, value) pairs."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(_sample(name, labels, value) for labels, value in samples)
+    return lines
+
+
+def observe_llm_call(stage: str, model: str, seconds: float):
+    """Record the latency of a model call."""
+    LiveMetrics.llm_latency.observe((stage, model), seconds)
+
+
+def observe_tool_call(tool: str, seconds: float):
+    """Record the latency of a file tool call."""
+    LiveMetrics.tool_latency.observe((tool,), seconds)
+
+
+def llm_call_started(agent: str, stage: str):
+    """Count a model call of an agent as in flight until llm_call_finished."""
+    with LiveMetrics.in_flight_lock:
+        LiveMetrics.in_flight[(agent, stage)] = LiveMetrics.in_flight.get((agent, stage), 0) + 1
+
+
+def llm_call_finished(agent: str, stage: str):
+    with LiveMetrics.in_flight_lock:
+        LiveMetrics.in_flight[(agent, stage)] = max(0, LiveMetrics.in_flight.get((agent, stage), 0) - 1)
+
+
+def watch_run(invocation_id: str, workspace: str, count_documents: Callable[[], dict]):
+    """
+    Report the documents of a run in progress until unwatch_run.
+
+    Args:
+        invocation_id: The run's invocation
+        workspace: Workspace label of the run
+        count_documents: Returns status -> number of the run's documents (called on scrapes)
+    """
+    LiveMetrics.runs[invocation_id] = (workspace, count_documents)
+
+
+def unwatch_run(invocation_id: str):
+    LiveMetrics.runs.pop(invocation_id, None)
+
+
+def register_collector(collector):
+    """
+    Add metrics that are computed when the endpoint is scraped.
+
+    Args:
+        collector: Zero-argument callable returning a list of
+                   (name, type, help, [(labels dict, value), ...]) tuples
+    """
+    LiveMetrics.collectors.append(collector)
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process in bytes, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _document_samples() -> list:
+    samples = []
+    for workspace, count_documents in list(LiveMetrics.runs.values()):
+        try:
+            counts = count_documents()
+        except Exception as e:
+            print(f"[LiveMetrics] WARNING: Could not count the documents of {workspace}: {e}")
+            continue
+        samples.extend(({"workspace": workspace, "status": status}, count) for status, count in counts.items())
+    return samples
+
+
+def _chunk_rate(chunks_served: int, now: float) -> float:
+    with LiveMetrics.chunk_samples_lock:
+        samples = LiveMetrics.chunk_samples
+        samples.append((now, chunks_served))
+        while len(samples) > 2 and now - samples[0][0] > CHUNK_RATE_WINDOW_SECONDS:
+            samples.popleft()
+        started, chunks_then = samples[0]
+    return (chunks_served - chunks_then) / (now - started) if now > started else 0.0
+
+
+def _queue_depth(executor) -> int:
+    return executor._work_queue.qsize() if executor is not None else 0
+
+
+def render_metrics() -> str:
+    """Return every live metric in the Prometheus text format."""
+    from .async_file_tools import EventLoopLag, FileToolPool
+    from .chunking import ChunkPrefetcher, DocumentChunker
+
+    now = time.time()
+    chunks_served = DocumentChunker.stats["chunks_served"]
+    with LiveMetrics.in_flight_lock:
+        in_flight = sorted(LiveMetrics.in_flight.items())
+
+    lines = _family("e3_llm_in_flight", "gauge", "Model calls waiting for a response, per agent.", [
+        ({"agent": agent, "stage": stage}, count) for (agent, stage), count in in_flight
+    ])
+    lines += LiveMetrics.llm_latency.render()
+    lines += LiveMetrics.tool_latency.render()
+    lines += _family("e3_documents", "gauge", "Documents of the runs in progress per todo list status.", _document_samples())
+    lines += _family("e3_chunks_served_total", "counter", "Chunks handed to analyzers.", [({}, chunks_served)])
+    lines += _family("e3_chunks_per_second", "gauge",
+                     f"Chunks served per second over the last {CHUNK_RATE_WINDOW_SECONDS:g}s of scrapes.",
+                     [({}, _chunk_rate(chunks_served, now))])
+    lines += _family("e3_executor_queue_depth", "gauge", "Work waiting for a thread, per pool.", [
+        ({"pool": "file_tool"}, _queue_depth(FileToolPool.executor)),
+        ({"pool": "chunk_loader"}, _queue_depth(DocumentChunker.executor)),
+        ({"pool": "chunk_prefetch"}, _queue_depth(ChunkPrefetcher.executor)),
+    ])
+    lines += _family("e3_chunk_prefetch_documents", "gauge", "Documents read ahead and not yet taken.",
+                     [({}, len(ChunkPrefetcher.entries))])
+
+    lag = EventLoopLag.samples[-1] if EventLoopLag.samples else 0.0
+    lines += _family("e3_event_loop_lag_seconds", "gauge", "Latest event-loop lag sample.", [({}, lag)])
+    lines += _family("e3_event_loop_lag_max_seconds", "gauge", "Largest event-loop lag so far.",
+                     [({}, EventLoopLag.max_lag)])
+    lines += _family("e3_event_loop_stalls_total", "counter", "Event-loop lag samples above the stall threshold.",
+                     [({}, EventLoopLag.stalls)])
+
+    rss = current_rss_bytes()
+    if rss is not None:
+        lines += _family("e3_process_resident_memory_bytes", "gauge", "Resident set size.", [({}, rss)])
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        peak = peak if sys.platform == "darwin" else peak * 1024
+        lines += _family("e3_process_peak_resident_memory_bytes", "gauge", "Peak resident set size.", [({}, peak)])
+
+    for collector in list(LiveMetrics.collectors):
+        try:
+            for name, metric_type, help_text, samples in collector():
+                lines += _family(name, metric_type, help_text, samples)
+        except Exception as e:
+            print(f"[LiveMetrics] WARNING: Metrics collector failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the pipeline log
+        pass
+
+
+def start_metrics_server(port: int = None, host: str = None) -> Optional[int]:
+    """
+    Serve /metrics on a background thread (once per process).
+
+    Args:
+        port: Port to listen on (default METRICS_PORT; 0 leaves the endpoint off)
+        host: Interface to listen on (default METRICS_HOST)
+
+    Returns:
+        The port served, or None if the endpoint is off or the port is taken
+    """
+    if LiveMetrics.server is not None:
+        return LiveMetrics.server.server_address[1]
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host or METRICS_HOST, port), _MetricsHandler)
+    except OSError as e:
+        print(f"[LiveMetrics] WARNING: Could not serve metrics on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    LiveMetrics.server = server
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[LiveMetrics] Serving Prometheus metrics at http://{host or METRICS_HOST}:{port}/metrics")
+    return port
@@ -4,6 +4,9 @@ import os
 import json
 from typing import Dict, Any
 from google.adk.tools import FunctionTool
+from .document_source import document_exists, get_document_mtime
+from .file_cache import json_file_lock, load_json, write_json
+from .workspace import get_state_dir
 
 
 def get_processing_status(filename: str = None) -> str:
@@ -15,17 +18,14 @@ def get_processing_status(filename: str = None) -> str:
     Returns:
         Processing status information in a formatted string
     """
-    tools_dir = os.path.dirname(__file__)
-    parent_dir = os.path.dirname(tools_dir)
-    tracking_file = os.path.join(parent_dir, "processing_tracker.json")
+    tracking_file = os.path.join(get_state_dir(), "processing_tracker.json")
     
     # Initialize tracking file if it doesn't exist
     if not os.path.exists(tracking_file):
         return "No processing tracker found. Create one using track_file_processing() tool."
     
     try:
-        with open(tracking_file, 'r', encoding='utf-8') as f:
-            tracker = json.load(f)
+        tracker = load_json(tracking_file)
     except Exception as e:
         return f"Error reading tracking file: {str(e)}"
     
@@ -64,42 +64,37 @@ def update_processing_status(filename: str, status: str) -> str:
     Returns:
         Confirmation message
     """
-    tools_dir = os.path.dirname(__file__)
-    parent_dir = os.path.dirname(tools_dir)
-    tracking_file = os.path.join(parent_dir, "processing_tracker.json")
-    example_data_dir = os.path.join(parent_dir, "example_data")
+    tracking_file = os.path.join(get_state_dir(), "processing_tracker.json")
     
-    # Check if file exists in example_data
-    filepath = os.path.join(example_data_dir, filename)
-    if not os.path.exists(filepath):
+    # Check if file (or archive member) exists in example_data
+    if not document_exists(filename):
         return f"Error: File '{filename}' not found in example_data directory"
     
-    # Initialize tracker if it doesn't exist
-    if os.path.exists(tracking_file):
+    with json_file_lock(tracking_file):
+        # Initialize tracker if it doesn't exist
+        if os.path.exists(tracking_file):
+            try:
+                tracker = load_json(tracking_file)
+            except Exception as e:
+                return f"Error reading tracking file: {str(e)}"
+        else:
+            tracker = {"files": {}}
+        
+        # Update or create file entry
+        mod_time = get_document_mtime(filename)
+        tracker["files"][filename] = {
+            "filename": filename,
+            "moddt": mod_time,
+            "status": status,
+            "processed_at": mod_time if status == "completed" else None
+        }
+        
+        # Write back to tracking file
         try:
-            with open(tracking_file, 'r', encoding='utf-8') as f:
-                tracker = json.load(f)
+            write_json(tracking_file, tracker)
+            return f"Updated '{filename}' status to '{status}'"
         except Exception as e:
-            return f"Error reading tracking file: {str(e)}"
-    else:
-        tracker = {"files": {}}
-    
-    # Update or create file entry
-    mod_time = os.path.getmtime(filepath)
-    tracker["files"][filename] = {
-        "filename": filename,
-        "moddt": mod_time,
-        "status": status,
-        "processed_at": os.path.getmtime(filepath) if status == "completed" else None
-    }
-    
-    # Write back to tracking file
-    try:
-        with open(tracking_file, 'w', encoding='utf-8') as f:
-            json.dump(tracker, f, indent=2)
-        return f"Updated '{filename}' status to '{status}'"
-    except Exception as e:
-        return f"Error writing tracking file: {str(e)}"
+            return f"Error writing tracking file: {str(e)}"
 
 
 get_processing_status_tool = FunctionTool(func=get_processing_status)
@@ -2,31 +2,34 @@
 
 import os
 from google.adk.tools import FunctionTool
+from .document_source import get_example_data_dir, list_documents, read_document_text, split_document_id
 
 
 def read_data(filename: str = None) -> str:
     """Read example data files from the example_data directory.
 
+    Compressed files (.gz, .bz2, .xz) are decompressed transparently, and
+    members of tar/zip archives can be read as 'archive.tar.gz::member.txt'.
+
     Args:
         filename: Optional specific filename to read. If None, lists all files in the directory.
 
     Returns:
         Content of the requested file or list of available files
     """
-    # Get the parent directory of the tools directory
-    tools_dir = os.path.dirname(__file__)
-    example_data_dir = os.path.join(os.path.dirname(tools_dir), "example_data")
+    example_data_dir = get_example_data_dir()
     
     if not os.path.exists(example_data_dir):
         return f"Error: example_data directory not found at {example_data_dir}"
     
-    # If no filename specified, list all files
+    # If no filename specified, list all documents (archive members included)
     if filename is None:
-        files = os.listdir(example_data_dir)
+        files = [doc["document_id"] for doc in list_documents()]
         return f"Available files in example_data:\n" + "\n".join(files)
     
     # Read specific file
-    filepath = os.path.join(example_data_dir, filename)
+    archive_name, _ = split_document_id(filename)
+    filepath = os.path.join(example_data_dir, archive_name)
     
     # Security check: ensure the file is within example_data directory
     if not os.path.abspath(filepath).startswith(os.path.abspath(example_data_dir)):
@@ -36,9 +39,7 @@ def read_data(filename: str = None) -> str:
         return f"Error: File '{filename}' not found in example_data directory"
     
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content
+        return read_document_text(filename)
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
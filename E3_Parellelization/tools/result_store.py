@@ -0,0 +1,231 @@
+"""Result store - per-document analyses kept out of session state.
+
+A DocumentAnalyzer folds the chunks of a document into document_analysis_N.
+When the last chunk of the document has been analyzed, the analysis is
+appended to the result store, keyed by run and document, and
+document_analysis_N is cleared for the analyzer's next document. Session
+state only keeps small references (document_results_N holds the ones from
+the analyzer's latest call), so state and event payloads stay small however
+many documents a run analyzes, and no document's analysis is overwritten by
+the next one.
+
+Backends (RESULT_STORE_BACKEND):
+- jsonl   results/analyses.jsonl, append-only, one record per line (default)
+- sqlite  results/analyses.sqlite, one row per run and document
+
+The store lives in the run's state directory (per job in the job service),
+or in RESULT_STORE_DIR when set: the worker processes of a shared work queue
+all write to the queue directory's store, which must then be sqlite. A
+document stored twice in one run (e.g. by a speculative replica or a worker
+that took over an expired lease) keeps its latest analysis.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional
+from .workspace import get_state_dir
+
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "1") == "1"
+RESULT_STORE_BACKEND = os.getenv("RESULT_STORE_BACKEND", "jsonl")
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR")
+
+# Session state key of the run the stored analyses belong to (kept across a resume)
+RESULT_RUN_ID_KEY = "result_run_id"
+
+
+class JsonlResultStore:
+    """Append-only JSONL file with an in-memory index of the latest record per run and document."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # (run_id, document_id) -> byte offset of the latest record; built on first use
+        self.offsets = None
+        # The file ends in a line torn by a crash, so the next record starts a new line
+        self.torn = False
+
+    def _load_offsets(self):
+        self.offsets = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = f.tell()
+            for line in iter(f.readline, b""):
+                try:
+                    record = json.loads(line)
+                    self.offsets[(record["run_id"], record["document_id"])] = offset
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    pass
+                self.torn = not line.endswith(b"\n")
+                offset = f.tell()
+
+    def append(self, record: dict):
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with self.lock:
+            if self.offsets is None:
+                self._load_offsets()
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "ab") as f:
+                if self.torn:
+                    f.write(b"\n")
+                    self.torn = False
+                offset = f.tell()
+                f.write(line)
+            self.offsets[(record["run_id"], record["document_id"])] = offset
+
+    def _read_at(self, f, offset: int) -> dict:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+    def get(self, run_id: str, document_id: str) -> Optional[dict]:
+        with self.lock:
+            if self.offsets is None:
+                self._load_offsets()
+            offset = self.offsets.get((run_id, document_id))
+        if offset is None:
+            return None
+        with open(self.path, "rb") as f:
+            return self._read_at(f, offset)
+
+    def iter_run(self, run_id: str) -> Iterator[dict]:
+        with self.lock:
+            if self.offsets is None:
+                self._load_offsets()
+            offsets = sorted(offset for (run, _), offset in self.offsets.items() if run == run_id)
+        if not offsets:
+            return
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                yield self._read_at(f, offset)
+
+
+class SqliteResultStore:
+    """SQLite table with one row per run and document."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Worker processes share the file, so writers wait for each other's locks
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS analyses (run_id TEXT, document_id TEXT, agent TEXT, "
+                "stored_at REAL, analysis TEXT, PRIMARY KEY (run_id, document_id))"
+            )
+        return self.connection
+
+    def append(self, record: dict):
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?)",
+                (record["run_id"], record["document_id"], record["agent"], record["stored_at"], record["analysis"]),
+            )
+            connection.commit()
+
+    def get(self, run_id: str, document_id: str) -> Optional[dict]:
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT run_id, document_id, agent, stored_at, analysis FROM analyses WHERE run_id = ? AND document_id = ?",
+                (run_id, document_id),
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def iter_run(self, run_id: str) -> Iterator[dict]:
+        with self.lock:
+            documents = [row[0] for row in self._connect().execute(
+                "SELECT document_id FROM analyses WHERE run_id = ? ORDER BY stored_at", (run_id,)
+            )]
+        # One row at a time, so a large run is never held in memory at once
+        for document_id in documents:
+            record = self.get(run_id, document_id)
+            if record is not None:
+                yield record
+
+    @staticmethod
+    def _record(row) -> dict:
+        return dict(zip(("run_id", "document_id", "agent", "stored_at", "analysis"), row))
+
+
+BACKENDS = {
+    "jsonl": (JsonlResultStore, "analyses.jsonl"),
+    "sqlite": (SqliteResultStore, "analyses.sqlite"),
+}
+
+
+class ResultStore:
+    """Open stores, one per state directory."""
+    stores = {}
+    lock = threading.Lock()
+
+
+def get_result_store():
+    """Return the result store of the current run's state directory."""
+    store_class, filename = BACKENDS.get(RESULT_STORE_BACKEND, BACKENDS["jsonl"])
+    path = os.path.join(RESULT_STORE_DIR or get_state_dir(), "results", filename)
+    with ResultStore.lock:
+        store = ResultStore.stores.get(path)
+        if store is None:
+            store = ResultStore.stores[path] = store_class(path)
+    return store
+
+
+def result_run_id(state, invocation_id: str) -> str:
+    """Return the run id of the session's stored results, starting a run with invocation_id if there is none."""
+    run_id = state.get(RESULT_RUN_ID_KEY)
+    if not run_id:
+        run_id = invocation_id
+        state[RESULT_RUN_ID_KEY] = run_id
+    return run_id
+
+
+def store_analysis(run_id: str, document_id: str, analysis: str, agent: str = None) -> dict:
+    """
+    Append a document's analysis to the result store.
+
+    Args:
+        run_id: Run the analysis belongs to
+        document_id: Analyzed document
+        analysis: Full analysis text
+        agent: DocumentAnalyzer that produced it
+
+    Returns:
+        Small reference to keep in session state instead of the text
+    """
+    record = {
+        "run_id": run_id,
+        "document_id": document_id,
+        "agent": agent,
+        "stored_at": time.time(),
+        "analysis": analysis,
+    }
+    get_result_store().append(record)
+    return {"run_id": run_id, "document_id": document_id, "agent": agent, "chars": len(analysis)}
+
+
+def load_analysis(run_id: str, document_id: str) -> Optional[str]:
+    """Return the stored analysis of a document in a run, or None."""
+    record = get_result_store().get(run_id, document_id)
+    return record["analysis"] if record else None
+
+
+def iter_analyses(run_id: str) -> Iterator[dict]:
+    """Stream the stored analyses of a run in the order they were stored (latest per document)."""
+    return get_result_store().iter_run(run_id)
+
+
+def close_result_store(state_dir: str):
+    """Forget the open store of a state directory (e.g. when a job of the job service ends)."""
+    prefix = os.path.join(os.path.abspath(state_dir), "results") + os.sep
+    with ResultStore.lock:
+        for path in [path for path in ResultStore.stores if path.startswith(prefix)]:
+            store = ResultStore.stores.pop(path)
+            if getattr(store, "connection", None) is not None:
+                store.connection.close()
@@ -0,0 +1,135 @@
+"""Local BM25 salience pre-filter that runs between chunking and analysis.
+
+Each document's chunks are scored against the analysis goal with a BM25 model
+built from that document's own chunks, and only the top-K chunks (or the top
+fraction) are kept for the LLM. A run-wide budget caps the total number of
+LLM calls spent on chunk analysis. Kept chunks are returned in document order.
+
+Configuration (environment variables):
+    SALIENCE_FILTER_ENABLED   "1" to enable the filter (default "0")
+    ANALYSIS_GOAL             Query the chunks are scored against
+    SALIENCE_TOP_K            Max chunks kept per document (0 = no limit)
+    SALIENCE_TOP_FRACTION     Fraction of chunks kept per document (default 1.0)
+    SALIENCE_LLM_CALL_BUDGET  Max chunk-analysis LLM calls per run (0 = unlimited)
+"""
+
+import math
+import os
+import numpy as np
+from .text_features import tokenize, query_terms
+from .dedup import LLM_CALLS_PER_CHUNK
+from .workspace import workspace_id
+
+SALIENCE_FILTER_ENABLED = os.getenv("SALIENCE_FILTER_ENABLED", "0") == "1"
+ANALYSIS_GOAL = os.getenv(
+    "ANALYSIS_GOAL",
+    "key findings important data statistics results trends themes patterns risks recommendations conclusions",
+)
+SALIENCE_TOP_K = int(os.getenv("SALIENCE_TOP_K", "0"))
+SALIENCE_TOP_FRACTION = float(os.getenv("SALIENCE_TOP_FRACTION", "1.0"))
+SALIENCE_LLM_CALL_BUDGET = int(os.getenv("SALIENCE_LLM_CALL_BUDGET", "0"))
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class ChunkBudget:
+    """Run-wide accounting of chunks selected for LLM analysis (each job has its own budget)."""
+    # (workspace, document_id) -> number of chunks charged against the budget
+    charged = {}
+    stats = {"chunks_scored": 0, "chunks_kept": 0}
+
+
+def bm25_scores(chunks: list, query: str) -> np.ndarray:
+    """
+    Score chunks against a query with BM25, using the chunks themselves as the corpus.
+
+    Args:
+        chunks: Chunk texts
+        query: Free-text query (e.g. the analysis goal)
+
+    Returns:
+        Array of one score per chunk
+    """
+    terms = sorted(set(query_terms(query)))
+    if not chunks or not terms:
+        return np.zeros(len(chunks))
+    column = {term: i for i, term in enumerate(terms)}
+
+    tf = np.zeros((len(chunks), len(terms)))
+    lengths = np.zeros(len(chunks))
+    for row, chunk in enumerate(chunks):
+        tokens = tokenize(chunk)
+        lengths[row] = len(tokens)
+        for token in tokens:
+            col = column.get(token)
+            if col is not None:
+                tf[row, col] += 1
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5))
+    avg_length = lengths.mean() or 1.0
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+    return (idf * tf * (BM25_K1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+
+def _budget_remaining(document_id: str):
+    """Chunks this document may still be charged for, or None when unlimited."""
+    if SALIENCE_LLM_CALL_BUDGET <= 0:
+        return None
+    budget_chunks = SALIENCE_LLM_CALL_BUDGET // LLM_CALLS_PER_CHUNK
+    scope = workspace_id()
+    used_elsewhere = sum(n for (doc_scope, doc), n in ChunkBudget.charged.items()
+                         if doc_scope == scope and doc != document_id)
+    return max(0, budget_chunks - used_elsewhere)
+
+
+def select_salient_chunks(document_id: str, chunks: list, goal: str = None) -> list:
+    """
+    Pick the chunks of a document worth sending to the LLM.
+
+    Args:
+        document_id: Document the chunks belong to (for budget accounting)
+        chunks: Candidate chunk texts in document order
+        goal: Query to score against; defaults to ANALYSIS_GOAL
+
+    Returns:
+        Positions in chunks to keep, in document order
+    """
+    if not SALIENCE_FILTER_ENABLED or not chunks:
+        return list(range(len(chunks)))
+
+    keep = math.ceil(len(chunks) * SALIENCE_TOP_FRACTION)
+    if SALIENCE_TOP_K > 0:
+        keep = min(keep, SALIENCE_TOP_K)
+    keep = max(1, keep)
+    remaining = _budget_remaining(document_id)
+    if remaining is not None:
+        keep = min(keep, remaining)
+
+    scores = bm25_scores(chunks, goal or ANALYSIS_GOAL)
+    # Highest score first; ties keep document order
+    ranked = np.lexsort((np.arange(len(chunks)), -scores))
+    kept = sorted(int(i) for i in ranked[:keep])
+
+    ChunkBudget.charged[(workspace_id(), document_id)] = len(kept)
+    ChunkBudget.stats["chunks_scored"] += len(chunks)
+    ChunkBudget.stats["chunks_kept"] += len(kept)
+    if len(kept) < len(chunks):
+        print(f"[Salience] Kept {len(kept)}/{len(chunks)} chunk(s) of '{document_id}'"
+              + (f" (budget left: {remaining - len(kept)} chunk(s))" if remaining is not None else ""))
+    return kept
+
+
+def forget_workspace_budget(scope: str):
+    """Drop the budget accounting of one workspace (a finished job)."""
+    for key in [key for key in ChunkBudget.charged if key[0] == scope]:
+        del ChunkBudget.charged[key]
+
+
+def reset_chunk_budget():
+    """Clear budget accounting for a new run."""
+    ChunkBudget.charged.clear()
+    for key in ChunkBudget.stats:
+        ChunkBudget.stats[key] = 0
@@ -0,0 +1,164 @@
+"""Priority and deadline scheduling of documents.
+
+Every document has a priority class (critical, high, normal, low) and an
+optional deadline. Both come from the todo list entry (e.g. set by the
+caller that seeded it) and from work_assignments.json (assign_file_for_work),
+which is read live, so a document escalated during a run is picked up by the
+next chunk request.
+
+Dispatch order is earliest deadline first within priority classes: critical
+work before high, and within a class the nearest deadline first; documents
+without a deadline follow the ones with one, in todo list order. A document is
+late when it completes after its deadline; late documents are flagged in the
+todo list (deadline_missed) and reported as they complete.
+"""
+
+import math
+import os
+import time
+from datetime import datetime
+from typing import Optional
+from .file_cache import load_json
+from .workspace import get_state_dir
+
+# Off by default: the planner model assigns the documents and the feeder serves them in todo list order
+PRIORITY_SCHEDULING = os.getenv("PRIORITY_SCHEDULING", "0") == "1"
+# Park a document between chunks when a document of a higher priority class is waiting
+PRIORITY_PREEMPTION = os.getenv("PRIORITY_PREEMPTION", "1") == "1"
+
+PRIORITY_ORDER = {"critical": 0, "high": 1, "normal": 2, "low": 3}
+VALID_PRIORITIES = list(PRIORITY_ORDER)
+
+
+def parse_deadline(value) -> Optional[float]:
+    """
+    Convert a deadline to a Unix timestamp.
+
+    Accepts a Unix timestamp or an ISO 8601 date/time string (local time if it
+    has no offset). Returns None for a missing or unreadable deadline.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).strip()).timestamp()
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+
+def load_assigned_urgency() -> dict:
+    """Priority and deadline of every document in work_assignments.json: filename -> (priority, deadline)."""
+    path = os.path.join(get_state_dir(), "work_assignments.json")
+    if not os.path.exists(path):
+        return {}
+    try:
+        assignments = load_json(path).get("assignments", [])
+    except Exception as e:
+        print(f"[Scheduler] WARNING: Could not read work assignments: {e}")
+        return {}
+    return {
+        asgn["filename"]: (asgn.get("priority", "normal"), parse_deadline(asgn.get("deadline")))
+        for asgn in assignments if isinstance(asgn, dict) and asgn.get("filename")
+    }
+
+
+def task_urgency(task: dict, assigned: dict = None) -> tuple:
+    """
+    Priority and deadline of a todo list task.
+
+    Args:
+        task: Todo list entry
+        assigned: Result of load_assigned_urgency(); its values win over the task's
+
+    Returns:
+        (priority, deadline) with deadline a Unix timestamp or None
+    """
+    priority = task.get("priority") or "normal"
+    deadline = parse_deadline(task.get("deadline"))
+    if assigned and task.get("filename") in assigned:
+        assigned_priority, assigned_deadline = assigned[task["filename"]]
+        priority = assigned_priority or priority
+        deadline = assigned_deadline if assigned_deadline is not None else deadline
+    if priority not in PRIORITY_ORDER:
+        priority = "normal"
+    return priority, deadline
+
+
+def schedule_key(priority: str, deadline: Optional[float], position: int) -> tuple:
+    """Sort key for earliest deadline first within priority classes."""
+    return (PRIORITY_ORDER.get(priority, PRIORITY_ORDER["normal"]), math.inf if deadline is None else deadline, position)
+
+
+def schedule_todo_list(todo_list: list, agents: list) -> list:
+    """
+    Order pending tasks by urgency and deal them out to the agents.
+
+    Pending tasks come first, most urgent first, and are assigned round-robin
+    in that order, so every agent's queue starts with its most urgent
+    documents and urgent work is spread over all agents. Each pending task is
+    annotated with its priority and deadline. Other tasks follow unchanged.
+
+    Args:
+        todo_list: Parsed todo list
+        agents: Names of the agents work may be assigned to
+
+    Returns:
+        The scheduled todo list
+    """
+    assigned = load_assigned_urgency()
+    pending = []
+    others = []
+    for position, task in enumerate(todo_list):
+        if isinstance(task, dict) and task.get("status") == "pending" and task.get("filename"):
+            priority, deadline = task_urgency(task, assigned)
+            pending.append((schedule_key(priority, deadline, position), task, priority, deadline))
+        else:
+            others.append(task)
+    pending.sort(key=lambda entry: entry[0])
+
+    scheduled = []
+    for i, (_, task, priority, deadline) in enumerate(pending):
+        task = dict(task, priority=priority, deadline=deadline)
+        if agents:
+            task["assigned_agent"] = agents[i % len(agents)]
+        scheduled.append(task)
+    return scheduled + others
+
+
+def describe_schedule(todo_list: list, now: float = None) -> str:
+    """One-line summary of the pending work by priority class and deadline."""
+    now = now or time.time()
+    counts = {priority: 0 for priority in PRIORITY_ORDER}
+    deadlines = []
+    for task in todo_list:
+        if isinstance(task, dict) and task.get("status") == "pending":
+            counts[task.get("priority") if task.get("priority") in counts else "normal"] += 1
+            if task.get("deadline") is not None:
+                deadlines.append(task["deadline"])
+    summary = ", ".join(f"{count} {priority}" for priority, count in counts.items() if count)
+    if deadlines:
+        overdue = sum(1 for deadline in deadlines if deadline < now)
+        summary += f"; {len(deadlines)} with a deadline, earliest in {min(deadlines) - now:.0f}s"
+        if overdue:
+            summary += f", {overdue} already past due"
+    return summary or "nothing pending"
+
+
+def mark_deadline_outcome(task: dict) -> Optional[float]:
+    """
+    Flag a completed task that finished after its deadline.
+
+    Returns:
+        Seconds the task was late, or None if it had no deadline or met it
+    """
+    deadline = parse_deadline(task.get("deadline"))
+    processed_at = task.get("processed_at")
+    if deadline is None or processed_at is None:
+        return None
+    late = processed_at - deadline
+    task["deadline_missed"] = late > 0
+    return late if late > 0 else None
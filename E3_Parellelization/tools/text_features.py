@@ -0,0 +1,50 @@
+"""Text normalization, tokenization and shingling shared by the local text tools."""
+
+import hashlib
+import re
+import zlib
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Number of consecutive tokens per shingle
+SHINGLE_SIZE = 5
+
+# Function words ignored when scoring text against a query
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Split text into lowercase word tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def query_terms(text: str) -> list:
+    """Tokenize a query, dropping stopwords."""
+    return [token for token in tokenize(text) if token not in STOPWORDS]
+
+
+def content_hash(text: str) -> str:
+    """Hash of the whitespace/case-normalized text, used for exact-duplicate checks."""
+    normalized = " ".join(tokenize(text))
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def shingle_hashes(tokens: list, size: int = SHINGLE_SIZE) -> list:
+    """Return the distinct 32-bit hashes of the word shingles of a token list.
+
+    Texts shorter than one shingle fall back to hashing their individual tokens.
+
+    Args:
+        tokens: Tokens from tokenize()
+        size: Number of tokens per shingle
+
+    Returns:
+        Sorted list of unique shingle hashes
+    """
+    if len(tokens) < size:
+        windows = tokens
+    else:
+        windows = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return sorted({zlib.crc32(window.encode("utf-8")) for window in windows})
@@ -5,75 +5,77 @@ import json
 from datetime import datetime
 from typing import List
 from google.adk.tools import FunctionTool
+from .document_source import document_exists
+from .file_cache import json_file_lock, load_json, write_json
+from .workspace import get_state_dir
+from .scheduling import PRIORITY_ORDER, VALID_PRIORITIES, parse_deadline
 
 
-def assign_file_for_work(filename: str, assigned_to: str, priority: str = "normal") -> str:
+def assign_file_for_work(filename: str, assigned_to: str, priority: str = "normal", deadline: str = None) -> str:
     """Assign a file for work to a specific agent or worker.
 
     Args:
         filename: Name of the file to assign
         assigned_to: Name/identifier of the agent or worker assigned to process the file
         priority: Priority level (low, normal, high, critical) - default is normal
+        deadline: Optional time the file must be processed by (ISO 8601, e.g. 2025-01-31T17:00)
 
     Returns:
         Confirmation message with assignment details
     """
-    tools_dir = os.path.dirname(__file__)
-    parent_dir = os.path.dirname(tools_dir)
-    assignments_file = os.path.join(parent_dir, "work_assignments.json")
-    example_data_dir = os.path.join(parent_dir, "example_data")
+    assignments_file = os.path.join(get_state_dir(), "work_assignments.json")
     
-    # Check if file exists in example_data
-    filepath = os.path.join(example_data_dir, filename)
-    if not os.path.exists(filepath):
+    # Check if file (or archive member) exists in example_data
+    if not document_exists(filename):
         return f"Error: File '{filename}' not found in example_data directory"
     
     # Validate priority
-    valid_priorities = ["low", "normal", "high", "critical"]
-    if priority not in valid_priorities:
-        return f"Error: Invalid priority '{priority}'. Must be one of: {', '.join(valid_priorities)}"
-    
-    # Initialize assignments if file doesn't exist
-    if os.path.exists(assignments_file):
+    if priority not in VALID_PRIORITIES:
+        return f"Error: Invalid priority '{priority}'. Must be one of: {', '.join(VALID_PRIORITIES)}"
+    if deadline and parse_deadline(deadline) is None:
+        return f"Error: Invalid deadline '{deadline}'. Use an ISO 8601 date/time such as 2025-01-31T17:00"
+    
+    with json_file_lock(assignments_file):
+        # Initialize assignments if file doesn't exist
+        if os.path.exists(assignments_file):
+            try:
+                assignments = load_json(assignments_file)
+            except Exception as e:
+                return f"Error reading assignments file: {str(e)}"
+        else:
+            assignments = {"assignments": []}
+        
+        # Create assignment entry
+        assignment = {
+            "filename": filename,
+            "assigned_to": assigned_to,
+            "priority": priority,
+            "deadline": deadline or None,
+            "assigned_at": datetime.now().isoformat(),
+            "status": "assigned"
+        }
+        
+        # Check if file is already assigned and update or add new
+        existing_index = None
+        for i, asgn in enumerate(assignments.get("assignments", [])):
+            if asgn["filename"] == filename:
+                existing_index = i
+                break
+        
+        if existing_index is not None:
+            assignments["assignments"][existing_index] = assignment
+            action = "reassigned"
+        else:
+            assignments["assignments"].append(assignment)
+            action = "assigned"
+        
+        # Write back to file
         try:
-            with open(assignments_file, 'r', encoding='utf-8') as f:
-                assignments = json.load(f)
+            write_json(assignments_file, assignments)
+            return (f"File '{filename}' {action} to '{assigned_to}' "
+                    f"with priority '{priority}'" + (f" and deadline {deadline}" if deadline else ""))
         except Exception as e:
-            return f"Error reading assignments file: {str(e)}"
-    else:
-        assignments = {"assignments": []}
-    
-    # Create assignment entry
-    assignment = {
-        "filename": filename,
-        "assigned_to": assigned_to,
-        "priority": priority,
-        "assigned_at": datetime.now().isoformat(),
-        "status": "assigned"
-    }
-    
-    # Check if file is already assigned and update or add new
-    existing_index = None
-    for i, asgn in enumerate(assignments.get("assignments", [])):
-        if asgn["filename"] == filename:
-            existing_index = i
-            break
-    
-    if existing_index is not None:
-        assignments["assignments"][existing_index] = assignment
-        action = "reassigned"
-    else:
-        assignments["assignments"].append(assignment)
-        action = "assigned"
-    
-    # Write back to file
-    try:
-        with open(assignments_file, 'w', encoding='utf-8') as f:
-            json.dump(assignments, f, indent=2)
-        return (f"File '{filename}' {action} to '{assigned_to}' "
-                f"with priority '{priority}'")
-    except Exception as e:
-        return f"Error writing assignments file: {str(e)}"
+            return f"Error writing assignments file: {str(e)}"
 
 
 def get_work_assignments(assigned_to: str = None) -> str:
@@ -85,16 +87,13 @@ def get_work_assignments(assigned_to: str = None) -> str:
     Returns:
         Formatted string with assignment details
     """
-    tools_dir = os.path.dirname(__file__)
-    parent_dir = os.path.dirname(tools_dir)
-    assignments_file = os.path.join(parent_dir, "work_assignments.json")
+    assignments_file = os.path.join(get_state_dir(), "work_assignments.json")
     
     if not os.path.exists(assignments_file):
         return "No work assignments found. Use assign_file_for_work() to create assignments."
     
     try:
-        with open(assignments_file, 'r', encoding='utf-8') as f:
-            assignments = json.load(f)
+        assignments = load_json(assignments_file)
     except Exception as e:
         return f"Error reading assignments file: {str(e)}"
     
@@ -113,10 +112,10 @@ def get_work_assignments(assigned_to: str = None) -> str:
         assignments_to_display = all_assignments
         title = "All Work Assignments:"
     
-    # Sort by priority (critical, high, normal, low)
-    priority_order = {"critical": 0, "high": 1, "normal": 2, "low": 3}
+    # Sort by priority (critical, high, normal, low), then earliest deadline
     assignments_to_display.sort(
-        key=lambda x: (priority_order.get(x.get("priority", "normal"), 999), 
+        key=lambda x: (PRIORITY_ORDER.get(x.get("priority", "normal"), 999),
+                       parse_deadline(x.get("deadline")) or float("inf"),
                        x.get("assigned_at", ""))
     )
     
@@ -125,6 +124,7 @@ def get_work_assignments(assigned_to: str = None) -> str:
         result.append(
             f"  - {asgn['filename']} → {asgn['assigned_to']} "
             f"[{asgn['priority'].upper()}] ({asgn['status']})"
+            + (f" due {asgn['deadline']}" if asgn.get("deadline") else "")
         )
     
     return "\n".join(result)
@@ -139,31 +139,28 @@ def complete_assignment(filename: str) -> str:
     Returns:
         Confirmation message
     """
-    tools_dir = os.path.dirname(__file__)
-    parent_dir = os.path.dirname(tools_dir)
-    assignments_file = os.path.join(parent_dir, "work_assignments.json")
+    assignments_file = os.path.join(get_state_dir(), "work_assignments.json")
     
     if not os.path.exists(assignments_file):
         return "No work assignments found"
     
-    try:
-        with open(assignments_file, 'r', encoding='utf-8') as f:
-            assignments = json.load(f)
-    except Exception as e:
-        return f"Error reading assignments file: {str(e)}"
-    
-    # Find and update assignment
-    for asgn in assignments.get("assignments", []):
-        if asgn["filename"] == filename:
-            asgn["status"] = "completed"
-            asgn["completed_at"] = datetime.now().isoformat()
-            
-            try:
-                with open(assignments_file, 'w', encoding='utf-8') as f:
-                    json.dump(assignments, f, indent=2)
-                return f"Assignment for '{filename}' marked as completed"
-            except Exception as e:
-                return f"Error updating assignments file: {str(e)}"
+    with json_file_lock(assignments_file):
+        try:
+            assignments = load_json(assignments_file)
+        except Exception as e:
+            return f"Error reading assignments file: {str(e)}"
+        
+        # Find and update assignment
+        for asgn in assignments.get("assignments", []):
+            if asgn["filename"] == filename:
+                asgn["status"] = "completed"
+                asgn["completed_at"] = datetime.now().isoformat()
+                
+                try:
+                    write_json(assignments_file, assignments)
+                    return f"Assignment for '{filename}' marked as completed"
+                except Exception as e:
+                    return f"Error updating assignments file: {str(e)}"
     
     return f"No assignment found for file '{filename}'"
 
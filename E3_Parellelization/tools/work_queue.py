@@ -0,0 +1,328 @@
+"""Work queue - documents of a run shared by worker processes through SQLite.
+
+Any number of worker processes, on one host or on several hosts sharing a
+filesystem, drain the same queue file (queue.sqlite in the queue directory):
+
+- enqueue    adds a run: its input directory and one row per document
+- claim      hands a worker the next pending documents (most urgent first)
+             under a lease of WORK_QUEUE_LEASE_SECONDS
+- heartbeat  extends the leases of the documents a worker still holds
+- complete   marks documents analyzed; fail puts them back (up to
+             WORK_QUEUE_MAX_ATTEMPTS claims) and release returns them unclaimed
+
+A document whose lease expires (its worker crashed or hung) is pending again
+at the next claim, so another worker picks it up. Once no document is pending
+or being processed, exactly one worker wins claim_synthesis and writes the
+run's report; its lease is kept alive the same way.
+
+Every claim and state change is one short transaction (BEGIN IMMEDIATE), so
+the file only needs working POSIX locks. WAL journaling is faster but needs
+shared memory, so it is opt-in for queues used from a single host
+(WORK_QUEUE_WAL=1).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from .scheduling import PRIORITY_ORDER
+
+WORK_QUEUE_LEASE_SECONDS = float(os.getenv("WORK_QUEUE_LEASE_SECONDS", "120"))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+WORK_QUEUE_WAL = os.getenv("WORK_QUEUE_WAL", "0") == "1"
+# Seconds a transaction waits for another process's lock before failing
+WORK_QUEUE_BUSY_TIMEOUT_SECONDS = float(os.getenv("WORK_QUEUE_BUSY_TIMEOUT_SECONDS", "30"))
+
+QUEUE_FILENAME = "queue.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    input_dir TEXT NOT NULL,
+    document_glob TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    synthesis_worker TEXT,
+    synthesis_lease_expires REAL,
+    finished_at REAL,
+    report TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    run_id TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    size INTEGER,
+    mod_time REAL,
+    priority TEXT NOT NULL DEFAULT 'normal',
+    priority_rank INTEGER NOT NULL DEFAULT 2,
+    deadline REAL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    completed_at REAL,
+    PRIMARY KEY (run_id, document_id)
+);
+CREATE INDEX IF NOT EXISTS documents_claim ON documents (run_id, status, priority_rank, deadline, seq);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    run_id TEXT,
+    host TEXT,
+    pid INTEGER,
+    started_at REAL,
+    heartbeat_at REAL,
+    documents_completed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class WorkQueue:
+    """SQLite work queue shared by the worker processes of a queue directory."""
+
+    def __init__(self, queue_dir: str):
+        os.makedirs(queue_dir, exist_ok=True)
+        self.path = os.path.join(os.path.abspath(queue_dir), QUEUE_FILENAME)
+        # One connection per process, used by the worker's event loop and its heartbeat
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            self.path, timeout=WORK_QUEUE_BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False
+        )
+        self.connection.row_factory = sqlite3.Row
+        if WORK_QUEUE_WAL:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.transaction() as db:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    db.execute(statement)
+
+    @contextmanager
+    def transaction(self):
+        """Run statements in one write transaction; other processes wait for it (busy timeout)."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def enqueue(self, run_id: str, input_dir: str, documents: list, document_glob: str = None) -> int:
+        """
+        Add a run and its documents.
+
+        Args:
+            run_id: Identifier of the run
+            input_dir: Directory every worker reads the documents from (same path on every host)
+            documents: Dicts with document_id and optionally size, mod_time, priority and deadline
+            document_glob: Pattern the documents were selected with
+
+        Returns:
+            Number of documents added (documents already queued for the run are kept)
+        """
+        now = time.time()
+        with self.transaction() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO runs (run_id, input_dir, document_glob, status, created_at) VALUES (?, ?, ?, 'running', ?)",
+                (run_id, os.path.abspath(input_dir), document_glob, now),
+            )
+            added = 0
+            for seq, doc in enumerate(documents):
+                priority = doc.get("priority") or "normal"
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO documents (run_id, document_id, seq, size, mod_time, priority, priority_rank, deadline) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, doc["document_id"], seq, doc.get("size"), doc.get("mod_time"),
+                     priority, PRIORITY_ORDER.get(priority, PRIORITY_ORDER["normal"]), doc.get("deadline")),
+                )
+                added += cursor.rowcount
+            if added:
+                # New documents reopen a run whose report was already written
+                db.execute("UPDATE runs SET status = 'running', finished_at = NULL WHERE run_id = ?", (run_id,))
+        return added
+
+    def get_run(self, run_id: str = None) -> Optional[dict]:
+        """Return a run, or the most recent unfinished one (else the most recent) if run_id is None."""
+        with self.lock:
+            if run_id is not None:
+                row = self.connection.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            else:
+                row = self.connection.execute(
+                    "SELECT * FROM runs ORDER BY status = 'completed', created_at DESC LIMIT 1"
+                ).fetchone()
+        return dict(row) if row else None
+
+    def register_worker(self, worker_id: str, run_id: str, host: str, pid: int):
+        now = time.time()
+        with self.transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, run_id, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (worker_id, run_id, host, pid, now, now),
+            )
+
+    def _requeue_expired(self, db, run_id: str, now: float):
+        """Put documents whose lease ran out back in the queue (or fail them after too many attempts)."""
+        expired = db.execute(
+            "SELECT document_id, worker, attempts FROM documents WHERE run_id = ? AND status = 'processing' AND lease_expires < ?",
+            (run_id, now),
+        ).fetchall()
+        for row in expired:
+            failed = row["attempts"] >= WORK_QUEUE_MAX_ATTEMPTS
+            db.execute(
+                "UPDATE documents SET status = ?, worker = NULL, lease_expires = NULL, error = ? WHERE run_id = ? AND document_id = ?",
+                ("failed" if failed else "pending", f"lease of {row['worker']} expired", run_id, row["document_id"]),
+            )
+            print(f"[WorkQueue] Lease of {row['worker']} on '{row['document_id']}' expired"
+                  + (f"; failed after {row['attempts']} attempt(s)" if failed else "; requeued"))
+
+    def claim(self, run_id: str, worker_id: str, limit: int, lease_seconds: float = WORK_QUEUE_LEASE_SECONDS) -> list:
+        """
+        Claim up to limit pending documents, most urgent first.
+
+        Returns:
+            Claimed document rows (dicts)
+        """
+        now = time.time()
+        with self.transaction() as db:
+            self._requeue_expired(db, run_id, now)
+            rows = db.execute(
+                "SELECT * FROM documents WHERE run_id = ? AND status = 'pending' "
+                "ORDER BY priority_rank, deadline IS NULL, deadline, seq LIMIT ?",
+                (run_id, limit),
+            ).fetchall()
+            for row in rows:
+                db.execute(
+                    "UPDATE documents SET status = 'processing', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE run_id = ? AND document_id = ?",
+                    (worker_id, now + lease_seconds, run_id, row["document_id"]),
+                )
+            db.execute("UPDATE workers SET heartbeat_at = ?, run_id = ? WHERE worker_id = ?", (now, run_id, worker_id))
+        return [dict(row) for row in rows]
+
+    def heartbeat(self, run_id: str, worker_id: str, lease_seconds: float = WORK_QUEUE_LEASE_SECONDS) -> int:
+        """
+        Extend the leases of every document (and the synthesis) the worker holds.
+
+        Returns:
+            Number of documents whose lease was extended
+        """
+        now = time.time()
+        with self.transaction() as db:
+            extended = db.execute(
+                "UPDATE documents SET lease_expires = ? WHERE run_id = ? AND worker = ? AND status = 'processing'",
+                (now + lease_seconds, run_id, worker_id),
+            ).rowcount
+            db.execute(
+                "UPDATE runs SET synthesis_lease_expires = ? WHERE run_id = ? AND status = 'synthesizing' AND synthesis_worker = ?",
+                (now + lease_seconds, run_id, worker_id),
+            )
+            db.execute("UPDATE workers SET heartbeat_at = ? WHERE worker_id = ?", (now, worker_id))
+        return extended
+
+    def complete(self, run_id: str, worker_id: str, document_ids: list) -> int:
+        """Mark documents the worker still holds as completed; returns how many were."""
+        now = time.time()
+        with self.transaction() as db:
+            completed = 0
+            for document_id in document_ids:
+                completed += db.execute(
+                    "UPDATE documents SET status = 'completed', completed_at = ?, lease_expires = NULL, error = NULL "
+                    "WHERE run_id = ? AND document_id = ? AND worker = ? AND status = 'processing'",
+                    (now, run_id, document_id, worker_id),
+                ).rowcount
+            db.execute(
+                "UPDATE workers SET documents_completed = documents_completed + ?, heartbeat_at = ? WHERE worker_id = ?",
+                (completed, now, worker_id),
+            )
+        return completed
+
+    def fail(self, run_id: str, worker_id: str, document_ids: list, error: str) -> int:
+        """Return documents the worker could not analyze to the queue, failing them after too many attempts."""
+        with self.transaction() as db:
+            failed = 0
+            for document_id in document_ids:
+                for status, condition in (("failed", "attempts >= ?"), ("pending", "attempts < ?")):
+                    changed = db.execute(
+                        "UPDATE documents SET status = ?, worker = NULL, lease_expires = NULL, error = ? "
+                        f"WHERE run_id = ? AND document_id = ? AND worker = ? AND status = 'processing' AND {condition}",
+                        (status, error, run_id, document_id, worker_id, WORK_QUEUE_MAX_ATTEMPTS),
+                    ).rowcount
+                    if status == "failed":
+                        failed += changed
+        return failed
+
+    def release(self, run_id: str, worker_id: str):
+        """Return every document the worker holds to the queue without counting the attempt (clean shutdown)."""
+        with self.transaction() as db:
+            db.execute(
+                "UPDATE documents SET status = 'pending', worker = NULL, lease_expires = NULL, attempts = MAX(attempts - 1, 0) "
+                "WHERE run_id = ? AND worker = ? AND status = 'processing'",
+                (run_id, worker_id),
+            )
+            db.execute(
+                "UPDATE runs SET status = 'running', synthesis_worker = NULL, synthesis_lease_expires = NULL "
+                "WHERE run_id = ? AND status = 'synthesizing' AND synthesis_worker = ?",
+                (run_id, worker_id),
+            )
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def counts(self, run_id: str) -> dict:
+        """Count a run's documents by status."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT status, COUNT(*) FROM documents WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall()
+        counts = {"pending": 0, "processing": 0, "completed": 0, "failed": 0}
+        counts.update({status: count for status, count in rows})
+        counts["total"] = sum(count for _, count in rows)
+        return counts
+
+    def documents(self, run_id: str) -> list:
+        """Every document row of a run, in enqueue order."""
+        with self.lock:
+            rows = self.connection.execute("SELECT * FROM documents WHERE run_id = ? ORDER BY seq", (run_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def workers(self, run_id: str) -> list:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM workers WHERE run_id = ? ORDER BY started_at", (run_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_synthesis(self, run_id: str, worker_id: str, lease_seconds: float = WORK_QUEUE_LEASE_SECONDS) -> bool:
+        """
+        Take the run's synthesis once the queue has drained.
+
+        Exactly one worker gets True; the synthesis moves to another worker
+        only if the holder's lease expires.
+        """
+        now = time.time()
+        with self.transaction() as db:
+            self._requeue_expired(db, run_id, now)
+            busy = db.execute(
+                "SELECT COUNT(*) FROM documents WHERE run_id = ? AND status IN ('pending', 'processing')", (run_id,)
+            ).fetchone()[0]
+            if busy:
+                return False
+            return db.execute(
+                "UPDATE runs SET status = 'synthesizing', synthesis_worker = ?, synthesis_lease_expires = ? "
+                "WHERE run_id = ? AND (status = 'running' OR (status = 'synthesizing' AND synthesis_lease_expires < ?))",
+                (worker_id, now + lease_seconds, run_id, now),
+            ).rowcount == 1
+
+    def finish_run(self, run_id: str, worker_id: str, report: str) -> bool:
+        """Store the run's report and mark it completed (only by the worker holding the synthesis)."""
+        with self.transaction() as db:
+            return db.execute(
+                "UPDATE runs SET status = 'completed', finished_at = ?, report = ?, synthesis_lease_expires = NULL "
+                "WHERE run_id = ? AND status = 'synthesizing' AND synthesis_worker = ?",
+                (time.time(), report, run_id, worker_id),
+            ).rowcount == 1
@@ -0,0 +1,82 @@
+"""Workspaces - where a pipeline run reads its documents and keeps its state.
+
+A run started with ``adk run`` / ``adk web`` has no workspace: documents come
+from example_data and the trackers (processing_tracker.json,
+work_assignments.json, partial_reports/, checkpoints/) live next to it.
+
+The job service runs every job in its own workspace (and the batch CLI its run): documents come from the
+job's input directory and its trackers live in the job's state directory.
+The process-wide registries (chunk cursors, seek index, dedup signatures,
+salience budget, corpus index) key their entries by workspace, so jobs
+running concurrently share the caches and model connections but never each
+other's documents.
+
+The active workspace is a context variable, so it follows a job into the
+asyncio tasks ADK creates for it. Work handed to a thread pool must be
+wrapped with bind_workspace to keep it.
+"""
+
+import contextvars
+import functools
+import os
+from typing import Optional
+
+_current_workspace = contextvars.ContextVar("workspace", default=None)
+
+
+class Workspace:
+    """Input directory and state directory of one job (or batch run)."""
+
+    def __init__(self, workspace_id: str, data_dir: str, state_dir: str, document_glob: Optional[str] = None):
+        self.workspace_id = workspace_id
+        self.data_dir = os.path.abspath(data_dir)
+        self.state_dir = os.path.abspath(state_dir)
+        # Only documents whose id matches this pattern are listed (None: all)
+        self.document_glob = document_glob
+
+    def __repr__(self) -> str:
+        return f"Workspace({self.workspace_id!r}, data_dir={self.data_dir!r})"
+
+
+def get_workspace() -> Optional[Workspace]:
+    """Return the workspace of the current run, or None outside the job service."""
+    return _current_workspace.get()
+
+
+def set_workspace(workspace: Optional[Workspace]):
+    """Make workspace current for this context (and the tasks it creates); returns a reset token."""
+    return _current_workspace.set(workspace)
+
+
+def reset_workspace(token):
+    """Restore the workspace that was current before set_workspace returned token."""
+    _current_workspace.reset(token)
+
+
+def workspace_id() -> Optional[str]:
+    """Return the id of the current workspace, or None outside the job service."""
+    workspace = _current_workspace.get()
+    return workspace.workspace_id if workspace is not None else None
+
+
+def scoped_key(key: str) -> str:
+    """Qualify a registry key (agent_id, document_id) with the current workspace."""
+    workspace = _current_workspace.get()
+    return key if workspace is None else f"{workspace.workspace_id}/{key}"
+
+
+def get_project_dir() -> str:
+    """Return the E3_Parellelization package directory."""
+    tools_dir = os.path.dirname(__file__)
+    return os.path.dirname(tools_dir)
+
+
+def get_state_dir() -> str:
+    """Return the directory holding the trackers of the current run."""
+    workspace = _current_workspace.get()
+    return workspace.state_dir if workspace is not None else get_project_dir()
+
+
+def bind_workspace(func):
+    """Wrap func to run in a copy of the current context (and workspace), e.g. on a thread pool."""
+    return functools.partial(contextvars.copy_context().run, func)
@@ -0,0 +1,382 @@
+"""Queue workers - several processes, on one or more hosts, analyze one run together.
+
+One pipeline process runs one ParallelAgent on one core. To go further, put
+the documents of a run in a work queue on a filesystem every host mounts and
+start as many worker processes as the hosts and the model quota allow:
+
+    python -m E3_Parellelization.worker enqueue /shared/reports --queue /shared/e3-queue --glob "*.txt"
+    python -m E3_Parellelization.worker work --queue /shared/e3-queue --concurrency 8     # on every host, N times
+    python -m E3_Parellelization.worker status --queue /shared/e3-queue
+
+The input directory must have the same path on every host. Each worker claims
+a few documents at a time (most urgent first, see --schedule), runs the
+DocumentAnalyzer pipeline on them with synthesis deferred, and marks them
+completed in the queue as their analyzers finish. The analyses go to the
+queue directory's result store (sqlite), so every worker writes to the same
+run. Claims are leases kept alive by a heartbeat; the documents of a worker
+that dies are claimed again by the others once the lease expires.
+
+When the queue has drained, exactly one worker runs the synthesis over the
+stored analyses and writes the report to reports/<run_id>.md in the queue
+directory (and to --report). The other workers exit once the run is
+completed, so throughput grows with the number of worker processes.
+
+Duplicate detection and the corpus index are per worker process.
+
+Exit status:
+    0  the run completed and every document was analyzed
+    1  some documents failed, or the worker stopped before the run completed
+    2  invalid arguments
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+
+from .batch import EXIT_FAILURES, EXIT_OK, EXIT_USAGE, apply_schedule, configure_environment, load_schedule, resolve_input
+
+APP_NAME = "E3_Parellelization_worker"
+# Seconds an idle worker waits before looking for expired leases or the synthesis again
+POLL_INTERVAL_SECONDS = float(os.getenv("WORKER_POLL_INTERVAL_SECONDS", "5"))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m E3_Parellelization.worker",
+        description="Analyze a run's documents with worker processes that share a SQLite work queue.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add the documents of a directory to the queue as a run")
+    enqueue.add_argument("input", help="Input directory, or a single document (same path on every worker host)")
+    enqueue.add_argument("--queue", required=True, help="Queue directory on the shared filesystem")
+    enqueue.add_argument("--glob", default=None, help="Only enqueue documents matching this pattern (e.g. '*.txt')")
+    enqueue.add_argument("--run-id", default=None, help="Run to add the documents to (default: a new run)")
+    enqueue.add_argument("--schedule", default=None,
+                         help="JSON file of document (or glob) -> {priority, deadline}, as for the batch CLI")
+
+    work = commands.add_parser("work", help="Claim and analyze documents until the run is completed")
+    work.add_argument("--queue", required=True, help="Queue directory on the shared filesystem")
+    work.add_argument("--run-id", default=None, help="Run to work on (default: the most recent unfinished run)")
+    work.add_argument("--claim", type=int, default=None,
+                      help="Documents claimed at a time (default: two per DocumentAnalyzer)")
+    work.add_argument("--lease-seconds", type=float, default=None,
+                      help="Lease of a claim; a heartbeat renews it every third of it (WORK_QUEUE_LEASE_SECONDS)")
+    work.add_argument("--no-wait", action="store_true",
+                      help="Exit when nothing is left to claim instead of waiting for other workers to finish")
+    work.add_argument("--report", default=None, help="Write the run's report to this file if this worker writes it")
+    work.add_argument("--log", default=None, help="Write the pipeline's log lines to this file")
+    work.add_argument("--concurrency", type=int, default=None,
+                      help="DocumentAnalyzers running in parallel in this worker (NUM_SUMMARIZE_AGENTS)")
+    work.add_argument("--autoscale", action="store_true", help="Size the analyzer pool per iteration (ANALYZER_AUTOSCALING)")
+    work.add_argument("--chunk-size", type=int, default=None, help="Characters per chunk (CHUNK_SIZE)")
+    work.add_argument("--overlap", type=float, default=None, help="Chunk overlap as a fraction (CHUNK_OVERLAP_PERCENTAGE)")
+    work.add_argument("--model", action="append", default=[], metavar="[STAGE=]MODEL",
+                      help="Model or tier for every stage, or for one stage (e.g. chunk_analysis=fast); repeatable")
+    work.add_argument("--max-iterations", type=int, default=None,
+                      help="Assign-and-analyze rounds per claim (FILE_PROCESSING_MAX_ITERATIONS)")
+    work.add_argument("--metrics-port", type=int, default=None,
+                      help="Serve live Prometheus metrics on this port, one per worker on a host (METRICS_PORT)")
+
+    status = commands.add_parser("status", help="Print the progress of a run as JSON")
+    status.add_argument("--queue", required=True, help="Queue directory on the shared filesystem")
+    status.add_argument("--run-id", default=None, help="Run to report (default: the most recent unfinished run)")
+    return parser.parse_args(argv)
+
+
+def enqueue(args: argparse.Namespace) -> int:
+    from .tools.document_source import list_documents
+    from .tools.work_queue import WorkQueue
+    from .tools.workspace import Workspace, reset_workspace, set_workspace
+
+    try:
+        data_dir, document_glob = resolve_input(args.input, args.glob)
+        schedule = load_schedule(args.schedule) if args.schedule else {}
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    token = set_workspace(Workspace("enqueue", data_dir, args.queue, document_glob))
+    try:
+        documents = list_documents()
+    finally:
+        reset_workspace(token)
+    if not documents:
+        print(f"[Worker] No documents in {data_dir}" + (f" match '{document_glob}'" if document_glob else ""),
+              file=sys.stderr)
+        return EXIT_FAILURES
+
+    tasks = apply_schedule([{"filename": doc["document_id"]} for doc in documents], schedule)
+    queue = WorkQueue(args.queue)
+    run_id = args.run_id or f"run-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    added = queue.enqueue(run_id, data_dir, [
+        {**doc, "priority": task.get("priority"), "deadline": task.get("deadline")}
+        for doc, task in zip(documents, tasks)
+    ], document_glob)
+    queue.close()
+    print(f"[Worker] Enqueued {added} of {len(documents)} document(s) from {data_dir} as {run_id}", file=sys.stderr)
+    print(run_id)
+    return EXIT_OK
+
+
+def status(args: argparse.Namespace) -> int:
+    from .tools.work_queue import WorkQueue
+
+    queue = WorkQueue(args.queue)
+    run = queue.get_run(args.run_id)
+    if run is None:
+        print("error: no such run in the queue", file=sys.stderr)
+        return EXIT_USAGE
+    now = time.time()
+    report = {
+        "run_id": run["run_id"],
+        "status": run["status"],
+        "input_dir": run["input_dir"],
+        "documents": queue.counts(run["run_id"]),
+        "synthesis_worker": run["synthesis_worker"],
+        "workers": [
+            {
+                "worker_id": worker["worker_id"],
+                "host": worker["host"],
+                "documents_completed": worker["documents_completed"],
+                "heartbeat_age_seconds": round(now - worker["heartbeat_at"], 1),
+            }
+            for worker in queue.workers(run["run_id"])
+        ],
+        "failed": [
+            {"document_id": doc["document_id"], "attempts": doc["attempts"], "error": doc["error"]}
+            for doc in queue.documents(run["run_id"]) if doc["status"] == "failed"
+        ],
+    }
+    queue.close()
+    print(json.dumps(report, indent=2))
+    return EXIT_OK
+
+
+class QueueWorker:
+    """Claims documents of one run, analyzes them with the pipeline and reports back to the queue."""
+
+    def __init__(self, queue, run: dict, root_agent, claim_size: int, lease_seconds: float, wait: bool = True):
+        from google.adk.runners import InMemoryRunner
+
+        self.queue = queue
+        self.run_id = run["run_id"]
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.runner = InMemoryRunner(agent=root_agent, app_name=APP_NAME)
+        self.claim_size = claim_size
+        self.lease_seconds = lease_seconds
+        self.wait = wait
+        self.completed = 0
+        self.report = None
+
+    def live_metrics(self) -> list:
+        """Queue depth of the run for the live metrics endpoint (shared by all workers)."""
+        counts = self.queue.counts(self.run_id)
+        return [
+            ("e3_work_queue_documents", "gauge", "Documents of the run per work queue status.",
+             [({"run": self.run_id, "status": status}, count) for status, count in counts.items() if status != "total"]),
+            ("e3_worker_documents_completed_total", "counter", "Documents this worker analyzed.", [({}, self.completed)]),
+        ]
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.queue.heartbeat, self.run_id, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                # A missed heartbeat only shortens the lease; the next one may get through
+                print(f"[Worker] WARNING: Heartbeat failed: {e}", file=sys.stderr)
+
+    async def _run_pipeline(self, state: dict, on_todo_list=None) -> dict:
+        """Run the pipeline in a fresh session seeded with state; returns the final session state."""
+        from google.genai import types
+
+        session_service = self.runner.session_service
+        session = await session_service.create_session(app_name=APP_NAME, user_id=self.worker_id, state=state)
+        message = types.Content(role="user", parts=[types.Part(text="Analyze the claimed documents.")])
+        try:
+            async for event in self.runner.run_async(user_id=self.worker_id, session_id=session.id, new_message=message):
+                delta = event.actions.state_delta if event.actions else None
+                if on_todo_list is not None and delta and delta.get("todo_list_result") is not None:
+                    await on_todo_list(delta["todo_list_result"])
+            session = await session_service.get_session(app_name=APP_NAME, user_id=self.worker_id, session_id=session.id)
+            return dict(session.state)
+        finally:
+            await session_service.delete_session(app_name=APP_NAME, user_id=self.worker_id, session_id=session.id)
+
+    async def analyze(self, claimed: list):
+        """Analyze claimed documents, marking each completed in the queue as soon as its analyzer finishes."""
+        from .agents.file_todo_list_agent import SEEDED_TODO_LIST_KEY, build_todo_list
+        from .agents.synthesis_agent import DEFER_SYNTHESIS_KEY
+        from .agents.utils import parse_todo_list
+        from .tools.result_store import RESULT_RUN_ID_KEY
+
+        claimed_ids = [row["document_id"] for row in claimed]
+        todo_list = build_todo_list([{"document_id": row["document_id"], "mod_time": row["mod_time"]} for row in claimed])
+        for task, row in zip(todo_list, claimed):
+            task["priority"], task["deadline"] = row["priority"], row["deadline"]
+        reported = set()
+
+        async def report_completed(todo_list_value):
+            done = [
+                task["filename"] for task in parse_todo_list(todo_list_value)
+                if isinstance(task, dict) and task.get("status") == "completed"
+                and task.get("filename") in claimed_ids and task["filename"] not in reported
+            ]
+            if done:
+                reported.update(done)
+                self.completed += await asyncio.to_thread(self.queue.complete, self.run_id, self.worker_id, done)
+
+        print(f"[Worker] {self.worker_id} claimed {len(claimed)} document(s) of {self.run_id}", file=sys.stderr)
+        error = None
+        try:
+            await self._run_pipeline(
+                {SEEDED_TODO_LIST_KEY: todo_list, RESULT_RUN_ID_KEY: self.run_id, DEFER_SYNTHESIS_KEY: True},
+                on_todo_list=report_completed,
+            )
+        except Exception as e:
+            error = f"pipeline failed on {self.worker_id}: {type(e).__name__}: {e}"
+            print(f"[Worker] ERROR: {error}", file=sys.stderr)
+        left = [document_id for document_id in claimed_ids if document_id not in reported]
+        if left:
+            failed = await asyncio.to_thread(
+                self.queue.fail, self.run_id, self.worker_id, left, error or f"not analyzed by {self.worker_id}"
+            )
+            print(f"[Worker] {len(left)} claimed document(s) not analyzed, {failed} failed for good", file=sys.stderr)
+
+    async def synthesize(self):
+        """Write the run's report from the analyses every worker stored."""
+        from .agents.file_todo_list_agent import SEEDED_TODO_LIST_KEY
+        from .tools.result_store import RESULT_RUN_ID_KEY
+
+        documents = await asyncio.to_thread(self.queue.documents, self.run_id)
+        todo_list = [
+            {
+                "filename": doc["document_id"],
+                "moddt": doc["mod_time"],
+                "status": doc["status"],
+                "processed_at": doc["completed_at"],
+                "assigned_agent": None,
+            }
+            for doc in documents
+        ]
+        print(f"[Worker] {self.worker_id} is synthesizing {self.run_id} ({len(documents)} document(s))", file=sys.stderr)
+        # Every document is completed or failed, so the loop stops at once and only the synthesis runs
+        state = await self._run_pipeline({SEEDED_TODO_LIST_KEY: todo_list, RESULT_RUN_ID_KEY: self.run_id})
+        report = state.get("synthesized_report") or ""
+        if await asyncio.to_thread(self.queue.finish_run, self.run_id, self.worker_id, report):
+            self.report = report
+            path = os.path.join(os.path.dirname(self.queue.path), "reports", f"{self.run_id}.md")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(report)
+            print(f"[Worker] Report of {self.run_id} written to {path}", file=sys.stderr)
+
+    async def work(self) -> bool:
+        """
+        Claim and analyze documents until the run is completed.
+
+        Returns:
+            True if the run is completed
+        """
+        await asyncio.to_thread(self.queue.register_worker, self.worker_id, self.run_id, socket.gethostname(), os.getpid())
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat())
+        try:
+            while True:
+                claimed = await asyncio.to_thread(
+                    self.queue.claim, self.run_id, self.worker_id, self.claim_size, self.lease_seconds
+                )
+                if claimed:
+                    await self.analyze(claimed)
+                    continue
+                if await asyncio.to_thread(self.queue.claim_synthesis, self.run_id, self.worker_id, self.lease_seconds):
+                    await self.synthesize()
+                run = await asyncio.to_thread(self.queue.get_run, self.run_id)
+                if run["status"] == "completed" or not self.wait:
+                    return run["status"] == "completed"
+                # Other workers still hold documents; one of their leases may expire
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        finally:
+            heartbeat.cancel()
+            # Anything still held goes back to the queue at once instead of after the lease
+            await asyncio.to_thread(self.queue.release, self.run_id, self.worker_id)
+
+
+def work(args: argparse.Namespace) -> int:
+    if args.claim is not None and args.claim < 1:
+        print("error: --claim must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    if args.lease_seconds is not None and args.lease_seconds < 3:
+        print("error: --lease-seconds must be at least 3", file=sys.stderr)
+        return EXIT_USAGE
+    if os.getenv("RESULT_STORE_ENABLED", "1") != "1":
+        print("error: workers write their analyses to the result store (RESULT_STORE_ENABLED=1)", file=sys.stderr)
+        return EXIT_USAGE
+    # Every worker writes its analyses to the queue directory's store; JSONL cannot take concurrent writers
+    os.environ["RESULT_STORE_DIR"] = os.path.abspath(args.queue)
+    os.environ["RESULT_STORE_BACKEND"] = "sqlite"
+    try:
+        configure_environment(args)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    from .tools.chunking import release_workspace
+    from .tools.live_metrics import register_collector
+    from .tools.result_store import close_result_store
+    from .tools.work_queue import WORK_QUEUE_LEASE_SECONDS, WorkQueue
+    from .tools.workspace import Workspace, reset_workspace, set_workspace
+
+    queue = WorkQueue(args.queue)
+    run = queue.get_run(args.run_id)
+    if run is None:
+        print("error: no such run in the queue; enqueue one first", file=sys.stderr)
+        return EXIT_USAGE
+
+    worker_dir = os.path.join(os.path.abspath(args.queue), "workers", f"{socket.gethostname()}-{os.getpid()}")
+    os.makedirs(worker_dir, exist_ok=True)
+    # The worker's trackers stay private; only the queue and the result store are shared
+    token = set_workspace(Workspace("worker", run["input_dir"], worker_dir, run["document_glob"]))
+    log = open(args.log, "a", encoding="utf-8") if args.log else None
+    try:
+        with contextlib.redirect_stdout(log) if log is not None else contextlib.nullcontext():
+            from .agent import root_agent, NUM_SUMMARIZE_AGENTS
+            worker = QueueWorker(
+                queue,
+                run,
+                root_agent,
+                claim_size=args.claim or 2 * NUM_SUMMARIZE_AGENTS,
+                lease_seconds=args.lease_seconds or WORK_QUEUE_LEASE_SECONDS,
+                wait=not args.no_wait,
+            )
+            register_collector(worker.live_metrics)
+            completed = asyncio.run(worker.work())
+        if worker.report is not None and args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(worker.report)
+        counts = queue.counts(run["run_id"])
+        print(f"[Worker] {worker.worker_id} analyzed {worker.completed} document(s); run {run['run_id']}: "
+              f"{counts['completed']}/{counts['total']} completed, {counts['failed']} failed", file=sys.stderr)
+        return EXIT_OK if completed and counts["failed"] == 0 else EXIT_FAILURES
+    finally:
+        reset_workspace(token)
+        release_workspace("worker")
+        close_result_store(os.path.abspath(args.queue))
+        queue.close()
+        if log is not None:
+            log.close()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    return {"enqueue": enqueue, "work": work, "status": status}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""Local stand-in for the Gemini generateContent API, for load and chaos testing.
+
+Speaks enough of the Gemini REST protocol (generateContent and
+streamGenerateContent with alt=sse) for ADK LlmAgents to run against it:
+
+- latency drawn from a configurable distribution (fixed, uniform, exponential
+  or lognormal), globally or per model
+- throughput limits: requests per minute and concurrent requests, answered
+  with 429 RESOURCE_EXHAUSTED like the real API
+- random 429/500/503 injection
+- scripted responses: rules matched on the request (model, instruction,
+  declared tools, last tool result, ...) answer with templated text or a
+  function call, e.g. get_next_chunk_async or exit_loop
+
+Rules are tried in order; the first whose 'when' conditions all hold answers
+with 'text' (a $-template), 'function_call' ({"name", "args"}) or 'status'
+(a scripted error). Conditions: model (glob), instruction_contains,
+text_contains, tool_declared, tool_not_called, last_tool,
+tool_response_contains, after_tool (true/false) and probability. Template
+variables: $model, $request_number, $last_user_text, $last_tool,
+$last_tool_response, $chunk_content and $random_id.
+
+Usage:
+    python gemini-standin/server.py --port 8089 --scenario gemini-standin/scenarios/e3_pipeline.json
+    GEMINI_STANDIN_URL=http://127.0.0.1:8089 adk web
+
+GET /stats returns request counters as JSON; POST /stats/reset clears them.
+"""
+
+import argparse
+import fnmatch
+import json
+import random
+import re
+import string
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROUTE = re.compile(r"^/(?P<version>[^/]+)/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)$")
+
+ERROR_STATUS = {
+    400: "INVALID_ARGUMENT",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+DEFAULT_SCENARIO = {
+    "latency": {"distribution": "lognormal", "median_ms": 800, "sigma": 0.5, "max_ms": 30000},
+    "models": {},
+    "requests_per_minute": 0,
+    "max_concurrency": 0,
+    "errors": {},
+    "rules": [],
+    "default_response": {"text": "Stand-in response from $model (request $request_number)."},
+}
+
+
+class StandinState:
+    """Scenario and counters shared by all handler threads."""
+    scenario = dict(DEFAULT_SCENARIO)
+    rng = random.Random()
+    lock = threading.Lock()
+    request_times = deque()
+    in_flight = 0
+    stats = {}
+
+    @classmethod
+    def reset_stats(cls):
+        with cls.lock:
+            cls.stats = {"requests": 0, "by_status": {}, "by_model": {}, "by_rule": {},
+                         "peak_in_flight": 0, "latency_ms_total": 0.0, "started_at": time.time()}
+
+
+def sample_latency(spec: dict) -> float:
+    """Draw a latency in seconds from a distribution spec."""
+    rng = StandinState.rng
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "uniform":
+        ms = rng.uniform(spec.get("min_ms", 0), spec.get("max_ms", 1000))
+    elif distribution == "exponential":
+        ms = rng.expovariate(1.0 / max(spec.get("mean_ms", 500), 1e-9))
+    elif distribution == "lognormal":
+        ms = rng.lognormvariate(0, spec.get("sigma", 0.5)) * spec.get("median_ms", 500)
+    else:
+        ms = spec.get("ms", spec.get("median_ms", 0))
+    ms = max(ms, spec.get("min_ms", 0))
+    if "max_ms" in spec:
+        ms = min(ms, spec["max_ms"])
+    return ms / 1000.0
+
+
+def _texts(content: dict) -> list:
+    return [part["text"] for part in content.get("parts", []) if isinstance(part.get("text"), str)]
+
+
+def describe_request(model: str, body: dict) -> dict:
+    """Pull out the request features that rules match on and templates can use."""
+    contents = body.get("contents") or []
+    instruction = " ".join(_texts(body.get("systemInstruction") or body.get("system_instruction") or {}))
+    tools = [
+        declaration.get("name")
+        for tool in body.get("tools") or []
+        for declaration in tool.get("functionDeclarations") or tool.get("function_declarations") or []
+    ]
+    last_parts = contents[-1].get("parts", []) if contents else []
+    last_response = next(
+        (part.get("functionResponse") or part.get("function_response") for part in reversed(last_parts)
+         if part.get("functionResponse") or part.get("function_response")),
+        None,
+    )
+    user_texts = [text for content in contents if content.get("role") == "user" for text in _texts(content)]
+    called = [
+        (part.get("functionCall") or part.get("function_call") or {}).get("name")
+        for content in contents for part in content.get("parts", [])
+        if part.get("functionCall") or part.get("function_call")
+    ]
+    return {
+        "model": model,
+        "instruction": instruction,
+        "tools": tools,
+        "tools_called": called,
+        "last_tool": last_response.get("name") if last_response else "",
+        "last_tool_response": last_response.get("response") if last_response else None,
+        "last_user_text": user_texts[-1] if user_texts else "",
+        "all_text": instruction + "\n" + "\n".join(user_texts),
+    }
+
+
+def rule_matches(when: dict, request: dict) -> bool:
+    """Return True if every condition of a rule's 'when' clause holds for the request."""
+    if "model" in when and not fnmatch.fnmatch(request["model"], when["model"]):
+        return False
+    if "instruction_contains" in when and when["instruction_contains"] not in request["instruction"]:
+        return False
+    if "text_contains" in when and when["text_contains"] not in request["all_text"]:
+        return False
+    if "tool_declared" in when and when["tool_declared"] not in request["tools"]:
+        return False
+    if "last_tool" in when and request["last_tool"] != when["last_tool"]:
+        return False
+    if "tool_response_contains" in when and when["tool_response_contains"] not in json.dumps(request["last_tool_response"]):
+        return False
+    if when.get("after_tool") is True and not request["last_tool"]:
+        return False
+    if when.get("after_tool") is False and request["last_tool"]:
+        return False
+    if "tool_not_called" in when and when["tool_not_called"] in request["tools_called"]:
+        return False
+    if "probability" in when and StandinState.rng.random() >= when["probability"]:
+        return False
+    return True
+
+
+def _render(value, variables: dict):
+    if isinstance(value, str):
+        return string.Template(value).safe_substitute(variables)
+    if isinstance(value, dict):
+        return {key: _render(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_render(item, variables) for item in value]
+    return value
+
+
+def choose_response(request: dict) -> tuple:
+    """Return (rule name, response spec) of the first matching rule, or the default response."""
+    for index, rule in enumerate(StandinState.scenario.get("rules", [])):
+        if rule_matches(rule.get("when", {}), request):
+            return rule.get("name", f"rule_{index}"), rule
+    return "default", StandinState.scenario.get("default_response", DEFAULT_SCENARIO["default_response"])
+
+
+def build_response(request: dict, spec: dict, request_number: int) -> dict:
+    """Build a GenerateContentResponse body from a response spec."""
+    tool_response = request["last_tool_response"]
+    variables = {
+        "model": request["model"],
+        "request_number": request_number,
+        "last_user_text": request["last_user_text"],
+        "last_tool": request["last_tool"],
+        "last_tool_response": json.dumps(tool_response) if tool_response is not None else "",
+        "chunk_content": (tool_response or {}).get("chunk_content", "") if isinstance(tool_response, dict) else "",
+        "random_id": uuid.uuid4().hex[:8],
+    }
+    if "function_call" in spec:
+        call = _render(spec["function_call"], variables)
+        parts = [{"functionCall": {"name": call["name"], "args": call.get("args", {})}}]
+        output_text = json.dumps(call)
+    else:
+        text = _render(spec.get("text", ""), variables)
+        parts = [{"text": text}]
+        output_text = text
+    # Roughly four characters per token, like the real tokenizer on English text
+    prompt_tokens = max(1, len(request["all_text"]) // 4)
+    output_tokens = max(1, len(output_text) // 4)
+    return {
+        "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+        "modelVersion": request["model"],
+        "responseId": uuid.uuid4().hex,
+    }
+
+
+def admit(model: str) -> tuple:
+    """
+    Apply throughput limits and error injection to a new request.
+
+    Returns:
+        (request_number, error status code or None, error message)
+    """
+    scenario = StandinState.scenario
+    now = time.monotonic()
+    with StandinState.lock:
+        stats = StandinState.stats
+        stats["requests"] += 1
+        stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+        request_number = stats["requests"]
+
+        rpm = scenario.get("requests_per_minute", 0)
+        if rpm:
+            while StandinState.request_times and now - StandinState.request_times[0] > 60:
+                StandinState.request_times.popleft()
+            if len(StandinState.request_times) >= rpm:
+                return request_number, 429, f"Quota exceeded: {rpm} requests per minute"
+            StandinState.request_times.append(now)
+
+        limit = scenario.get("max_concurrency", 0)
+        if limit and StandinState.in_flight >= limit:
+            return request_number, 429, f"Quota exceeded: {limit} concurrent requests"
+        StandinState.in_flight += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], StandinState.in_flight)
+
+    for code, rate in scenario.get("errors", {}).items():
+        if StandinState.rng.random() < rate:
+            release()
+            return request_number, int(code), f"Injected {code} from the Gemini stand-in"
+    return request_number, None, None
+
+
+def release():
+    with StandinState.lock:
+        StandinState.in_flight -= 1
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Handles generateContent, streamGenerateContent and /stats."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if StandinState.scenario.get("access_log"):
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, key: str, value):
+        with StandinState.lock:
+            counters = StandinState.stats[key]
+            counters[str(value)] = counters.get(str(value), 0) + 1
+
+    def _send_error(self, code: int, message: str):
+        self._count("by_status", code)
+        status = ERROR_STATUS.get(code, "UNKNOWN")
+        self._send_json(code, {"error": {"code": code, "message": message, "status": status}})
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with StandinState.lock:
+                payload = json.loads(json.dumps(StandinState.stats))
+                payload["in_flight"] = StandinState.in_flight
+            payload["uptime_seconds"] = round(time.time() - payload.pop("started_at"), 1)
+            self._send_json(200, payload)
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        path, _, query = self.path.partition("?")
+        if path.rstrip("/") == "/stats/reset":
+            StandinState.reset_stats()
+            self._send_json(200, {"reset": True})
+            return
+        route = ROUTE.match(path)
+        if route is None:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {path}", "status": "NOT_FOUND"}})
+            return
+        try:
+            body = json.loads(raw or b"{}")
+        except json.JSONDecodeError as e:
+            self._send_error(400, f"Invalid JSON payload: {e}")
+            return
+
+        model = route.group("model")
+        request_number, error, message = admit(model)
+        if error is not None:
+            self._send_error(error, message)
+            return
+        started = time.monotonic()
+        try:
+            request = describe_request(model, body)
+            rule_name, spec = choose_response(request)
+            self._count("by_rule", rule_name)
+            if spec.get("status"):
+                time.sleep(sample_latency(spec.get("latency") or self._latency_spec(model)))
+                self._send_error(int(spec["status"]), f"Scripted {spec['status']} from rule '{rule_name}'")
+                return
+            response = build_response(request, spec, request_number)
+            time.sleep(sample_latency(spec.get("latency") or self._latency_spec(model)))
+        finally:
+            release()
+            with StandinState.lock:
+                StandinState.stats["latency_ms_total"] += (time.monotonic() - started) * 1000
+
+        self._count("by_status", 200)
+        if route.group("method") == "streamGenerateContent":
+            # One server-sent event carrying the whole response
+            payload = f"data: {json.dumps(response)}\r\n\r\n".encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self._send_json(200, response)
+
+    def _latency_spec(self, model: str) -> dict:
+        scenario = StandinState.scenario
+        for pattern, overrides in scenario.get("models", {}).items():
+            if fnmatch.fnmatch(model, pattern) and "latency" in overrides:
+                return overrides["latency"]
+        return scenario.get("latency", {})
+
+
+def load_scenario(path: str = None) -> dict:
+    """Load a scenario file on top of the defaults."""
+    scenario = json.loads(json.dumps(DEFAULT_SCENARIO))
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            scenario.update(json.load(f))
+    return scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini-compatible stand-in server for load and chaos tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--scenario", help="JSON scenario file (latency, limits, errors, rules)")
+    parser.add_argument("--latency-ms", type=float, help="Fixed latency for every call, overriding the scenario")
+    parser.add_argument("--rpm", type=int, help="Requests per minute before answering 429")
+    parser.add_argument("--max-concurrency", type=int, help="Concurrent requests before answering 429")
+    parser.add_argument("--error-429", type=float, help="Probability of an injected 429")
+    parser.add_argument("--error-500", type=float, help="Probability of an injected 500")
+    parser.add_argument("--error-503", type=float, help="Probability of an injected 503")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible latency and errors")
+    parser.add_argument("--access-log", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    if args.latency_ms is not None:
+        scenario["latency"] = {"distribution": "fixed", "ms": args.latency_ms}
+        scenario["models"] = {}
+    if args.rpm is not None:
+        scenario["requests_per_minute"] = args.rpm
+    if args.max_concurrency is not None:
+        scenario["max_concurrency"] = args.max_concurrency
+    for code in ("429", "500", "503"):
+        rate = getattr(args, f"error_{code}")
+        if rate is not None:
+            scenario.setdefault("errors", {})[code] = rate
+    scenario["access_log"] = args.access_log or scenario.get("access_log", False)
+    StandinState.scenario = scenario
+    if args.seed is not None:
+        StandinState.rng.seed(args.seed)
+    StandinState.reset_stats()
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer((args.host, args.port), StandinHandler)
+    server.daemon_threads = True
+    print(f"[GeminiStandin] Listening on http://{args.host}:{args.port} "
+          f"({len(scenario.get('rules', []))} rule(s), errors {scenario.get('errors') or 'off'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()